@@ -1,17 +1,48 @@
+import asyncio
 from fastapi import APIRouter, Depends, WebSocket
 from starlette.websockets import WebSocketDisconnect
-from app.core.agent.planact import PlanActAgent
-from app.dependencies import get_agent
+from app.core.agent.session_store import AgentSessionStore
+from app.core.sandbox.manager import SandboxManager
+from app.dependencies import get_agent_store, get_sandbox_manager
 
 router = APIRouter()
 
+async def _relay_changes(websocket: WebSocket, changes: asyncio.Queue, send_lock: asyncio.Lock) -> None:
+    """Push workspace change batches to the client as the sandbox reports them."""
+    try:
+        while True:
+            batch = await changes.get()
+            async with send_lock:
+                await websocket.send_json(batch)
+    except (WebSocketDisconnect, RuntimeError):
+        # The socket closed; the receive loop sees it too and cleans up
+        pass
+
 @router.websocket("/ws/{session_id}")
-async def websocket_endpoint(websocket: WebSocket, session_id: str, agent: PlanActAgent = Depends(get_agent)):
+async def websocket_endpoint(
+    websocket: WebSocket,
+    session_id: str,
+    agent_store: AgentSessionStore = Depends(get_agent_store),
+    sandbox_manager: SandboxManager = Depends(get_sandbox_manager)
+):
     await websocket.accept()
+    # Agent responses and workspace changes share the socket, one send at a time
+    send_lock = asyncio.Lock()
+    changes = sandbox_manager.feeds.subscribe(session_id)
+    relay = asyncio.create_task(_relay_changes(websocket, changes, send_lock))
     try:
         while True:
             data = await websocket.receive_text()
-            async for response in agent.run(data, session_id):
-                await websocket.send_json(response)
+            # Bring back the workspace of a sandbox that expired while the user was away
+            await sandbox_manager.resume_hibernated(session_id)
+            async with agent_store.session(session_id) as agent:
+                async for response in agent.run(data, session_id):
+                    # Keep the session's sandbox alive while the agent works
+                    sandbox_manager.touch(session_id)
+                    async with send_lock:
+                        await websocket.send_json(response)
     except WebSocketDisconnect:
         pass
+    finally:
+        sandbox_manager.feeds.unsubscribe(session_id, changes)
+        relay.cancel()
@@ -0,0 +1,9 @@
+from fastapi import APIRouter, Depends
+from app.core.llm.codestral import CodestralClient
+from app.dependencies import get_llm_client
+
+router = APIRouter()
+
+@router.get("/llm/stats")
+async def get_llm_stats(llm_client: CodestralClient = Depends(get_llm_client)):
+    return llm_client.get_stats()
@@ -1,9 +1,86 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, HTTPException
 from app.core.sandbox.manager import SandboxManager
 from app.dependencies import get_sandbox_manager
 
 router = APIRouter()
 
+@router.get("/sandbox/pool/stats")
+async def get_sandbox_pool_stats(sandbox_manager: SandboxManager = Depends(get_sandbox_manager)):
+    if sandbox_manager.pool is None:
+        return {"enabled": False}
+    return {"enabled": True, **sandbox_manager.pool.get_stats()}
+
+@router.get("/sandbox/startup/stats")
+async def get_sandbox_startup_stats(sandbox_manager: SandboxManager = Depends(get_sandbox_manager)):
+    return sandbox_manager.startup_stats
+
+@router.get("/sandbox/lifecycle/stats")
+async def get_sandbox_lifecycle_stats(sandbox_manager: SandboxManager = Depends(get_sandbox_manager)):
+    return sandbox_manager.lifecycle.get_stats()
+
+@router.get("/sandbox/freeze/stats")
+async def get_sandbox_freeze_stats(sandbox_manager: SandboxManager = Depends(get_sandbox_manager)):
+    return sandbox_manager.get_freeze_stats()
+
+@router.get("/sandbox/hibernate/stats")
+async def get_sandbox_hibernate_stats(sandbox_manager: SandboxManager = Depends(get_sandbox_manager)):
+    return sandbox_manager.get_hibernate_stats()
+
+@router.get("/sandbox/telemetry/stats")
+async def get_sandbox_telemetry_stats(sandbox_manager: SandboxManager = Depends(get_sandbox_manager)):
+    if sandbox_manager.telemetry is None:
+        return {"enabled": False}
+    return {"enabled": True, **sandbox_manager.telemetry.get_stats()}
+
+@router.get("/sandbox/feeds/stats")
+async def get_sandbox_feed_stats(sandbox_manager: SandboxManager = Depends(get_sandbox_manager)):
+    return sandbox_manager.feeds.get_stats()
+
+@router.get("/sandbox/api/stats")
+async def get_sandbox_api_stats(sandbox_manager: SandboxManager = Depends(get_sandbox_manager)):
+    return sandbox_manager.api.get_stats()
+
+@router.get("/sandbox/hosts")
+async def get_sandbox_hosts(sandbox_manager: SandboxManager = Depends(get_sandbox_manager)):
+    return sandbox_manager.placement.get_stats()
+
+@router.post("/sandbox/hosts/{name}/drain")
+async def drain_sandbox_host(
+    name: str,
+    evict: bool = False,
+    sandbox_manager: SandboxManager = Depends(get_sandbox_manager)
+):
+    """Stop placing sandboxes on a host; with evict, hibernate the ones on it now."""
+    if name not in sandbox_manager.placement.hosts:
+        raise HTTPException(status_code=404, detail=f"Unknown Docker host: {name}")
+    return await sandbox_manager.drain_host(name, evict=evict)
+
+@router.post("/sandbox/hosts/{name}/undrain")
+async def undrain_sandbox_host(name: str, sandbox_manager: SandboxManager = Depends(get_sandbox_manager)):
+    if name not in sandbox_manager.placement.hosts:
+        raise HTTPException(status_code=404, detail=f"Unknown Docker host: {name}")
+    sandbox_manager.undrain_host(name)
+    return {"host": name, "draining": False}
+
+@router.get("/sandbox/{session_id}/stats")
+async def get_sandbox_stats(
+    session_id: str,
+    window: float = 60.0,
+    sandbox_manager: SandboxManager = Depends(get_sandbox_manager)
+):
+    """CPU, memory, IO and network usage over the last ``window`` seconds."""
+    stats = sandbox_manager.get_sandbox_stats(session_id, window)
+    if stats is None:
+        raise HTTPException(status_code=404, detail=f"No stats for session {session_id}")
+    return stats
+
+@router.post("/sandbox/{session_id}/resume")
+async def resume_sandbox(session_id: str, sandbox_manager: SandboxManager = Depends(get_sandbox_manager)):
+    """Unpause a sandbox before opening VNC to it, and keep it awake."""
+    latency = await sandbox_manager.resume_sandbox(session_id)
+    sandbox_manager.touch(session_id)
+    return {"resumed": latency is not None, "resume_latency": latency}
+
 @router.get("/sandbox/{session_id}")
 async def get_sandbox(session_id: str, sandbox_manager: SandboxManager = Depends(get_sandbox_manager)):
-    return sandbox_manager.active_sandboxes.get(session_id)
+    return await sandbox_manager.get_sandbox(session_id)
@@ -1,6 +1,7 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
+from app.core.agent.session_store import AgentSessionStore
 from app.core.sandbox.manager import SandboxManager
-from app.dependencies import get_sandbox_manager
+from app.dependencies import get_agent_store, get_sandbox_manager
 
 router = APIRouter()
 
@@ -9,7 +10,17 @@ async def create_session(sandbox_manager: SandboxManager = Depends(get_sandbox_m
     session = await sandbox_manager.create_sandbox("new_session")
     return session
 
+@router.get("/sessions/stats")
+async def get_session_stats(agent_store: AgentSessionStore = Depends(get_agent_store)):
+    return agent_store.get_stats()
+
 @router.delete("/sessions/{session_id}")
-async def delete_session(session_id: str, sandbox_manager: SandboxManager = Depends(get_sandbox_manager)):
+async def delete_session(
+    session_id: str,
+    sandbox_manager: SandboxManager = Depends(get_sandbox_manager),
+    agent_store: AgentSessionStore = Depends(get_agent_store)
+):
     await sandbox_manager.destroy_sandbox(session_id)
+    await sandbox_manager.delete_snapshot(session_id)
+    await agent_store.delete(session_id)
     return {"status": "ok"}
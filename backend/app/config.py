@@ -1,4 +1,4 @@
-from typing import List
+from typing import Any, Dict, List, Optional
 from pydantic_settings import BaseSettings
 from pydantic import Field
 
@@ -27,17 +27,52 @@ class Settings(BaseSettings):
     temperature: float = Field(default=0.7, env="TEMPERATURE")
     max_tokens: int = Field(default=2000, env="MAX_TOKENS")
     
+    # LLM Response Cache Configuration
+    llm_cache_mode: str = Field(default="off", env="LLM_CACHE_MODE")
+    llm_cache_dir: str = Field(default=".cache/llm", env="LLM_CACHE_DIR")
+    llm_cache_memory_entries: int = Field(default=256, env="LLM_CACHE_MEMORY_ENTRIES")
+    llm_cache_max_disk_mb: int = Field(default=512, env="LLM_CACHE_MAX_DISK_MB")
+    llm_cache_nondeterministic: bool = Field(default=False, env="LLM_CACHE_NONDETERMINISTIC")
+    llm_singleflight_enabled: bool = Field(default=True, env="LLM_SINGLEFLIGHT_ENABLED")
+    
+    # LLM Scheduler Configuration
+    llm_timeout_seconds: float = Field(default=60.0, env="LLM_TIMEOUT_SECONDS")
+    llm_max_retries: int = Field(default=3, env="LLM_MAX_RETRIES")
+    llm_concurrency_initial: int = Field(default=8, env="LLM_CONCURRENCY_INITIAL")
+    llm_concurrency_min: int = Field(default=1, env="LLM_CONCURRENCY_MIN")
+    llm_concurrency_max: int = Field(default=64, env="LLM_CONCURRENCY_MAX")
+    llm_latency_target_seconds: float = Field(default=30.0, env="LLM_LATENCY_TARGET_SECONDS")
+    
+    # LLM Routing Configuration; endpoints are a JSON list of
+    # {"base_url", "api_key", "weight", "name"} and default to API_BASE
+    llm_endpoints: List[Dict[str, Any]] = Field(default=[], env="LLM_ENDPOINTS")
+    llm_hedge_enabled: bool = Field(default=True, env="LLM_HEDGE_ENABLED")
+    llm_hedge_min_delay_seconds: float = Field(default=0.5, env="LLM_HEDGE_MIN_DELAY_SECONDS")
+    llm_hedge_min_samples: int = Field(default=20, env="LLM_HEDGE_MIN_SAMPLES")
+    
     # Database Configuration
     mongodb_uri: str = Field(..., env="MONGODB_URI")
     mongodb_database: str = Field(default="agent_sheikh", env="MONGODB_DATABASE")
-    mongodb_username: str = Field(default=None, env="MONGODB_USERNAME")
-    mongodb_password: str = Field(default=None, env="MONGODB_PASSWORD")
+    mongodb_username: Optional[str] = Field(default=None, env="MONGODB_USERNAME")
+    mongodb_password: Optional[str] = Field(default=None, env="MONGODB_PASSWORD")
     
     # Cache Configuration
     redis_host: str = Field(default="localhost", env="REDIS_HOST")
     redis_port: int = Field(default=6379, env="REDIS_PORT")
     redis_db: int = Field(default=0, env="REDIS_DB")
-    redis_password: str = Field(default=None, env="REDIS_PASSWORD")
+    redis_password: Optional[str] = Field(default=None, env="REDIS_PASSWORD")
+    
+    # Docker Configuration
+    docker_host: str = Field(default="unix:///var/run/docker.sock", env="DOCKER_HOST")
+    docker_api_version: str = Field(default="v1.41", env="DOCKER_API_VERSION")
+    docker_max_connections: int = Field(default=32, env="DOCKER_MAX_CONNECTIONS")
+    # Extra hosts to place sandboxes on: [{"name", "host", "cpus", "memory", "address"}]; empty uses
+    # docker_host. Sandboxes on a host with an address (by default a tcp:// host's hostname) are
+    # reached through the API port it publishes there; set it to null when the sandbox network
+    # spans every host, such as an attachable overlay network
+    docker_hosts: List[Dict[str, Any]] = Field(default=[], env="DOCKER_HOSTS")
+    # Prefer hosts that stay below this utilization after placing a sandbox
+    sandbox_spread_threshold: float = Field(default=0.8, env="SANDBOX_SPREAD_THRESHOLD")
     
     # Sandbox Configuration
     sandbox_image: str = Field(
@@ -48,19 +83,52 @@ class Settings(BaseSettings):
         default="sheikh-sandbox", 
         env="SANDBOX_NAME_PREFIX"
     )
+    # Idle TTL: expiry slides forward on agent and tool activity
     sandbox_ttl_minutes: int = Field(default=30, env="SANDBOX_TTL_MINUTES")
+    sandbox_ttl_grace_seconds: float = Field(default=60.0, env="SANDBOX_TTL_GRACE_SECONDS")
+    # Freeze sandboxes without tool or VNC activity for this long; 0 disables
+    sandbox_pause_after_seconds: float = Field(default=300.0, env="SANDBOX_PAUSE_AFTER_SECONDS")
+    sandbox_max_concurrent_destroys: int = Field(default=4, env="SANDBOX_MAX_CONCURRENT_DESTROYS")
+    # Expiring sandboxes snapshot their workspace here (gzip tarballs, LRU); 0 total disables
+    sandbox_snapshot_dir: str = Field(default=".cache/snapshots", env="SANDBOX_SNAPSHOT_DIR")
+    sandbox_snapshot_path: str = Field(default="/workspace", env="SANDBOX_SNAPSHOT_PATH")
+    sandbox_snapshot_max_mb: int = Field(default=1024, env="SANDBOX_SNAPSHOT_MAX_MB")
+    sandbox_snapshot_max_total_mb: int = Field(default=10240, env="SANDBOX_SNAPSHOT_MAX_TOTAL_MB")
+    # Live resource stats per sandbox, kept for this many one-second samples
+    sandbox_stats_enabled: bool = Field(default=True, env="SANDBOX_STATS_ENABLED")
+    sandbox_stats_window_seconds: int = Field(default=300, env="SANDBOX_STATS_WINDOW_SECONDS")
+    # Resize CPU and memory limits in place from sustained usage, within these bounds
+    sandbox_resize_enabled: bool = Field(default=False, env="SANDBOX_RESIZE_ENABLED")
+    sandbox_resize_min_cpus: float = Field(default=0.5, env="SANDBOX_RESIZE_MIN_CPUS")
+    sandbox_resize_max_cpus: float = Field(default=4.0, env="SANDBOX_RESIZE_MAX_CPUS")
+    sandbox_resize_min_memory_mb: int = Field(default=512, env="SANDBOX_RESIZE_MIN_MEMORY_MB")
+    sandbox_resize_max_memory_mb: int = Field(default=8192, env="SANDBOX_RESIZE_MAX_MEMORY_MB")
+    sandbox_resize_interval_seconds: float = Field(default=60.0, env="SANDBOX_RESIZE_INTERVAL_SECONDS")
+    sandbox_resize_sustain_seconds: float = Field(default=120.0, env="SANDBOX_RESIZE_SUSTAIN_SECONDS")
     sandbox_network: str = Field(
         default="agent-sheikh-network", 
         env="SANDBOX_NETWORK"
     )
-    sandbox_https_proxy: str = Field(default=None, env="SANDBOX_HTTPS_PROXY")
-    sandbox_http_proxy: str = Field(default=None, env="SANDBOX_HTTP_PROXY")
-    sandbox_no_proxy: str = Field(default=None, env="SANDBOX_NO_PROXY")
+    sandbox_https_proxy: Optional[str] = Field(default=None, env="SANDBOX_HTTPS_PROXY")
+    sandbox_http_proxy: Optional[str] = Field(default=None, env="SANDBOX_HTTP_PROXY")
+    sandbox_no_proxy: Optional[str] = Field(default=None, env="SANDBOX_NO_PROXY")
+    sandbox_api_port: int = Field(default=8080, env="SANDBOX_API_PORT")
+    # Talk to sandbox APIs over Unix sockets in per-container directories here
+    # instead of the sandbox network; only for sandboxes on the local Docker host
+    sandbox_api_socket_dir: Optional[str] = Field(default=None, env="SANDBOX_API_SOCKET_DIR")
+    # HTTP/2 to the sandbox API, if h2 is installed and the sandbox server speaks it
+    sandbox_api_http2: bool = Field(default=False, env="SANDBOX_API_HTTP2")
+    sandbox_api_max_connections: int = Field(default=8, env="SANDBOX_API_MAX_CONNECTIONS")
+    sandbox_ready_timeout_seconds: float = Field(default=60.0, env="SANDBOX_READY_TIMEOUT_SECONDS")
+    sandbox_pool_size: int = Field(default=2, env="SANDBOX_POOL_SIZE")
+    sandbox_pool_min_size: int = Field(default=0, env="SANDBOX_POOL_MIN_SIZE")
+    sandbox_pool_idle_minutes: int = Field(default=10, env="SANDBOX_POOL_IDLE_MINUTES")
+    sandbox_pool_refill_concurrency: int = Field(default=2, env="SANDBOX_POOL_REFILL_CONCURRENCY")
     
     # Search Configuration
     search_provider: str = Field(default="bing", env="SEARCH_PROVIDER")
-    google_search_api_key: str = Field(default=None, env="GOOGLE_SEARCH_API_KEY")
-    google_search_engine_id: str = Field(default=None, env="GOOGLE_SEARCH_ENGINE_ID")
+    google_search_api_key: Optional[str] = Field(default=None, env="GOOGLE_SEARCH_API_KEY")
+    google_search_engine_id: Optional[str] = Field(default=None, env="GOOGLE_SEARCH_ENGINE_ID")
     
     # Authentication Configuration
     auth_provider: str = Field(default="password", env="AUTH_PROVIDER")
@@ -78,9 +146,9 @@ class Settings(BaseSettings):
     # Email Configuration
     email_host: str = Field(default="smtp.gmail.com", env="EMAIL_HOST")
     email_port: int = Field(default=587, env="EMAIL_PORT")
-    email_username: str = Field(default=None, env="EMAIL_USERNAME")
-    email_password: str = Field(default=None, env="EMAIL_PASSWORD")
-    email_from: str = Field(default=None, env="EMAIL_FROM")
+    email_username: Optional[str] = Field(default=None, env="EMAIL_USERNAME")
+    email_password: Optional[str] = Field(default=None, env="EMAIL_PASSWORD")
+    email_from: Optional[str] = Field(default=None, env="EMAIL_FROM")
     
     # MCP Configuration
     mcp_config_path: str = Field(default="/etc/mcp.json", env="MCP_CONFIG_PATH")
@@ -90,6 +158,12 @@ class Settings(BaseSettings):
     
     # Agent Configuration
     max_agent_iterations: int = Field(default=10, env="MAX_AGENT_ITERATIONS")
+    agent_context_token_budget: int = Field(default=24000, env="AGENT_CONTEXT_TOKEN_BUDGET")
+    agent_context_recent_messages: int = Field(default=6, env="AGENT_CONTEXT_RECENT_MESSAGES")
+    agent_context_stub_chars: int = Field(default=500, env="AGENT_CONTEXT_STUB_CHARS")
+    agent_tool_concurrency: int = Field(default=4, env="AGENT_TOOL_CONCURRENCY")
+    agent_max_sessions: int = Field(default=1000, env="AGENT_MAX_SESSIONS")
+    agent_max_session_kb: int = Field(default=512, env="AGENT_MAX_SESSION_KB")
     
     class Config:
         env_file = ".env"
@@ -0,0 +1,156 @@
+import json
+from typing import Callable, Dict, List, Optional, Set
+from loguru import logger
+
+
+def approximate_tokens(text: str) -> int:
+    """Estimate the token count of text at roughly four characters per token."""
+    return (len(text) + 3) // 4
+
+
+class ContextWindowManager:
+    """
+    Keeps a conversation within a token budget.
+
+    The system prompt, the latest user request and the most recent
+    messages are never touched. When the history is over budget, older
+    tool results (then older assistant messages) are compacted into
+    truncated stubs, and if that is not enough the oldest unprotected
+    messages are dropped. Changes are applied to the history in place
+    and are permanent, so the compacted prefix stays stable between
+    requests and can be reused by the request builder.
+    """
+
+    # Per-message overhead for role and framing tokens
+    MESSAGE_OVERHEAD = 4
+    # Ends every stub, so compacted messages are recognised and left alone
+    STUB_MARKER = "characters omitted to fit the context window]"
+
+    def __init__(
+        self,
+        token_budget: int = 24000,
+        recent_messages: int = 6,
+        stub_chars: int = 500,
+        count_tokens: Optional[Callable[[str], int]] = None
+    ):
+        self.token_budget = token_budget
+        self.recent_messages = recent_messages
+        self.stub_chars = stub_chars
+        self.count_tokens = count_tokens or approximate_tokens
+
+    def message_tokens(self, message: Dict) -> int:
+        """Estimate the tokens a message contributes to a request."""
+
+        tokens = self.MESSAGE_OVERHEAD
+        content = message.get("content")
+        if content:
+            tokens += self.count_tokens(content if isinstance(content, str) else json.dumps(content))
+        if message.get("tool_calls"):
+            tokens += self.count_tokens(json.dumps(message["tool_calls"], default=str))
+        return tokens
+
+    def fit(self, history: List[Dict]) -> Dict:
+        """
+        Compact ``history`` in place until it fits the token budget.
+
+        Returns a report of the token counts before and after, and of the
+        messages that were compacted or dropped.
+        """
+
+        tokens = [self.message_tokens(message) for message in history]
+        total = sum(tokens)
+        report = {
+            "tokens_before": total,
+            "tokens_after": total,
+            "token_budget": self.token_budget,
+            "compacted": [],
+            "dropped": []
+        }
+
+        if total <= self.token_budget:
+            return report
+
+        protected = self._protected_indexes(history)
+
+        # Compact tool results first; they are the bulk of the history
+        for roles in (("tool",), ("assistant",)):
+            for index, message in enumerate(history):
+                if total <= self.token_budget:
+                    break
+                if index in protected or message.get("role") not in roles:
+                    continue
+
+                stub = self._compact(message)
+                if stub is None:
+                    continue
+
+                history[index] = stub
+                stub_tokens = self.message_tokens(stub)
+                total -= tokens[index] - stub_tokens
+                report["compacted"].append({
+                    "role": message.get("role"),
+                    "name": message.get("name"),
+                    "tokens_saved": tokens[index] - stub_tokens
+                })
+                tokens[index] = stub_tokens
+
+        # Still over budget: drop the oldest unprotected messages
+        if total > self.token_budget:
+            dropped: Set[int] = set()
+            for index, message in enumerate(history):
+                if total <= self.token_budget:
+                    break
+                if index in protected or message.get("role") in ("system", "user"):
+                    continue
+                dropped.add(index)
+                total -= tokens[index]
+                report["dropped"].append({
+                    "role": message.get("role"),
+                    "name": message.get("name"),
+                    "tokens": tokens[index]
+                })
+
+            if dropped:
+                history[:] = [
+                    message for index, message in enumerate(history)
+                    if index not in dropped
+                ]
+
+        report["tokens_after"] = total
+
+        if total > self.token_budget:
+            logger.warning(
+                f"Conversation still exceeds context budget after compaction: "
+                f"{total} > {self.token_budget} tokens"
+            )
+
+        return report
+
+    def _protected_indexes(self, history: List[Dict]) -> Set[int]:
+        protected = {
+            index for index, message in enumerate(history)
+            if message.get("role") == "system"
+        }
+
+        for index in range(len(history) - 1, -1, -1):
+            if history[index].get("role") == "user":
+                protected.add(index)
+                break
+
+        protected.update(range(max(0, len(history) - self.recent_messages), len(history)))
+        return protected
+
+    def _compact(self, message: Dict) -> Optional[Dict]:
+        """Return a truncated copy of a message, or None if it is already small."""
+
+        content = message.get("content")
+        if not isinstance(content, str):
+            content = json.dumps(content, default=str) if content is not None else ""
+        if len(content) <= self.stub_chars or content.endswith(self.STUB_MARKER):
+            return None
+
+        omitted = len(content) - self.stub_chars
+        return {
+            **message,
+            "content": f"{content[:self.stub_chars]}\n[... {omitted} {self.STUB_MARKER}"
+        }
@@ -1,7 +1,14 @@
-from typing import List, AsyncGenerator, Dict, Any, Optional
+from typing import List, AsyncGenerator, Dict, Any, Optional, Tuple
+import asyncio
+import json
+import time
 from loguru import logger
 
+from app.config import settings
+from app.core.agent.context import ContextWindowManager
 from app.core.llm.codestral import CodestralClient
+from app.core.llm.request_builder import ChatRequestBuilder
+from app.core.llm.scheduler import RequestPriority
 from app.core.tools.registry import ToolRegistry
 
 
@@ -20,12 +27,20 @@ class PlanActAgent:
         self,
         llm_client: CodestralClient,
         tool_registry: ToolRegistry,
-        max_iterations: int = 10
+        max_iterations: int = 10,
+        context_manager: Optional[ContextWindowManager] = None
     ):
         self.llm = llm_client
         self.tools = tool_registry
         self.max_iterations = max_iterations
+        self.context = context_manager or ContextWindowManager(
+            token_budget=settings.agent_context_token_budget,
+            recent_messages=settings.agent_context_recent_messages,
+            stub_chars=settings.agent_context_stub_chars
+        )
         self.conversation_history: List[Dict] = []
+        # Keeps the encoded history so each request only encodes new messages
+        self.request_builder = ChatRequestBuilder()
     
     async def run(
         self,
@@ -40,12 +55,18 @@ class PlanActAgent:
             "content": user_message
         })
         
-        # Generate initial plan
+        # Generate initial plan, forwarding tokens as they arrive
         plan_prompt = self._create_plan_prompt(user_message)
-        plan_response = await self.llm.chat_complete(
-            messages=self.conversation_history,
-            tools=self.tools.get_tool_definitions()
-        )
+        plan_response = {}
+        async for event in self._stream_completion(
+            "plan_delta",
+            RequestPriority.INTERACTIVE,
+            session_id
+        ):
+            if event["type"] == "response":
+                plan_response = event["response"]
+            else:
+                yield event
         
         plan_content = self._extract_plan_content(plan_response)
         yield {
@@ -55,7 +76,6 @@ class PlanActAgent:
         
         # Execute tools based on plan
         iteration = 0
-        tool_results = []
         
         while iteration < self.max_iterations:
             # Check if task is complete
@@ -64,30 +84,12 @@ class PlanActAgent:
             
             # Extract and execute tool calls
             tool_calls = self._extract_tool_calls(plan_response)
+            tool_results = []
             
-            for tool_call in tool_calls:
-                try:
-                    tool_result = await self._execute_tool(
-                        tool_call,
-                        session_id
-                    )
-                    
-                    yield {
-                        "type": "tool_execution",
-                        "tool": tool_call["name"],
-                        "arguments": tool_call["arguments"],
-                        "result": tool_result
-                    }
-                    
+            async for event, tool_result in self._run_tool_calls(tool_calls, session_id):
+                if tool_result is not None:
                     tool_results.append(tool_result)
-                    
-                except Exception as e:
-                    logger.error(f"Tool execution failed: {e}")
-                    yield {
-                        "type": "tool_error",
-                        "tool": tool_call["name"],
-                        "error": str(e)
-                    }
+                yield event
             
             # Reflect and adjust plan
             reflection_prompt = self._create_reflection_prompt(
@@ -102,19 +104,24 @@ class PlanActAgent:
                 "tool_calls": tool_calls
             })
             
-            # Add tool results to history
+            # Add this iteration's tool results to history
             for result in tool_results:
                 self.conversation_history.append({
                     "role": "tool",
-                    "content": result,
+                    "content": result if isinstance(result, str) else json.dumps(result, default=str),
                     "name": "tool_result"
                 })
             
             # Get new plan
-            plan_response = await self.llm.chat_complete(
-                messages=self.conversation_history,
-                tools=self.tools.get_tool_definitions()
-            )
+            async for event in self._stream_completion(
+                "reflection_delta",
+                RequestPriority.BACKGROUND,
+                session_id
+            ):
+                if event["type"] == "response":
+                    plan_response = event["response"]
+                else:
+                    yield event
             
             plan_content = self._extract_plan_content(plan_response)
             yield {
@@ -136,6 +143,48 @@ class PlanActAgent:
             "content": final_response
         }
     
+    async def _stream_completion(
+        self,
+        delta_type: str,
+        priority: RequestPriority,
+        session_id: str
+    ) -> AsyncGenerator[Dict, None]:
+        """
+        Stream the next completion for the conversation.
+        
+        The history is first fitted to the context budget, reporting any
+        compaction as a ``context_compacted`` event. Content tokens are
+        yielded as ``delta_type`` events; the assembled completion is
+        yielded last as a ``response`` event.
+        """
+        
+        report = self.context.fit(self.conversation_history)
+        if report["compacted"] or report["dropped"]:
+            logger.info(
+                f"Compacted context for session {session_id}: "
+                f"{report['tokens_before']} -> {report['tokens_after']} tokens, "
+                f"{len(report['compacted'])} compacted, {len(report['dropped'])} dropped"
+            )
+            yield {
+                "type": "context_compacted",
+                **report
+            }
+        
+        async for event in self.llm.stream_chat_complete(
+            messages=self.conversation_history,
+            tools=self.tools.get_tool_definitions(),
+            priority=priority,
+            session_id=session_id,
+            builder=self.request_builder
+        ):
+            if event["type"] == "content":
+                yield {
+                    "type": delta_type,
+                    "content": event["content"]
+                }
+            elif event["type"] == "response":
+                yield event
+    
     def _create_plan_prompt(self, user_message: str) -> str:
         """Create prompt for initial planning."""
         return f"""You are Agent Sheikh, an AI assistant that can use various tools.
@@ -169,18 +218,128 @@ Previous tool calls and results:
 
 Evaluate the progress and create an updated plan. What should be done next?"""
     
+    async def _run_tool_calls(
+        self,
+        tool_calls: List[Dict],
+        session_id: str
+    ) -> AsyncGenerator[Tuple[Dict, Optional[Dict]], None]:
+        """
+        Execute one turn's tool calls, yielding (event, result) pairs in call order.
+        
+        Consecutive read-only calls run concurrently, bounded per session;
+        a mutating call waits for everything before it and blocks
+        everything after it, so side effects keep the order the model chose.
+        Output from streaming tools is relayed as ``tool_output`` events
+        while the calls run.
+        """
+        
+        # A run serves one session, so this caps the session's concurrent calls
+        slots = asyncio.Semaphore(max(1, settings.agent_tool_concurrency))
+        
+        for batch in self._batch_tool_calls(tool_calls):
+            output: asyncio.Queue = asyncio.Queue()
+            tasks = [
+                asyncio.create_task(self._timed_tool_call(tool_call, session_id, slots, output))
+                for tool_call in batch
+            ]
+            try:
+                for tool_call, task in zip(batch, tasks):
+                    async for event in self._relay_output(output, task):
+                        yield event, None
+                    tool_result, duration_ms = task.result()
+                    
+                    if isinstance(tool_result, dict) and tool_result.get("status") == "error":
+                        # Still returned as a result, so the model sees the failure
+                        logger.error(f"Tool execution failed: {tool_result['result']}")
+                        yield {
+                            "type": "tool_error",
+                            "tool": tool_call["name"],
+                            "error": tool_result["result"],
+                            "duration_ms": duration_ms
+                        }, tool_result
+                        continue
+                    
+                    yield {
+                        "type": "tool_execution",
+                        "tool": tool_call["name"],
+                        "arguments": tool_call["arguments"],
+                        "result": tool_result,
+                        "duration_ms": duration_ms
+                    }, tool_result
+            finally:
+                # The consumer went away mid-batch; don't leave calls running
+                for task in tasks:
+                    task.cancel()
+    
+    async def _relay_output(
+        self,
+        output: asyncio.Queue,
+        task: asyncio.Task
+    ) -> AsyncGenerator[Dict, None]:
+        """Yield queued tool output events until ``task`` finishes."""
+        
+        while not task.done():
+            getter = asyncio.ensure_future(output.get())
+            done, _ = await asyncio.wait({getter, task}, return_when=asyncio.FIRST_COMPLETED)
+            if getter in done:
+                yield getter.result()
+            else:
+                getter.cancel()
+        while not output.empty():
+            yield output.get_nowait()
+    
+    def _batch_tool_calls(self, tool_calls: List[Dict]) -> List[List[Dict]]:
+        """Group consecutive read-only calls; each mutating call is its own batch."""
+        
+        batches: List[List[Dict]] = []
+        read_only_batch = False
+        
+        for tool_call in tool_calls:
+            read_only = self.tools.is_read_only(tool_call["name"], tool_call["arguments"])
+            if read_only and read_only_batch:
+                batches[-1].append(tool_call)
+            else:
+                batches.append([tool_call])
+            read_only_batch = read_only
+        
+        return batches
+    
+    async def _timed_tool_call(
+        self,
+        tool_call: Dict,
+        session_id: str,
+        slots: asyncio.Semaphore,
+        output: Optional[asyncio.Queue] = None
+    ) -> Tuple[Dict, float]:
+        """Execute a tool call, returning its result (an error result if it failed) and duration in ms."""
+        
+        async with slots:
+            started = time.perf_counter()
+            result = await self._execute_tool(tool_call, session_id, output)
+            duration_ms = round((time.perf_counter() - started) * 1000, 1)
+        
+        return result, duration_ms
+    
     async def _execute_tool(
         self,
         tool_call: Dict,
-        session_id: str
+        session_id: str,
+        output: Optional[asyncio.Queue] = None
     ) -> Dict:
-        """Execute a single tool call."""
+        """Execute a single tool call, queueing any live output it produces."""
         
         tool_name = tool_call["name"]
-        arguments = tool_call["arguments"]
         
-        # Add session_id to arguments
-        arguments["session_id"] = session_id
+        # Add session_id to a copy; the parsed response may be shared with
+        # other sessions through the response cache or request coalescing
+        arguments = {**tool_call["arguments"], "session_id": session_id}
+        if output is not None and self.tools.streams_output(tool_name):
+            arguments["on_output"] = lambda stream, data: output.put_nowait({
+                "type": "tool_output",
+                "tool": tool_name,
+                "stream": stream,
+                "data": data
+            })
         
         try:
             result = await self.tools.execute_tool(tool_name, **arguments)
@@ -202,9 +361,19 @@ Evaluate the progress and create an updated plan. What should be done next?"""
             
             if "tool_calls" in message:
                 for tool_call in message["tool_calls"]:
+                    arguments = tool_call["function"]["arguments"]
+                    
+                    # Streamed tool calls carry their arguments as a JSON string
+                    if isinstance(arguments, str):
+                        try:
+                            arguments = json.loads(arguments) if arguments else {}
+                        except json.JSONDecodeError:
+                            logger.warning(f"Invalid tool call arguments: {arguments[:200]}")
+                            arguments = {}
+                    
                     tool_calls.append({
                         "name": tool_call["function"]["name"],
-                        "arguments": tool_call["function"]["arguments"]
+                        "arguments": arguments
                     })
         
         return tool_calls
@@ -245,4 +414,5 @@ Evaluate the progress and create an updated plan. What should be done next?"""
     
     def clear_history(self) -> None:
         """Clear conversation history."""
-        self.conversation_history = []
\ No newline at end of file
+        self.conversation_history = []
+        self.request_builder = ChatRequestBuilder()
\ No newline at end of file
@@ -0,0 +1,213 @@
+import asyncio
+import json
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Any, AsyncGenerator, Callable, Dict, Optional
+from loguru import logger
+
+from app.core.agent.context import ContextWindowManager
+from app.core.agent.planact import PlanActAgent
+
+
+def _utf8_length(text: str) -> int:
+    return len(text.encode("utf-8"))
+
+
+class _SessionEntry:
+    """A hot session: its agent, a lock serializing its turns, and its size."""
+
+    def __init__(self, agent: PlanActAgent):
+        self.agent = agent
+        self.lock = asyncio.Lock()
+        self.users = 0
+        self.size_bytes = 0
+
+
+class AgentSessionStore:
+    """
+    Session-scoped agents with bounded memory.
+
+    Each session gets its own PlanActAgent, so conversation history and
+    encoded request segments are never shared between sessions. Hot
+    sessions live in an LRU of at most ``max_sessions`` entries; the least
+    recently used idle session is spilled to the database when the LRU is
+    full, and rehydrated when its next message arrives. A session's history
+    is compacted, then trimmed, to stay within ``max_session_bytes``.
+    Without a database collection, evicted sessions are discarded.
+    """
+
+    def __init__(
+        self,
+        agent_factory: Callable[[], PlanActAgent],
+        collection: Any = None,
+        max_sessions: int = 1000,
+        max_session_bytes: int = 512 * 1024,
+        recent_messages: int = 6
+    ):
+        self.agent_factory = agent_factory
+        self.collection = collection
+        self.max_sessions = max_sessions
+        self.max_session_bytes = max_session_bytes
+        # Same compaction as the context window, measured in bytes
+        self._trimmer = ContextWindowManager(
+            token_budget=max_session_bytes,
+            recent_messages=recent_messages,
+            count_tokens=_utf8_length
+        )
+
+        self._sessions: "OrderedDict[str, _SessionEntry]" = OrderedDict()
+        self._loading: Dict[str, asyncio.Task] = {}
+        self._spilling: Dict[str, asyncio.Task] = {}
+        self.stats = {
+            "created": 0,
+            "rehydrated": 0,
+            "spilled": 0,
+            "discarded": 0,
+            "trimmed": 0
+        }
+
+    @asynccontextmanager
+    async def session(self, session_id: str) -> AsyncGenerator[PlanActAgent, None]:
+        """Hold a session's agent for one turn; turns of a session never overlap."""
+
+        entry = await self._get(session_id)
+        entry.users += 1
+        try:
+            async with entry.lock:
+                yield entry.agent
+                self._fit(session_id, entry)
+        finally:
+            entry.users -= 1
+            self._evict()
+
+    async def delete(self, session_id: str) -> None:
+        """Forget a session in memory and in the database."""
+
+        self._sessions.pop(session_id, None)
+        spill = self._spilling.get(session_id)
+        if spill is not None:
+            await asyncio.gather(spill, return_exceptions=True)
+        if self.collection is not None:
+            try:
+                await self.collection.delete_one({"_id": session_id})
+            except Exception as e:
+                logger.error(f"Failed to delete session state {session_id}: {e}")
+
+    async def close(self) -> None:
+        """Spill every hot session so conversations survive a restart."""
+
+        for session_id, entry in list(self._sessions.items()):
+            self._spill(session_id, entry)
+        self._sessions.clear()
+        if self._spilling:
+            await asyncio.gather(*self._spilling.values(), return_exceptions=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "hot_sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "hot_bytes": sum(entry.size_bytes for entry in self._sessions.values()),
+            "max_session_bytes": self.max_session_bytes
+        }
+
+    async def _get(self, session_id: str) -> _SessionEntry:
+        while True:
+            entry = self._sessions.get(session_id)
+            if entry is not None:
+                self._sessions.move_to_end(session_id)
+                return entry
+
+            # Concurrent first messages for a cold session share one load
+            task = self._loading.get(session_id)
+            if task is None:
+                task = asyncio.create_task(self._load(session_id))
+                self._loading[session_id] = task
+                task.add_done_callback(lambda _: self._loading.pop(session_id, None))
+            await asyncio.shield(task)
+            # Loop: the loaded entry may have been evicted again before we resumed
+
+    async def _load(self, session_id: str) -> _SessionEntry:
+        # A spill still being written must land before it is read back
+        spill = self._spilling.get(session_id)
+        if spill is not None:
+            await asyncio.gather(spill, return_exceptions=True)
+
+        entry = _SessionEntry(self.agent_factory())
+        document = None
+        if self.collection is not None:
+            try:
+                document = await self.collection.find_one({"_id": session_id})
+            except Exception as e:
+                logger.error(f"Failed to load session state {session_id}: {e}")
+
+        if document is not None:
+            entry.agent.conversation_history = document.get("conversation_history", [])
+            entry.size_bytes = document.get("size_bytes", 0)
+            self.stats["rehydrated"] += 1
+        else:
+            self.stats["created"] += 1
+
+        self._sessions[session_id] = entry
+        return entry
+
+    def _fit(self, session_id: str, entry: _SessionEntry) -> None:
+        report = self._trimmer.fit(entry.agent.conversation_history)
+        entry.size_bytes = report["tokens_after"]
+        if report["compacted"] or report["dropped"]:
+            self.stats["trimmed"] += 1
+            logger.info(
+                f"Trimmed session {session_id} history: "
+                f"{report['tokens_before']} -> {report['tokens_after']} bytes"
+            )
+
+    def _evict(self) -> None:
+        """Spill least recently used idle sessions until the LRU fits."""
+
+        excess = len(self._sessions) - self.max_sessions
+        if excess <= 0:
+            return
+
+        for session_id, entry in list(self._sessions.items()):
+            if excess <= 0:
+                break
+            if entry.users:
+                continue
+            del self._sessions[session_id]
+            self._spill(session_id, entry)
+            excess -= 1
+
+    def _spill(self, session_id: str, entry: _SessionEntry) -> None:
+        if self.collection is None:
+            self.stats["discarded"] += 1
+            return
+
+        document = {
+            "_id": session_id,
+            "conversation_history": entry.agent.conversation_history,
+            "size_bytes": entry.size_bytes,
+            "updated_at": datetime.now(timezone.utc)
+        }
+        previous = self._spilling.get(session_id)
+        task = asyncio.create_task(self._write(document, previous))
+        self._spilling[session_id] = task
+
+        def done(_: asyncio.Task) -> None:
+            if self._spilling.get(session_id) is task:
+                del self._spilling[session_id]
+
+        task.add_done_callback(done)
+
+    async def _write(self, document: Dict, previous: Optional[asyncio.Task]) -> None:
+        if previous is not None:
+            await asyncio.gather(previous, return_exceptions=True)
+        try:
+            # Round-trip through JSON so tool results are plain BSON-safe values
+            document["conversation_history"] = json.loads(
+                json.dumps(document["conversation_history"], default=str)
+            )
+            await self.collection.replace_one({"_id": document["_id"]}, document, upsert=True)
+            self.stats["spilled"] += 1
+        except Exception as e:
+            logger.error(f"Failed to spill session state {document['_id']}: {e}")
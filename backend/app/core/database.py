@@ -30,7 +30,8 @@ class DatabaseManager:
     
     def get_database(self) -> AsyncIOMotorDatabase:
         """Get database instance."""
-        if not self.database:
+        # Motor databases do not support truth testing
+        if self.database is None:
             raise RuntimeError("Database not connected")
         return self.database
 
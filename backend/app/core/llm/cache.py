@@ -0,0 +1,208 @@
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from loguru import logger
+
+from app.core.llm.request_builder import request_key
+
+
+class CacheMissError(Exception):
+    """Raised in replay mode when a request has no recorded response."""
+
+
+def cache_key(payload: Dict[str, Any]) -> str:
+    """
+    Return a stable content hash for a chat completion request.
+
+    The key covers (model, messages, tools, tool_choice, temperature,
+    max_tokens) and matches the key ChatRequestBuilder computes from its
+    pre-encoded segments.
+    """
+
+    return request_key(payload)
+
+
+class ResponseCache:
+    """
+    Two-tier content-addressed cache for LLM completions.
+
+    Modes:
+    - off: cache disabled
+    - read_write: serve hits, store responses for misses
+    - record: always call upstream and overwrite recorded responses
+    - replay: serve hits only; a miss raises CacheMissError
+    """
+
+    MODES = ("off", "read_write", "record", "replay")
+
+    def __init__(
+        self,
+        mode: str = "read_write",
+        directory: Optional[str] = None,
+        memory_entries: int = 256,
+        max_disk_bytes: int = 512 * 1024 * 1024
+    ):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown cache mode: {mode}")
+
+        self.mode = mode
+        self.directory = directory
+        self.memory_entries = memory_entries
+        self.max_disk_bytes = max_disk_bytes
+
+        self._memory: "OrderedDict[str, Dict]" = OrderedDict()
+        # key -> (size in bytes, last access time), oldest access first
+        self._disk_index: "OrderedDict[str, tuple]" = OrderedDict()
+        self._disk_bytes = 0
+        self._disk_lock = asyncio.Lock()
+
+        self.stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0
+        }
+
+        if self.directory and self.enabled:
+            self._load_disk_index()
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    @property
+    def replay(self) -> bool:
+        return self.mode == "replay"
+
+    async def get(self, key: str) -> Optional[Dict]:
+        """Look up a response, promoting disk hits into memory."""
+
+        if not self.enabled or self.mode == "record":
+            return None
+
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            self.stats["memory_hits"] += 1
+            return self._memory[key]
+
+        if self.directory and key in self._disk_index:
+            response = await asyncio.to_thread(self._read_entry, key)
+            entry = self._disk_index.pop(key, None)
+            if response is not None and entry is not None:
+                self._disk_index[key] = (entry[0], time.time())
+                self._remember(key, response)
+                self.stats["disk_hits"] += 1
+                return response
+            if entry is not None:
+                self._disk_bytes -= entry[0]
+
+        self.stats["misses"] += 1
+        return None
+
+    async def put(self, key: str, response: Dict) -> None:
+        """Store a response in both tiers."""
+
+        if not self.enabled or self.replay:
+            return
+
+        self._remember(key, response)
+        self.stats["stores"] += 1
+
+        if self.directory:
+            async with self._disk_lock:
+                size = await asyncio.to_thread(self._write_entry, key, response)
+                if key in self._disk_index:
+                    self._disk_bytes -= self._disk_index.pop(key)[0]
+                self._disk_index[key] = (size, time.time())
+                self._disk_bytes += size
+
+                evicted = self._select_evictions()
+                if evicted:
+                    await asyncio.to_thread(self._remove_entries, evicted)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and tier sizes."""
+
+        return {
+            **self.stats,
+            "mode": self.mode,
+            "memory_entries": len(self._memory),
+            "disk_entries": len(self._disk_index),
+            "disk_bytes": self._disk_bytes
+        }
+
+    def _remember(self, key: str, response: Dict) -> None:
+        self._memory[key] = response
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _load_disk_index(self) -> None:
+        """Index existing entries so eviction order survives restarts."""
+
+        entries = []
+        for root, _, filenames in os.walk(self.directory):
+            for filename in filenames:
+                if not filename.endswith(".json"):
+                    continue
+                stat = os.stat(os.path.join(root, filename))
+                entries.append((stat.st_mtime, filename[:-5], stat.st_size))
+
+        for mtime, key, size in sorted(entries):
+            self._disk_index[key] = (size, mtime)
+            self._disk_bytes += size
+
+        logger.info(f"Loaded {len(entries)} cached LLM responses from {self.directory}")
+
+    def _read_entry(self, key: str) -> Optional[Dict]:
+        try:
+            path = self._entry_path(key)
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            os.utime(path)
+            return entry["response"]
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Dropping unreadable cache entry {key}: {e}")
+            return None
+
+    def _write_entry(self, key: str, response: Dict) -> int:
+        path = self._entry_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        data = json.dumps({
+            "key": key,
+            "created_at": time.time(),
+            "response": response
+        }).encode("utf-8")
+
+        # Write atomically so a concurrent reader never sees a partial entry
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return len(data)
+
+    def _select_evictions(self) -> list:
+        """Drop least recently used entries from the index until under the size cap."""
+
+        evicted = []
+        while self._disk_bytes > self.max_disk_bytes and len(self._disk_index) > 1:
+            key, (size, _) = self._disk_index.popitem(last=False)
+            self._disk_bytes -= size
+            self.stats["evictions"] += 1
+            evicted.append(key)
+        return evicted
+
+    def _remove_entries(self, keys: list) -> None:
+        for key in keys:
+            try:
+                os.remove(self._entry_path(key))
+            except OSError:
+                pass
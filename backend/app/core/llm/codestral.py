@@ -1,9 +1,16 @@
+from contextlib import asynccontextmanager
 from typing import AsyncGenerator, Dict, List, Optional, Any
+import json
 import httpx
 from pydantic import BaseModel, Field
 from loguru import logger
 
 from app.config import settings
+from app.core.llm.cache import CacheMissError, ResponseCache
+from app.core.llm.gateway import LLMEndpoint, LLMGateway
+from app.core.llm.request_builder import ChatRequestBuilder, EncodedRequest
+from app.core.llm.scheduler import LLMScheduler, RequestPriority, parse_retry_after
+from app.core.llm.singleflight import SingleFlight
 
 
 class CodestralClient:
@@ -13,18 +20,29 @@ class CodestralClient:
         self,
         api_key: str,
         base_url: str = None,
-        model: str = None
+        model: str = None,
+        cache: Optional[ResponseCache] = None,
+        singleflight: Optional[SingleFlight] = None,
+        scheduler: Optional[LLMScheduler] = None,
+        gateway: Optional[LLMGateway] = None,
+        max_retries: int = None,
+        timeout: float = None
     ):
         self.api_key = api_key
         self.base_url = base_url or settings.api_base
         self.model = model or settings.model_name
-        self.client = httpx.AsyncClient(
-            headers={
-                "Authorization": f"Bearer {api_key}",
-                "Content-Type": "application/json"
-            },
-            timeout=60.0
-        )
+        self.cache = cache
+        self.singleflight = singleflight
+        self.scheduler = scheduler or LLMScheduler()
+        self.max_retries = settings.llm_max_retries if max_retries is None else max_retries
+        # Without an explicit gateway, route everything to the single base_url
+        self.gateway = gateway or LLMGateway([
+            LLMEndpoint(
+                base_url=self.base_url,
+                api_key=api_key,
+                timeout=timeout or settings.llm_timeout_seconds
+            )
+        ])
     
     async def complete(
         self,
@@ -33,90 +51,197 @@ class CodestralClient:
         temperature: float = None,
         stop: Optional[List[str]] = None,
         tools: Optional[List[Dict]] = None,
-        tool_choice: Optional[str] = None
+        tool_choice: Optional[str] = None,
+        cacheable: bool = None,
+        priority: RequestPriority = RequestPriority.INTERACTIVE,
+        session_id: Optional[str] = None
     ) -> Dict:
         """Generate code completion with optional function calling."""
         
-        max_tokens = max_tokens or settings.max_tokens
-        temperature = temperature or settings.temperature
-        
         # Use chat completions endpoint as specified in blueprint
-        payload = {
-            "model": self.model,
-            "messages": [{"role": "user", "content": prompt}],
-            "max_tokens": max_tokens,
-            "temperature": temperature
-        }
-        
-        # Add function calling support if tools provided
-        if tools:
-            payload["tools"] = tools
-            payload["tool_choice"] = tool_choice or "auto"
+        payload = self._build_payload(
+            [{"role": "user", "content": prompt}],
+            max_tokens,
+            temperature,
+            tools,
+            tool_choice
+        )
         
-        try:
-            response = await self.client.post(
-                f"{self.base_url}/chat/completions",
-                json=payload
-            )
-            response.raise_for_status()
-            return response.json()
-        except httpx.HTTPError as e:
-            logger.error(f"Error calling Codestral API: {e}")
-            raise
+        return await self._cached_post(
+            payload,
+            ChatRequestBuilder().build(payload),
+            cacheable,
+            "Codestral API",
+            priority,
+            session_id
+        )
     
     async def stream_complete(
         self,
         prompt: str,
         max_tokens: int = None,
-        temperature: float = None
+        temperature: float = None,
+        priority: RequestPriority = RequestPriority.INTERACTIVE,
+        session_id: Optional[str] = None
     ) -> AsyncGenerator[str, None]:
         """Stream code completion responses."""
         
-        max_tokens = max_tokens or settings.max_tokens
-        temperature = temperature or settings.temperature
-        
-        payload = {
-            "model": self.model,
-            "messages": [{"role": "user", "content": prompt}],
-            "max_tokens": max_tokens,
-            "temperature": temperature,
-            "stream": True
-        }
+        payload = self._build_payload(
+            [{"role": "user", "content": prompt}],
+            max_tokens,
+            temperature
+        )
+        payload["stream"] = True
+        request = ChatRequestBuilder().build(payload)
         
         try:
-            async with self.client.stream(
-                "POST",
-                f"{self.base_url}/chat/completions",
-                json=payload
-            ) as response:
-                response.raise_for_status()
-                async for line in response.aiter_lines():
-                    if line.startswith("data: "):
-                        yield line[6:]  # Remove "data: " prefix
-                    elif line == "data: [DONE]":
-                        break
+            async with self._send(request, priority, session_id, stream=True) as response:
+                async for data in self._iter_sse_data(response):
+                    yield data
         except httpx.HTTPError as e:
             logger.error(f"Error streaming from Codestral API: {e}")
             raise
     
+    async def stream_chat_complete(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: int = None,
+        temperature: float = None,
+        tools: Optional[List[Dict]] = None,
+        tool_choice: Optional[str] = None,
+        cacheable: bool = None,
+        priority: RequestPriority = RequestPriority.INTERACTIVE,
+        session_id: Optional[str] = None,
+        builder: Optional[ChatRequestBuilder] = None
+    ) -> AsyncGenerator[Dict, None]:
+        """
+        Stream a chat completion with conversation history.
+        
+        Yields ``{"type": "content", "content": ...}`` for every content token
+        as it arrives, then a single ``{"type": "response", "response": ...}``
+        holding the assembled completion in the same shape ``chat_complete``
+        returns, including any tool calls rebuilt from their fragments.
+        
+        Pass the conversation's ``builder`` so earlier messages are not
+        re-encoded on every call.
+        """
+        
+        payload = self._build_payload(messages, max_tokens, temperature, tools, tool_choice)
+        payload["stream"] = True
+        request = (builder or ChatRequestBuilder()).build(payload)
+        
+        key = self._cache_key_for(payload, request, cacheable)
+        if key:
+            cached = await self.cache.get(key)
+            if cached is not None:
+                content = cached.get("choices", [{}])[0].get("message", {}).get("content")
+                if content:
+                    yield {"type": "content", "content": content}
+                yield {"type": "response", "response": cached}
+                return
+        self._check_replay_miss(key)
+        
+        if self.singleflight:
+            events = self.singleflight.stream(
+                request.key + ":stream",
+                lambda: self._stream_upstream(request, key, priority, session_id)
+            )
+        else:
+            events = self._stream_upstream(request, key, priority, session_id)
+        
+        async for event in events:
+            yield event
+    
+    async def _stream_upstream(
+        self,
+        request: EncodedRequest,
+        key: Optional[str],
+        priority: RequestPriority,
+        session_id: Optional[str]
+    ) -> AsyncGenerator[Dict, None]:
+        """Stream one chat completion from the API and record it in the cache."""
+        
+        accumulator = ChatStreamAccumulator()
+        
+        try:
+            async with self._send(request, priority, session_id, stream=True) as response:
+                async for data in self._iter_sse_data(response):
+                    try:
+                        chunk = json.loads(data)
+                    except json.JSONDecodeError:
+                        logger.warning(f"Skipping malformed stream chunk: {data[:200]}")
+                        continue
+                    
+                    content = accumulator.add_chunk(chunk)
+                    if content:
+                        yield {"type": "content", "content": content}
+        except httpx.HTTPError as e:
+            logger.error(f"Error streaming from Codestral chat API: {e}")
+            raise
+        
+        response = accumulator.to_response()
+        if key:
+            await self.cache.put(key, response)
+        
+        yield {"type": "response", "response": response}
+    
+    async def _iter_sse_data(
+        self,
+        response: httpx.Response
+    ) -> AsyncGenerator[str, None]:
+        """Yield the data payload of each server-sent event until [DONE]."""
+        
+        async for line in response.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            
+            data = line[5:].strip()
+            if data == "[DONE]":
+                break
+            if data:
+                yield data
+    
     async def chat_complete(
         self,
         messages: List[Dict[str, str]],
         max_tokens: int = None,
         temperature: float = None,
         tools: Optional[List[Dict]] = None,
-        tool_choice: Optional[str] = None
+        tool_choice: Optional[str] = None,
+        cacheable: bool = None,
+        priority: RequestPriority = RequestPriority.INTERACTIVE,
+        session_id: Optional[str] = None,
+        builder: Optional[ChatRequestBuilder] = None
     ) -> Dict:
         """Generate chat completion with conversation history."""
         
-        max_tokens = max_tokens or settings.max_tokens
-        temperature = temperature or settings.temperature
+        payload = self._build_payload(messages, max_tokens, temperature, tools, tool_choice)
+        
+        return await self._cached_post(
+            payload,
+            (builder or ChatRequestBuilder()).build(payload),
+            cacheable,
+            "Codestral chat API",
+            priority,
+            session_id
+        )
+    
+    def _build_payload(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: int = None,
+        temperature: float = None,
+        tools: Optional[List[Dict]] = None,
+        tool_choice: Optional[str] = None
+    ) -> Dict:
+        """Build a chat completions request body."""
         
         payload = {
             "model": self.model,
             "messages": messages,
-            "max_tokens": max_tokens,
-            "temperature": temperature,
+            "max_tokens": max_tokens or settings.max_tokens,
+            # An explicit temperature of 0 must survive; it marks a deterministic request
+            "temperature": settings.temperature if temperature is None else temperature
         }
         
         # Add function calling support if tools provided
@@ -124,20 +249,249 @@ class CodestralClient:
             payload["tools"] = tools
             payload["tool_choice"] = tool_choice or "auto"
         
-        try:
-            response = await self.client.post(
-                f"{self.base_url}/chat/completions",
-                json=payload
+        return payload
+    
+    async def _cached_post(
+        self,
+        payload: Dict,
+        request: EncodedRequest,
+        cacheable: Optional[bool],
+        api_name: str,
+        priority: RequestPriority,
+        session_id: Optional[str]
+    ) -> Dict:
+        """POST a chat completions request, serving it from the cache when allowed."""
+        
+        key = self._cache_key_for(payload, request, cacheable)
+        if key:
+            cached = await self.cache.get(key)
+            if cached is not None:
+                return cached
+        self._check_replay_miss(key)
+        
+        if self.singleflight:
+            return await self.singleflight.do(
+                request.key,
+                lambda: self._post(request, key, api_name, priority, session_id)
             )
-            response.raise_for_status()
-            return response.json()
+        return await self._post(request, key, api_name, priority, session_id)
+    
+    async def _post(
+        self,
+        request: EncodedRequest,
+        key: Optional[str],
+        api_name: str,
+        priority: RequestPriority,
+        session_id: Optional[str]
+    ) -> Dict:
+        """POST one chat completions request and record it in the cache."""
+        
+        try:
+            async with self._send(request, priority, session_id) as response:
+                await response.aread()
+                result = response.json()
         except httpx.HTTPError as e:
-            logger.error(f"Error calling Codestral chat API: {e}")
+            logger.error(f"Error calling {api_name}: {e}")
             raise
+        
+        if key:
+            await self.cache.put(key, result)
+        return result
+    
+    @asynccontextmanager
+    async def _send(
+        self,
+        request: EncodedRequest,
+        priority: RequestPriority,
+        session_id: Optional[str],
+        stream: bool = False
+    ) -> AsyncGenerator[httpx.Response, None]:
+        """
+        Send a chat completions request through the scheduler and gateway.
+        
+        Rate-limited attempts are retried: immediately if another endpoint
+        is healthy, otherwise after the server's Retry-After. A streamed
+        response keeps its scheduler slot until it is consumed. Every 429,
+        5xx and transport error is reported to the scheduler, retried or
+        not, so it lowers the concurrency limit instead of raising it.
+        """
+        
+        attempt = 0
+        while True:
+            async with self.scheduler.slot(priority, session_id) as slot:
+                try:
+                    async with self.gateway.open("/chat/completions", request.body, stream) as (_, response):
+                        slot.response_started()
+                        if response.status_code == 429:
+                            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                            # Only hold everyone back when no endpoint can take the retry
+                            slot.rate_limited(0.0 if self.gateway.available() else retry_after)
+                            if attempt < self.max_retries:
+                                attempt += 1
+                                logger.warning(f"LLM request rate limited; retry {attempt}/{self.max_retries}")
+                                continue
+                        elif response.status_code >= 500:
+                            slot.failed()
+                        
+                        response.raise_for_status()
+                        yield response
+                        return
+                except httpx.TransportError:
+                    slot.failed()
+                    raise
+                except httpx.HTTPStatusError as e:
+                    # The gateway raises 5xx itself once every endpoint has failed
+                    if e.response.status_code >= 500:
+                        slot.failed()
+                    raise
+    
+    def _cache_key_for(
+        self,
+        payload: Dict,
+        request: EncodedRequest,
+        cacheable: Optional[bool]
+    ) -> Optional[str]:
+        """
+        Return the cache key for a request, or None if it must not be cached.
+        
+        Only deterministic requests (temperature 0) are cached unless the
+        caller, or the ``llm_cache_nondeterministic`` setting, opts in.
+        """
+        
+        if not self.cache or not self.cache.enabled:
+            return None
+        
+        if cacheable is None:
+            cacheable = settings.llm_cache_nondeterministic
+        
+        if payload["temperature"] != 0 and not cacheable:
+            return None
+        
+        return request.key
+    
+    def _check_replay_miss(self, key: Optional[str]) -> None:
+        """Refuse to reach the network in replay mode."""
+        
+        if self.cache and self.cache.replay:
+            if key is None:
+                raise CacheMissError(
+                    "Replay mode only serves cacheable requests; "
+                    "use temperature 0 or opt in to caching"
+                )
+            raise CacheMissError(f"No recorded response for request {key}")
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Return cache, request coalescing, scheduler and routing counters."""
+        
+        return {
+            "cache": self.cache.get_stats() if self.cache else None,
+            "singleflight": self.singleflight.get_stats() if self.singleflight else None,
+            "scheduler": self.scheduler.get_stats(),
+            "gateway": self.gateway.get_stats()
+        }
     
     async def close(self):
-        """Close HTTP client."""
-        await self.client.aclose()
+        """Close HTTP clients."""
+        await self.gateway.close()
+
+
+class ChatStreamAccumulator:
+    """Assembles streamed chat completion chunks into a full response."""
+    
+    def __init__(self):
+        self.id: Optional[str] = None
+        self.model: Optional[str] = None
+        self.role = "assistant"
+        self.content_parts: List[str] = []
+        self.tool_calls: Dict[int, Dict] = {}
+        self.finish_reason: Optional[str] = None
+        self.usage: Optional[Dict] = None
+    
+    def add_chunk(self, chunk: Dict) -> str:
+        """Merge one stream chunk and return the content text it added."""
+        
+        self.id = self.id or chunk.get("id")
+        self.model = self.model or chunk.get("model")
+        if chunk.get("usage"):
+            self.usage = chunk["usage"]
+        
+        content = ""
+        for choice in chunk.get("choices") or []:
+            if choice.get("index", 0) != 0:
+                continue
+            
+            delta = choice.get("delta") or {}
+            if delta.get("role"):
+                self.role = delta["role"]
+            
+            if delta.get("content"):
+                content += delta["content"]
+            
+            for fragment in delta.get("tool_calls") or []:
+                self._add_tool_call_fragment(fragment)
+            
+            if choice.get("finish_reason"):
+                self.finish_reason = choice["finish_reason"]
+        
+        if content:
+            self.content_parts.append(content)
+        return content
+    
+    def _add_tool_call_fragment(self, fragment: Dict) -> None:
+        """Append a partial tool call, keyed by its index in the message."""
+        
+        index = fragment.get("index", len(self.tool_calls))
+        tool_call = self.tool_calls.setdefault(index, {
+            "id": None,
+            "type": "function",
+            "function": {"name": "", "arguments": ""}
+        })
+        
+        if fragment.get("id"):
+            tool_call["id"] = fragment["id"]
+        if fragment.get("type"):
+            tool_call["type"] = fragment["type"]
+        
+        function = fragment.get("function") or {}
+        if function.get("name"):
+            tool_call["function"]["name"] += function["name"]
+        if function.get("arguments"):
+            arguments = function["arguments"]
+            # Some providers send complete argument objects instead of string fragments
+            if not isinstance(arguments, str):
+                arguments = json.dumps(arguments)
+            tool_call["function"]["arguments"] += arguments
+    
+    @property
+    def content(self) -> str:
+        """Content text received so far."""
+        return "".join(self.content_parts)
+    
+    def to_response(self) -> Dict:
+        """Build a response shaped like a non-streaming chat completion."""
+        
+        message: Dict[str, Any] = {
+            "role": self.role,
+            "content": self.content
+        }
+        if self.tool_calls:
+            message["tool_calls"] = [
+                self.tool_calls[index] for index in sorted(self.tool_calls)
+            ]
+        
+        response = {
+            "id": self.id,
+            "object": "chat.completion",
+            "model": self.model,
+            "choices": [{
+                "index": 0,
+                "message": message,
+                "finish_reason": self.finish_reason
+            }]
+        }
+        if self.usage:
+            response["usage"] = self.usage
+        return response
 
 
 class FunctionCall(BaseModel):
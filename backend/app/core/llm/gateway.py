@@ -0,0 +1,304 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncGenerator, Deque, Dict, List, Optional, Tuple
+import httpx
+from loguru import logger
+
+from app.core.llm.scheduler import parse_retry_after
+
+
+class LatencyTracker:
+    """EWMA and recent-sample percentiles of an endpoint's latency."""
+
+    def __init__(self, alpha: float = 0.2, window: int = 200):
+        self.alpha = alpha
+        self.ewma: Optional[float] = None
+        self.samples: Deque[float] = deque(maxlen=window)
+
+    def record(self, latency: float) -> None:
+        self.samples.append(latency)
+        if self.ewma is None:
+            self.ewma = latency
+        else:
+            self.ewma += (latency - self.ewma) * self.alpha
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class LLMEndpoint:
+    """One OpenAI-compatible API endpoint with its health and latency."""
+
+    def __init__(
+        self,
+        base_url: str,
+        api_key: str,
+        weight: float = 1.0,
+        name: Optional[str] = None,
+        timeout: float = 60.0,
+        failure_cooldown: float = 30.0,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.name = name or self.base_url
+        self.weight = weight
+        self.failure_cooldown = failure_cooldown
+        self.client = httpx.AsyncClient(
+            headers={
+                "Authorization": f"Bearer {api_key}",
+                "Content-Type": "application/json"
+            },
+            timeout=httpx.Timeout(timeout, connect=10.0),
+            transport=transport
+        )
+        # Streams are timed to first byte, full responses to completion
+        self.latency = {False: LatencyTracker(), True: LatencyTracker()}
+        self.unhealthy_until = 0.0
+        self.consecutive_failures = 0
+        self.stats = {"requests": 0, "failures": 0, "rate_limited": 0}
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.unhealthy_until
+
+    def score(self, stream: bool) -> float:
+        """Expected latency divided by weight; lower is better."""
+
+        tracker = self.latency[stream]
+        expected = tracker.ewma if tracker.ewma is not None else 0.0
+        return expected / max(self.weight, 1e-6)
+
+    def record_success(self, latency: float, stream: bool) -> None:
+        self.latency[stream].record(latency)
+        self.consecutive_failures = 0
+
+    def record_failure(self, retry_after: Optional[float] = None) -> None:
+        """Take the endpoint out of rotation for a cooldown (or Retry-After)."""
+
+        self.stats["failures"] += 1
+        self.consecutive_failures += 1
+        cooldown = retry_after
+        if cooldown is None:
+            cooldown = min(self.failure_cooldown, 2 ** (self.consecutive_failures - 1))
+        self.unhealthy_until = max(self.unhealthy_until, time.monotonic() + cooldown)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "name": self.name,
+            "weight": self.weight,
+            "healthy": self.healthy,
+            "latency_ewma": self.latency[False].ewma,
+            "latency_p95": self.latency[False].percentile(0.95),
+            "stream_ttfb_ewma": self.latency[True].ewma,
+            "stream_ttfb_p95": self.latency[True].percentile(0.95)
+        }
+
+
+class _RateLimited(Exception):
+    """An attempt answered 429; holds the response in case nothing better arrives."""
+
+    def __init__(self, response: httpx.Response):
+        super().__init__(f"Rate limited by {response.request.url}")
+        self.response = response
+
+
+class LLMGateway:
+    """
+    Routes requests across weighted LLM endpoints.
+
+    Requests go to the healthy endpoint with the lowest latency EWMA per
+    unit of weight. When hedging is enabled and the chosen endpoint has
+    not answered within its own p95 latency, the request is also sent to
+    the next best endpoint; whichever answers first wins and the other is
+    cancelled. Failed endpoints cool down and requests fail over.
+    """
+
+    def __init__(
+        self,
+        endpoints: List[LLMEndpoint],
+        hedge: bool = True,
+        hedge_min_delay: float = 0.5,
+        hedge_min_samples: int = 20
+    ):
+        if not endpoints:
+            raise ValueError("LLMGateway needs at least one endpoint")
+
+        self.endpoints = endpoints
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_min_samples = hedge_min_samples
+        self.stats = {"hedges": 0, "hedge_wins": 0, "failovers": 0}
+
+    def available(self) -> bool:
+        """Whether any endpoint is currently healthy."""
+        return any(endpoint.healthy for endpoint in self.endpoints)
+
+    def rank(self, stream: bool = False) -> List[LLMEndpoint]:
+        """Endpoints in routing order: healthy by score, then cooling down."""
+
+        return sorted(
+            self.endpoints,
+            key=lambda endpoint: (not endpoint.healthy, endpoint.score(stream))
+        )
+
+    @asynccontextmanager
+    async def open(
+        self,
+        path: str,
+        body: bytes,
+        stream: bool = False
+    ) -> AsyncGenerator[Tuple[LLMEndpoint, httpx.Response], None]:
+        """
+        POST ``body`` to the best endpoint and yield the winning response.
+
+        A 429 is only returned when no endpoint produced anything better;
+        the caller decides whether to retry.
+        """
+
+        endpoint, response = await self._request(path, body, stream)
+        try:
+            yield endpoint, response
+        finally:
+            await response.aclose()
+
+    async def close(self) -> None:
+        for endpoint in self.endpoints:
+            await endpoint.client.aclose()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "endpoints": [endpoint.get_stats() for endpoint in self.endpoints]
+        }
+
+    def _hedge_delay(self, endpoint: LLMEndpoint, stream: bool) -> Optional[float]:
+        tracker = endpoint.latency[stream]
+        if not self.hedge or len(tracker.samples) < self.hedge_min_samples:
+            return None
+        return max(self.hedge_min_delay, tracker.percentile(0.95))
+
+    async def _request(
+        self,
+        path: str,
+        body: bytes,
+        stream: bool
+    ) -> Tuple[LLMEndpoint, httpx.Response]:
+        candidates = self.rank(stream)
+        primary = candidates[0]
+        pending: Dict[asyncio.Task, LLMEndpoint] = {}
+        errors: List[BaseException] = []
+
+        def launch() -> Optional[float]:
+            endpoint = candidates.pop(0)
+            task = asyncio.create_task(self._attempt(endpoint, path, body, stream))
+            pending[task] = endpoint
+            return self._hedge_delay(endpoint, stream) if candidates else None
+
+        delay = launch()
+        hedged = False
+
+        try:
+            while pending:
+                done, _ = await asyncio.wait(
+                    pending,
+                    timeout=delay,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+
+                if not done:
+                    # The current attempt is slower than its p95; hedge
+                    self.stats["hedges"] += 1
+                    hedged = True
+                    logger.debug(f"Hedging LLM request after {delay:.2f}s")
+                    launch()
+                    # At most one hedge per request; further endpoints are failover only
+                    delay = None
+                    continue
+
+                winner = None
+                for task in done:
+                    endpoint = pending.pop(task)
+                    error = task.exception()
+                    if error is None and winner is None:
+                        winner = (endpoint, task.result())
+                    elif error is None:
+                        await task.result().aclose()
+                    else:
+                        errors.append(error)
+
+                if winner is not None:
+                    if hedged and winner[0] is not primary:
+                        self.stats["hedge_wins"] += 1
+                    return winner
+
+                if not pending and candidates:
+                    self.stats["failovers"] += 1
+                    delay = launch()
+        finally:
+            await self._cancel(pending)
+
+        # Every endpoint failed; surface the latest 429 so the caller can back off
+        rate_limited = [error for error in errors if isinstance(error, _RateLimited)]
+        for error in rate_limited[:-1]:
+            await error.response.aclose()
+        if rate_limited:
+            response = rate_limited[-1].response
+            return self._endpoint_for(response), response
+        raise errors[-1]
+
+    async def _attempt(
+        self,
+        endpoint: LLMEndpoint,
+        path: str,
+        body: bytes,
+        stream: bool
+    ) -> httpx.Response:
+        endpoint.stats["requests"] += 1
+        started = time.monotonic()
+
+        try:
+            request = endpoint.client.build_request("POST", f"{endpoint.base_url}{path}", content=body)
+            response = await endpoint.client.send(request, stream=stream)
+        except httpx.TransportError as e:
+            logger.warning(f"LLM endpoint {endpoint.name} failed: {e}")
+            endpoint.record_failure()
+            raise
+
+        if response.status_code == 429:
+            endpoint.stats["rate_limited"] += 1
+            endpoint.record_failure(parse_retry_after(response.headers.get("Retry-After")))
+            raise _RateLimited(response)
+
+        if response.status_code >= 500:
+            endpoint.record_failure()
+            await response.aclose()
+            response.raise_for_status()
+
+        endpoint.record_success(time.monotonic() - started, stream)
+        return response
+
+    async def _cancel(self, pending: Dict[asyncio.Task, LLMEndpoint]) -> None:
+        """Cancel losing attempts and close any response they already opened."""
+
+        for task in pending:
+            task.cancel()
+        results = await asyncio.gather(*pending, return_exceptions=True)
+        for result in results:
+            if isinstance(result, httpx.Response):
+                await result.aclose()
+            elif isinstance(result, _RateLimited):
+                await result.response.aclose()
+        pending.clear()
+
+    def _endpoint_for(self, response: httpx.Response) -> LLMEndpoint:
+        url = str(response.request.url)
+        for endpoint in self.endpoints:
+            if url.startswith(endpoint.base_url):
+                return endpoint
+        return self.endpoints[0]
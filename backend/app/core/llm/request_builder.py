@@ -0,0 +1,146 @@
+import hashlib
+import json
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+
+# Request fields that determine a completion; anything else (such as the
+# stream flag) is transport detail and must not change the request key.
+KEY_FIELDS = ("max_tokens", "messages", "model", "temperature", "tool_choice", "tools")
+
+
+def encode_json(value: Any) -> bytes:
+    """Encode a value as compact, key-sorted JSON, using orjson when installed."""
+
+    if orjson is not None:
+        try:
+            return orjson.dumps(value, option=orjson.OPT_SORT_KEYS)
+        except TypeError:
+            pass
+    return json.dumps(
+        value,
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+        default=str
+    ).encode("utf-8")
+
+
+def request_key(payload: Dict[str, Any]) -> str:
+    """Return a stable content hash of a request's key fields."""
+
+    return ChatRequestBuilder().build(payload).key
+
+
+class EncodedRequest(NamedTuple):
+    """A serialized request body and the content hash of its key fields."""
+
+    body: bytes
+    key: str
+
+
+class ChatRequestBuilder:
+    """
+    Builds chat completions bodies from cached, pre-encoded segments.
+
+    A conversation only ever appends messages, so each message is encoded
+    once and its bytes are reused by every later request; the tool schema
+    block is likewise encoded once. Messages must not be mutated after
+    they have been sent; replace them with a new dict instead.
+    """
+
+    def __init__(self):
+        # id(message) -> (message, encoded bytes, digest); the message
+        # reference keeps the id from being reused while the entry is alive
+        self._messages: Dict[int, Tuple[Dict, bytes, bytes]] = {}
+        self._tools: Optional[Tuple[List[Dict], bytes]] = None
+        self.stats = {
+            "builds": 0,
+            "bytes_encoded": 0,
+            "bytes_reused": 0
+        }
+
+    def build(self, payload: Dict[str, Any]) -> EncodedRequest:
+        """Serialize a payload, reusing segments encoded by earlier builds."""
+
+        self.stats["builds"] += 1
+        messages = self._message_entries(payload.get("messages") or [])
+
+        parts = [b"{"]
+        key_hash = hashlib.sha256()
+
+        for name in sorted(set(payload) | set(KEY_FIELDS)):
+            if name == "messages":
+                segment = None
+                # Hash per-message digests so the key costs O(new bytes), not O(history)
+                key_hash.update(b"messages:")
+                for entry in messages:
+                    key_hash.update(entry[2])
+            else:
+                if name == "tools":
+                    segment = self._encode_tools(payload.get("tools"))
+                else:
+                    segment = self._encode(payload.get(name))
+                if name in KEY_FIELDS:
+                    key_hash.update(name.encode("utf-8") + b":" + segment + b"\n")
+
+            if name not in payload:
+                continue
+
+            if len(parts) > 1:
+                parts.append(b",")
+            parts.append(b'"' + name.encode("utf-8") + b'":')
+            if segment is not None:
+                parts.append(segment)
+            else:
+                parts.append(b"[")
+                for index, entry in enumerate(messages):
+                    if index:
+                        parts.append(b",")
+                    parts.append(entry[1])
+                parts.append(b"]")
+
+        parts.append(b"}")
+        return EncodedRequest(b"".join(parts), key_hash.hexdigest())
+
+    def _encode(self, value: Any) -> bytes:
+        encoded = encode_json(value)
+        self.stats["bytes_encoded"] += len(encoded)
+        return encoded
+
+    def _message_entries(self, messages: List[Dict]) -> List[Tuple[Dict, bytes, bytes]]:
+        cached = self._messages
+        current: Dict[int, Tuple[Dict, bytes, bytes]] = {}
+        entries = []
+
+        for message in messages:
+            entry = cached.get(id(message))
+            if entry is not None and entry[0] is message:
+                self.stats["bytes_reused"] += len(entry[1])
+            else:
+                encoded = self._encode(message)
+                entry = (message, encoded, hashlib.sha256(encoded).digest())
+            current[id(message)] = entry
+            entries.append(entry)
+
+        # Keep only messages still in the conversation (compaction replaces some)
+        self._messages = current
+        return entries
+
+    def _encode_tools(self, tools: Optional[List[Dict]]) -> bytes:
+        if tools is None:
+            return b"null"
+
+        if self._tools is not None:
+            cached_tools, encoded = self._tools
+            if cached_tools is tools or cached_tools == tools:
+                self.stats["bytes_reused"] += len(encoded)
+                return encoded
+
+        encoded = self._encode(tools)
+        self._tools = (tools, encoded)
+        return encoded
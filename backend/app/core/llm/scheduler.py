@@ -0,0 +1,302 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from enum import IntEnum
+from typing import AsyncGenerator, Deque, Dict, Optional
+from loguru import logger
+
+
+class RequestPriority(IntEnum):
+    """Scheduling priority of an LLM request; lower values are served first."""
+
+    INTERACTIVE = 0
+    BACKGROUND = 1
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given in seconds or as an HTTP date."""
+
+    if not value:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class SchedulerSlot:
+    """A granted request slot; reports how the request went back to the scheduler."""
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.first_byte_at: Optional[float] = None
+        self.was_rate_limited = False
+        self.was_failed = False
+        self.retry_after: Optional[float] = None
+
+    def response_started(self) -> None:
+        """Mark the arrival of response headers; streams use this as their latency."""
+        if self.first_byte_at is None:
+            self.first_byte_at = time.monotonic()
+
+    def rate_limited(self, retry_after: Optional[float] = None) -> None:
+        """Mark the request as rejected with 429."""
+        self.was_rate_limited = True
+        self.retry_after = retry_after
+
+    def failed(self) -> None:
+        """Mark the request as failed with a server error or transport error."""
+        self.was_failed = True
+
+    @property
+    def latency(self) -> float:
+        return (self.first_byte_at or time.monotonic()) - self.started_at
+
+
+class LLMScheduler:
+    """
+    Admission control in front of the LLM API.
+
+    - Concurrency limit adapts AIMD-style: it grows by roughly one per
+      window of successful requests and is cut multiplicatively on a 429,
+      a server or transport error, or when latency exceeds the target.
+    - Retry-After pauses all dispatch until the server is ready again.
+    - Waiters are served strictly by priority, and round-robin across
+      sessions within a priority so one busy session cannot starve others.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = 8,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        latency_target: float = 30.0,
+        backoff_factor: float = 0.5,
+        decrease_cooldown: float = 1.0,
+        max_pause: float = 60.0
+    ):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.backoff_factor = backoff_factor
+        self.decrease_cooldown = decrease_cooldown
+        self.max_pause = max_pause
+
+        self._limit = float(max(min_limit, min(initial_limit, max_limit)))
+        self._in_flight = 0
+        self._queued = 0
+        # priority -> session -> waiters, sessions kept in round-robin order
+        self._queues: Dict[int, "OrderedDict[str, Deque[asyncio.Future]]"] = {
+            priority: OrderedDict() for priority in RequestPriority
+        }
+        self._paused_until = 0.0
+        self._resume_handle: Optional[asyncio.TimerHandle] = None
+        self._last_decrease = 0.0
+        self._consecutive_rate_limits = 0
+
+        self.stats = {
+            "granted": 0,
+            "rate_limited": 0,
+            "failures": 0,
+            "slow_responses": 0,
+            "limit_increases": 0,
+            "limit_decreases": 0,
+            "wait_time_avg": 0.0,
+            "wait_time_max": 0.0
+        }
+
+    @property
+    def limit(self) -> int:
+        """Current concurrency limit."""
+        return max(self.min_limit, int(self._limit))
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        priority: RequestPriority = RequestPriority.INTERACTIVE,
+        session_id: Optional[str] = None
+    ) -> AsyncGenerator[SchedulerSlot, None]:
+        """Hold a request slot for the duration of the block."""
+
+        await self.acquire(priority, session_id)
+        slot = SchedulerSlot()
+        try:
+            yield slot
+        finally:
+            self.release(slot.latency, slot.was_rate_limited, slot.retry_after, slot.was_failed)
+
+    async def acquire(
+        self,
+        priority: RequestPriority = RequestPriority.INTERACTIVE,
+        session_id: Optional[str] = None
+    ) -> float:
+        """Wait for a request slot and return how long the wait took."""
+
+        started = time.monotonic()
+
+        if self._queued == 0 and not self._is_paused() and self._in_flight < self.limit:
+            self._in_flight += 1
+            self._record_wait(0.0)
+            return 0.0
+
+        waiter = asyncio.get_running_loop().create_future()
+        session_key = session_id or ""
+        self._queues[priority].setdefault(session_key, deque()).append(waiter)
+        self._queued += 1
+        self._dispatch()
+
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Granted just before cancellation; hand the slot back. No
+                # request was sent, so the limit learns nothing from it
+                self._in_flight -= 1
+                self._dispatch()
+            else:
+                self._discard_waiter(priority, session_key, waiter)
+            raise
+
+        wait_time = time.monotonic() - started
+        self._record_wait(wait_time)
+        return wait_time
+
+    def release(
+        self,
+        latency: float,
+        rate_limited: bool = False,
+        retry_after: Optional[float] = None,
+        failed: bool = False
+    ) -> None:
+        """Return a slot and adapt the limit from the request's outcome."""
+
+        self._in_flight -= 1
+        now = time.monotonic()
+
+        if rate_limited:
+            self.stats["rate_limited"] += 1
+            self._consecutive_rate_limits += 1
+            if retry_after is None:
+                # No hint from the server; back off exponentially
+                retry_after = min(2 ** (self._consecutive_rate_limits - 1), self.max_pause)
+            self._pause(min(retry_after, self.max_pause), now)
+            self._decrease(now)
+        elif failed:
+            self.stats["failures"] += 1
+            self._consecutive_rate_limits = 0
+            self._decrease(now)
+        elif latency > self.latency_target:
+            self.stats["slow_responses"] += 1
+            self._consecutive_rate_limits = 0
+            self._decrease(now)
+        else:
+            self._consecutive_rate_limits = 0
+            if self._limit < self.max_limit:
+                previous = self.limit
+                self._limit = min(float(self.max_limit), self._limit + 1.0 / self._limit)
+                if self.limit > previous:
+                    self.stats["limit_increases"] += 1
+
+        self._dispatch()
+
+    def get_stats(self) -> Dict:
+        """Return the current limit, queue depths and wait time counters."""
+
+        return {
+            **self.stats,
+            "limit": self.limit,
+            "in_flight": self._in_flight,
+            "queue_depth": self._queued,
+            "queue_depth_by_priority": {
+                priority.name.lower(): sum(len(waiters) for waiters in self._queues[priority].values())
+                for priority in RequestPriority
+            },
+            "paused_for": max(0.0, self._paused_until - time.monotonic())
+        }
+
+    def _is_paused(self) -> bool:
+        return time.monotonic() < self._paused_until
+
+    def _pause(self, seconds: float, now: float) -> None:
+        if now + seconds > self._paused_until:
+            self._paused_until = now + seconds
+            logger.warning(f"LLM API rate limited; pausing dispatch for {seconds:.1f}s")
+
+    def _decrease(self, now: float) -> None:
+        # Responses to a burst arrive together; cut the limit once per burst
+        if now - self._last_decrease < self.decrease_cooldown:
+            return
+        self._last_decrease = now
+        previous = self.limit
+        self._limit = max(float(self.min_limit), self._limit * self.backoff_factor)
+        if self.limit < previous:
+            self.stats["limit_decreases"] += 1
+            logger.info(f"LLM concurrency limit reduced from {previous} to {self.limit}")
+
+    def _dispatch(self) -> None:
+        """Grant queued waiters while capacity allows."""
+
+        now = time.monotonic()
+        if now < self._paused_until:
+            if self._resume_handle is None:
+                self._resume_handle = asyncio.get_running_loop().call_later(
+                    self._paused_until - now,
+                    self._resume
+                )
+            return
+
+        while self._in_flight < self.limit:
+            waiter = self._next_waiter()
+            if waiter is None:
+                break
+            self._in_flight += 1
+            waiter.set_result(None)
+
+    def _resume(self) -> None:
+        self._resume_handle = None
+        self._dispatch()
+
+    def _next_waiter(self) -> Optional[asyncio.Future]:
+        for priority in RequestPriority:
+            sessions = self._queues[priority]
+            while sessions:
+                session_key, waiters = next(iter(sessions.items()))
+                waiter = waiters.popleft()
+                # Rotate the session to the back so others get the next turn
+                del sessions[session_key]
+                if waiters:
+                    sessions[session_key] = waiters
+                self._queued -= 1
+                if not waiter.done():
+                    return waiter
+        return None
+
+    def _discard_waiter(
+        self,
+        priority: RequestPriority,
+        session_key: str,
+        waiter: asyncio.Future
+    ) -> None:
+        waiters = self._queues[priority].get(session_key)
+        if waiters and waiter in waiters:
+            waiters.remove(waiter)
+            self._queued -= 1
+            if not waiters:
+                del self._queues[priority][session_key]
+
+    def _record_wait(self, wait_time: float) -> None:
+        self.stats["granted"] += 1
+        self.stats["wait_time_avg"] += (wait_time - self.stats["wait_time_avg"]) * 0.1
+        self.stats["wait_time_max"] = max(self.stats["wait_time_max"], wait_time)
@@ -0,0 +1,134 @@
+import asyncio
+import copy
+from typing import Any, AsyncGenerator, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+from loguru import logger
+
+
+class _StreamBroadcast:
+    """Pumps one upstream stream into a buffer that many subscribers replay."""
+
+    def __init__(self, source: AsyncIterator[Dict], on_done: Callable[[], None]):
+        self.events: List[Dict] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self._on_done = on_done
+        self._changed = asyncio.get_running_loop().create_future()
+        self._task = asyncio.create_task(self._pump(source))
+
+    async def _pump(self, source: AsyncIterator[Dict]) -> None:
+        try:
+            async for event in source:
+                self.events.append(event)
+                self._notify()
+        except asyncio.CancelledError:
+            self.error = asyncio.CancelledError("Upstream stream was cancelled")
+            raise
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            self._on_done()
+            self._notify()
+
+    def _notify(self) -> None:
+        if not self._changed.done():
+            self._changed.set_result(None)
+        self._changed = asyncio.get_running_loop().create_future()
+
+    async def subscribe(self) -> AsyncGenerator[Dict, None]:
+        """Replay buffered events, then follow the live stream to its end."""
+
+        self.subscribers += 1
+        index = 0
+        try:
+            while True:
+                if index < len(self.events):
+                    yield self.events[index]
+                    index += 1
+                    continue
+
+                if self.done:
+                    if self.error is not None:
+                        raise self.error
+                    return
+
+                # Shield so one subscriber leaving cannot cancel the shared waiter
+                await asyncio.shield(self._changed)
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0 and not self.done:
+                logger.debug("Last subscriber left; cancelling coalesced stream")
+                self._task.cancel()
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical requests onto one upstream call.
+
+    The first caller for a key (a miss) starts the upstream call; callers
+    arriving while it is in flight (hits) share its result. Streams are
+    fanned out event by event, and late joiners replay what they missed.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+        self._streams: Dict[str, _StreamBroadcast] = {}
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "stream_hits": 0,
+            "stream_misses": 0
+        }
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Run ``fn`` once for all concurrent callers with the same key."""
+
+        task = self._calls.get(key)
+        if task is not None:
+            self.stats["hits"] += 1
+            # Followers get their own copy so no caller can mutate another's result
+            return copy.deepcopy(await asyncio.shield(task))
+
+        self.stats["misses"] += 1
+        task = asyncio.ensure_future(fn())
+        self._calls[key] = task
+        task.add_done_callback(lambda _: self._forget(self._calls, key, task))
+
+        # Shield so the leader being cancelled does not fail its followers
+        return await asyncio.shield(task)
+
+    async def stream(
+        self,
+        key: str,
+        fn: Callable[[], AsyncIterator[Dict]]
+    ) -> AsyncGenerator[Dict, None]:
+        """Iterate the stream produced by ``fn``, sharing it with identical streams."""
+
+        broadcast = self._streams.get(key)
+        if broadcast is not None:
+            self.stats["stream_hits"] += 1
+        else:
+            self.stats["stream_misses"] += 1
+            broadcast = _StreamBroadcast(
+                fn(),
+                on_done=lambda: self._forget(self._streams, key, broadcast)
+            )
+            self._streams[key] = broadcast
+
+        async for event in broadcast.subscribe():
+            yield event
+
+    def get_stats(self) -> Dict[str, int]:
+        """Return hit/miss counters and the number of calls in flight."""
+
+        return {
+            **self.stats,
+            "in_flight": len(self._calls),
+            "streams_in_flight": len(self._streams)
+        }
+
+    @staticmethod
+    def _forget(registry: Dict[str, Any], key: str, entry: Any) -> None:
+        if registry.get(key) is entry:
+            del registry[key]
@@ -0,0 +1,233 @@
+import asyncio
+import json
+import os
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+import httpx
+from loguru import logger
+
+try:
+    import h2
+except ImportError:
+    h2 = None
+
+
+# Safe to send twice: retried after any transport error
+IDEMPOTENT_METHODS = {"GET", "HEAD", "PUT", "DELETE", "OPTIONS"}
+
+
+class SandboxAPIError(Exception):
+    """The sandbox API answered with an error status, or the sandbox is gone."""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(f"Sandbox API error {status_code}: {message}")
+        self.status_code = status_code
+
+
+class SandboxAPIClient:
+    """
+    Keep-alive connections to each sandbox's API.
+
+    Every container gets its own pooled httpx client, built on first use
+    and reused for every tool call until ``evict`` closes it. Requests go
+    straight to the container: over its address on the sandbox network,
+    or, with ``socket_dir``, over the Unix socket the sandbox API listens
+    on in that container's directory. Only sandboxes on another machine,
+    whose container info has an ``api_address``, are reached through the
+    port their host publishes. Idempotent requests are retried on transport errors; others
+    only when the connection could not be made, so nothing runs twice.
+
+    ``resolve`` maps a session ID to its container info, resuming the
+    sandbox if needed, or returns None when the session has no sandbox.
+    Callers that keep per-session state inside a sandbox, like shell IDs,
+    register with ``on_sandbox_removed`` to drop it with the sandbox.
+    """
+
+    def __init__(
+        self,
+        resolve: Callable[[str], Awaitable[Optional[Dict[str, Any]]]],
+        port: int = 8080,
+        socket_dir: Optional[str] = None,
+        http2: bool = False,
+        max_connections: int = 8,
+        keepalive_expiry: float = 60.0,
+        timeout: float = 60.0,
+        retries: int = 2
+    ):
+        self.resolve = resolve
+        self.port = port
+        self.socket_dir = socket_dir
+        # HTTP/2 needs the h2 package here and a server that speaks it in the sandbox
+        self.http2 = http2 and h2 is not None
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.timeout = timeout
+        self.retries = retries
+
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._removal_listeners: List[Callable[[str], None]] = []
+        self.stats = {"requests": 0, "retries": 0, "errors": 0, "pools_opened": 0, "pools_evicted": 0}
+
+    def socket_path(self, container_name: str) -> Optional[str]:
+        """Host path of a container's API socket, if sockets are in use."""
+        if not self.socket_dir:
+            return None
+        return os.path.join(self.socket_dir, container_name.lstrip("/"), "api.sock")
+
+    async def request(
+        self,
+        session_id: str,
+        method: str,
+        path: str,
+        timeout: float = None,
+        **kwargs
+    ) -> httpx.Response:
+        """Send a request to a session's sandbox API."""
+
+        container_info = await self.resolve(session_id)
+        if container_info is None:
+            raise SandboxAPIError(404, f"No sandbox for session {session_id}")
+        return await self.request_container(container_info, method, path, timeout=timeout, **kwargs)
+
+    async def get(self, session_id: str, path: str, **kwargs) -> Dict[str, Any]:
+        return (await self.request(session_id, "GET", path, **kwargs)).json()
+
+    async def post(self, session_id: str, path: str, **kwargs) -> Dict[str, Any]:
+        return (await self.request(session_id, "POST", path, **kwargs)).json()
+
+    async def request_container(
+        self,
+        container_info: Dict[str, Any],
+        method: str,
+        path: str,
+        timeout: float = None,
+        retries: int = None,
+        **kwargs
+    ) -> httpx.Response:
+        """Send a request to a container's sandbox API, before or after it has a session."""
+
+        if timeout is not None:
+            kwargs["timeout"] = httpx.Timeout(timeout, connect=10.0)
+        retries = self.retries if retries is None else retries
+        client = self._client(container_info)
+        self.stats["requests"] += 1
+
+        attempt = 0
+        while True:
+            try:
+                response = await client.request(method, path, **kwargs)
+                break
+            except httpx.TransportError as e:
+                # A failed connect never reached the server, so any method may retry it
+                retryable = method in IDEMPOTENT_METHODS or isinstance(e, httpx.ConnectError)
+                if attempt >= retries or not retryable:
+                    self.stats["errors"] += 1
+                    raise
+                attempt += 1
+                self.stats["retries"] += 1
+                logger.debug(f"Retrying {method} {path} on sandbox {container_info['id'][:12]}: {e!r}")
+                await asyncio.sleep(0.05 * 2 ** attempt)
+
+        self._raise_for_status(response)
+        return response
+
+    async def stream(
+        self,
+        session_id: str,
+        method: str,
+        path: str,
+        timeout: float = None,
+        **kwargs
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Send a request to a session's sandbox API and yield its NDJSON events as they arrive."""
+
+        container_info = await self.resolve(session_id)
+        if container_info is None:
+            raise SandboxAPIError(404, f"No sandbox for session {session_id}")
+        async for event in self.stream_container(container_info, method, path, timeout=timeout, **kwargs):
+            yield event
+
+    async def stream_container(
+        self,
+        container_info: Dict[str, Any],
+        method: str,
+        path: str,
+        timeout: float = None,
+        **kwargs
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Yield a container's NDJSON events as they arrive, without resolving or resuming its session."""
+
+        if timeout is not None:
+            kwargs["timeout"] = httpx.Timeout(timeout, connect=10.0)
+        self.stats["requests"] += 1
+
+        # Not retried: the server may already have acted on it
+        async with self._client(container_info).stream(method, path, **kwargs) as response:
+            if response.status_code >= 400:
+                await response.aread()
+                self._raise_for_status(response)
+            async for line in response.aiter_lines():
+                if line:
+                    yield json.loads(line)
+
+    async def evict(self, container_id: str) -> None:
+        """Close a container's connections; called when its sandbox is removed."""
+        client = self._clients.pop(container_id, None)
+        if client is not None:
+            self.stats["pools_evicted"] += 1
+            await client.aclose()
+
+    def on_sandbox_removed(self, listener: Callable[[str], None]) -> None:
+        """Call ``listener`` with the session ID whenever a session's sandbox is removed."""
+        self._removal_listeners.append(listener)
+
+    def sandbox_removed(self, session_id: str) -> None:
+        """Tell listeners a session's sandbox is gone; called by the manager."""
+        for listener in self._removal_listeners:
+            listener(session_id)
+
+    async def close(self) -> None:
+        clients = list(self._clients.values())
+        self._clients.clear()
+        await asyncio.gather(*(client.aclose() for client in clients), return_exceptions=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "pools": len(self._clients), "http2": self.http2}
+
+    def _raise_for_status(self, response: httpx.Response) -> None:
+        if response.status_code < 400:
+            return
+        self.stats["errors"] += 1
+        try:
+            message = response.json().get("detail", response.text)
+        except ValueError:
+            message = response.text
+        raise SandboxAPIError(response.status_code, message)
+
+    def _client(self, container_info: Dict[str, Any]) -> httpx.AsyncClient:
+        container_id = container_info["id"]
+        client = self._clients.get(container_id)
+        if client is not None:
+            return client
+
+        uds = self.socket_path(container_info["name"]) if container_info.get("name") else None
+        if uds:
+            base_url = "http://sandbox"
+        elif container_info.get("api_address"):
+            base_url = f"http://{container_info['api_address']}"
+        elif container_info.get("ip_address"):
+            base_url = f"http://{container_info['ip_address']}:{self.port}"
+        else:
+            raise SandboxAPIError(503, f"Container {container_id[:12]} has no network address")
+
+        client = httpx.AsyncClient(
+            # Plain HTTP only; verify=False skips loading CA certificates, ~50ms per client
+            transport=httpx.AsyncHTTPTransport(uds=uds, limits=self.limits, http2=self.http2, verify=False),
+            base_url=base_url,
+            timeout=httpx.Timeout(self.timeout, connect=10.0)
+        )
+        self._clients[container_id] = client
+        self.stats["pools_opened"] += 1
+        return client
@@ -1,5 +1,323 @@
-import docker
+import json
+import shlex
+import struct
+from typing import Any, AsyncIterable, AsyncIterator, Dict, List, Optional, Tuple, Union
+from urllib.parse import urlparse
+import httpx
+from loguru import logger
 
-def get_docker_client() -> docker.DockerClient:
-    """Returns a Docker client."""
-    return docker.from_env()
+from app.config import settings
+
+
+_SIZE_UNITS = {"b": 1, "k": 1024, "m": 1024 ** 2, "g": 1024 ** 3}
+
+
+def parse_bytes(value: Union[int, str, None]) -> Optional[int]:
+    """Convert a docker-style size such as "2g" to bytes."""
+
+    if value is None or isinstance(value, int):
+        return value
+    value = value.strip().lower()
+    if value and value[-1] in _SIZE_UNITS:
+        return int(float(value[:-1]) * _SIZE_UNITS[value[-1]])
+    return int(value)
+
+
+def demux_stream(data: bytes) -> Tuple[bytes, bytes]:
+    """Split a multiplexed attach/logs stream into stdout and stderr."""
+
+    stdout, stderr = [], []
+    offset = 0
+    while offset + 8 <= len(data):
+        stream_type, length = struct.unpack(">BxxxL", data[offset:offset + 8])
+        offset += 8
+        chunk = data[offset:offset + length]
+        offset += length
+        (stderr if stream_type == 2 else stdout).append(chunk)
+    return b"".join(stdout), b"".join(stderr)
+
+
+class DockerAPIError(Exception):
+    """The Docker Engine API answered with an error status."""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(f"Docker API error {status_code}: {message}")
+        self.status_code = status_code
+
+
+class DockerClient:
+    """
+    Async client for the Docker Engine API.
+
+    Talks HTTP to the Docker socket (or a TCP daemon) with a pooled
+    httpx client, so container operations never block the event loop.
+    Containers are referred to by ID; inspect results are plain dicts.
+    """
+
+    def __init__(
+        self,
+        host: str = None,
+        api_version: str = None,
+        timeout: float = 60.0,
+        max_connections: int = None
+    ):
+        host = host or settings.docker_host
+        self.api_version = api_version or settings.docker_api_version
+        limits = httpx.Limits(max_connections=max_connections or settings.docker_max_connections)
+
+        parsed = urlparse(host)
+        uds = parsed.path if parsed.scheme == "unix" else None
+        base_url = "http://docker" if uds else f"http://{parsed.netloc}" if parsed.scheme == "tcp" else host
+        base_url = f"{base_url.rstrip('/')}/{self.api_version}"
+
+        self.client = httpx.AsyncClient(
+            transport=httpx.AsyncHTTPTransport(uds=uds, limits=limits),
+            base_url=base_url,
+            timeout=httpx.Timeout(timeout, connect=10.0)
+        )
+        # Stats streams stay open for a container's lifetime, one connection
+        # each; they get their own uncapped pool so they never starve requests
+        self._streams = httpx.AsyncClient(
+            transport=httpx.AsyncHTTPTransport(
+                uds=uds,
+                limits=httpx.Limits(max_connections=None, max_keepalive_connections=0)
+            ),
+            base_url=base_url,
+            timeout=httpx.Timeout(None, connect=10.0)
+        )
+
+    async def ping(self) -> bool:
+        """Check that the daemon is reachable."""
+        response = await self._request("GET", "/_ping")
+        return response.text == "OK"
+
+    async def info(self) -> Dict[str, Any]:
+        """System-wide information, including the host's NCPU and MemTotal."""
+        response = await self._request("GET", "/info")
+        return response.json()
+
+    async def create_container(
+        self,
+        image: str,
+        name: str = None,
+        environment: Dict[str, str] = None,
+        network: str = None,
+        cap_add: List[str] = None,
+        shm_size: Union[int, str] = None,
+        mem_limit: Union[int, str] = None,
+        cpu_period: int = None,
+        cpu_quota: int = None,
+        ports: Dict[int, Optional[int]] = None,
+        labels: Dict[str, str] = None,
+        binds: List[str] = None
+    ) -> str:
+        """Create a container and return its ID."""
+
+        ports = ports or {}
+        host_config = {
+            "CapAdd": cap_add,
+            "ShmSize": parse_bytes(shm_size),
+            "Memory": parse_bytes(mem_limit),
+            "CpuPeriod": cpu_period,
+            "CpuQuota": cpu_quota,
+            "NetworkMode": network,
+            "Binds": binds,
+            "PortBindings": {
+                f"{port}/tcp": [{"HostPort": str(host_port) if host_port else ""}]
+                for port, host_port in ports.items()
+            }
+        }
+        body = {
+            "Image": image,
+            "Env": [f"{key}={value}" for key, value in (environment or {}).items()],
+            "Labels": labels or {},
+            "ExposedPorts": {f"{port}/tcp": {} for port in ports},
+            "HostConfig": {key: value for key, value in host_config.items() if value is not None}
+        }
+
+        params = {"name": name} if name else None
+        response = await self._request("POST", "/containers/create", params=params, json=body)
+        return response.json()["Id"]
+
+    async def start_container(self, container_id: str) -> None:
+        await self._request("POST", f"/containers/{container_id}/start")
+
+    async def stop_container(self, container_id: str, timeout: int = 10) -> None:
+        # The daemon waits up to ``timeout`` before killing; allow for it
+        await self._request(
+            "POST",
+            f"/containers/{container_id}/stop",
+            params={"t": timeout},
+            timeout=timeout + 30
+        )
+
+    async def pause_container(self, container_id: str) -> None:
+        """Freeze every process in the container (cgroup freezer)."""
+        await self._request("POST", f"/containers/{container_id}/pause")
+
+    async def unpause_container(self, container_id: str) -> None:
+        await self._request("POST", f"/containers/{container_id}/unpause")
+
+    async def remove_container(self, container_id: str, force: bool = False) -> None:
+        await self._request(
+            "DELETE",
+            f"/containers/{container_id}",
+            params={"force": str(force).lower(), "v": "true"}
+        )
+
+    async def update_container(
+        self,
+        container_id: str,
+        cpu_quota: int = None,
+        memory: Union[int, str] = None
+    ) -> None:
+        """Change a running container's CPU quota and memory limit in place."""
+
+        body = {}
+        if cpu_quota is not None:
+            body["CpuQuota"] = cpu_quota
+        if memory is not None:
+            # No swap: the swap limit must move with the memory limit
+            body["Memory"] = body["MemorySwap"] = parse_bytes(memory)
+        await self._request("POST", f"/containers/{container_id}/update", json=body)
+
+    async def stream_stats(self, container_id: str) -> AsyncIterator[Dict[str, Any]]:
+        """Yield a container's resource stats as the daemon pushes them, about once a second."""
+
+        async with self._streams.stream(
+            "GET",
+            f"/containers/{container_id}/stats",
+            params={"stream": "true"}
+        ) as response:
+            if response.status_code >= 400:
+                await response.aread()
+                raise DockerAPIError(response.status_code, response.text)
+            # Samples are newline-delimited JSON
+            async for line in response.aiter_lines():
+                if line.strip():
+                    yield json.loads(line)
+
+    async def inspect_container(self, container_id: str) -> Dict[str, Any]:
+        response = await self._request("GET", f"/containers/{container_id}/json")
+        return response.json()
+
+    async def execute_command(
+        self,
+        container_id: str,
+        command: Union[str, List[str]],
+        stdout: bool = True,
+        stderr: bool = True,
+        workdir: str = None,
+        environment: Dict[str, str] = None,
+        timeout: float = None
+    ) -> Dict[str, Any]:
+        """Run a command in a container and return its exit code and output."""
+
+        body = {
+            "Cmd": shlex.split(command) if isinstance(command, str) else command,
+            "AttachStdout": stdout,
+            "AttachStderr": stderr,
+            "Tty": False
+        }
+        if workdir:
+            body["WorkingDir"] = workdir
+        if environment:
+            body["Env"] = [f"{key}={value}" for key, value in environment.items()]
+
+        response = await self._request("POST", f"/containers/{container_id}/exec", json=body)
+        exec_id = response.json()["Id"]
+
+        response = await self._request(
+            "POST",
+            f"/exec/{exec_id}/start",
+            json={"Detach": False, "Tty": False},
+            timeout=timeout
+        )
+        out, err = demux_stream(response.content)
+
+        response = await self._request("GET", f"/exec/{exec_id}/json")
+        return {
+            "exit_code": response.json().get("ExitCode"),
+            "stdout": out.decode("utf-8", errors="replace"),
+            "stderr": err.decode("utf-8", errors="replace"),
+            "output": (out + err).decode("utf-8", errors="replace")
+        }
+
+    async def export_archive(self, container_id: str, path: str) -> AsyncIterator[bytes]:
+        """Stream a tar archive of ``path`` in a container, chunk by chunk."""
+
+        async with self.client.stream(
+            "GET",
+            f"/containers/{container_id}/archive",
+            params={"path": path},
+            timeout=httpx.Timeout(None, connect=10.0)
+        ) as response:
+            if response.status_code >= 400:
+                await response.aread()
+                raise DockerAPIError(response.status_code, response.text)
+            async for chunk in response.aiter_bytes():
+                yield chunk
+
+    async def put_archive(
+        self,
+        container_id: str,
+        path: str,
+        data: Union[bytes, AsyncIterable[bytes]]
+    ) -> None:
+        """Extract a tar archive (plain or gzip) into ``path`` in a container."""
+
+        await self._request(
+            "PUT",
+            f"/containers/{container_id}/archive",
+            params={"path": path},
+            content=data,
+            headers={"Content-Type": "application/x-tar"},
+            timeout=600.0
+        )
+
+    async def get_container_logs(
+        self,
+        container_id: str,
+        stdout: bool = True,
+        stderr: bool = True,
+        tail: Union[int, str] = "all",
+        timestamps: bool = False
+    ) -> str:
+        response = await self._request(
+            "GET",
+            f"/containers/{container_id}/logs",
+            params={
+                "stdout": str(stdout).lower(),
+                "stderr": str(stderr).lower(),
+                "tail": tail,
+                "timestamps": str(timestamps).lower()
+            }
+        )
+        out, err = demux_stream(response.content)
+        return (out + err).decode("utf-8", errors="replace")
+
+    async def close(self) -> None:
+        await self._streams.aclose()
+        await self.client.aclose()
+
+    async def _request(
+        self,
+        method: str,
+        path: str,
+        timeout: float = None,
+        **kwargs
+    ) -> httpx.Response:
+        if timeout is not None:
+            kwargs["timeout"] = httpx.Timeout(timeout, connect=10.0)
+        response = await self.client.request(method, path, **kwargs)
+
+        # 304: already started/stopped, which is what the caller wanted
+        if response.status_code >= 400:
+            try:
+                message = response.json().get("message", response.text)
+            except ValueError:
+                message = response.text
+            logger.debug(f"Docker API {method} {path} failed: {message}")
+            raise DockerAPIError(response.status_code, message)
+
+        return response
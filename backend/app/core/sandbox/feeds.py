@@ -0,0 +1,216 @@
+import asyncio
+import time
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Set, Tuple
+from loguru import logger
+
+from app.core.sandbox.api_client import SandboxAPIClient
+
+
+# The sandbox pings an idle feed every 15 seconds; three missed pings mean the connection is dead
+READ_TIMEOUT = 45.0
+# Batches a subscriber may fall behind by before it is sent a reset instead
+QUEUE_SIZE = 64
+# How often feeds are matched against subscribers and sandboxes without being woken
+RECONCILE_SECONDS = 5.0
+MAX_RETRY_SECONDS = 30.0
+
+
+def reset_batch(path: str = "/workspace") -> Dict[str, Any]:
+    """A batch telling a subscriber that changes were missed and ``path`` should be listed again."""
+    return {"type": "workspace_changes", "events": [{"type": "reset", "path": path}]}
+
+
+class WorkspaceFeeds:
+    """
+    Workspace change feeds of every watched sandbox, read by one task.
+
+    Subscribers are queues, one per WebSocket, keyed by session. A
+    sandbox's /api/files/changes feed is open while its session has a
+    subscriber and ``target`` returns its container info; ``target``
+    returns None for paused sandboxes, which have nothing to report and
+    would only time out. Every batch from a feed is put on each of its
+    session's queues as a ``workspace_changes`` message.
+
+    Batches are numbered by the sandbox, and a feed's first line carries
+    the current number. If it moved on while the feed was closed or
+    reconnecting, or the sandbox is a new container, subscribers get a
+    reset. So does a subscriber whose queue is full.
+    """
+
+    def __init__(
+        self,
+        api: SandboxAPIClient,
+        target: Callable[[str], Optional[Dict[str, Any]]],
+        read_timeout: float = READ_TIMEOUT
+    ):
+        self.api = api
+        self.target = target
+        self.read_timeout = read_timeout
+
+        self.subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._streams: Dict[str, AsyncIterator[Dict[str, Any]]] = {}
+        self._containers: Dict[str, str] = {}
+        self._reads: Dict[asyncio.Future, str] = {}
+        self._pending: Dict[str, asyncio.Future] = {}
+        # session -> (container ID, last batch number seen)
+        self._positions: Dict[str, Tuple[str, int]] = {}
+        # session -> (monotonic time of the next attempt, current backoff)
+        self._retry_at: Dict[str, Tuple[float, float]] = {}
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"feeds_opened": 0, "feed_errors": 0, "batches": 0, "events": 0, "resets": 0, "overflows": 0}
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for session_id in list(self._streams):
+            self._close_feed(session_id)
+
+    def subscribe(self, session_id: str) -> asyncio.Queue:
+        """A queue of ``workspace_changes`` messages for a session, until ``unsubscribe``."""
+        queue: asyncio.Queue = asyncio.Queue(QUEUE_SIZE)
+        self.subscribers.setdefault(session_id, set()).add(queue)
+        self.refresh()
+        return queue
+
+    def unsubscribe(self, session_id: str, queue: asyncio.Queue) -> None:
+        queues = self.subscribers.get(session_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self.subscribers[session_id]
+            self.refresh()
+
+    def refresh(self) -> None:
+        """Re-match feeds now, e.g. after a sandbox was created or resumed."""
+        self._wakeup.set()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "feeds": len(self._streams),
+            "sessions": len(self.subscribers),
+            "subscribers": sum(len(queues) for queues in self.subscribers.values())
+        }
+
+    async def _run(self) -> None:
+        while True:
+            self._reconcile()
+            wakeup = asyncio.ensure_future(self._wakeup.wait())
+            try:
+                done, _ = await asyncio.wait(
+                    {wakeup, *self._reads},
+                    timeout=RECONCILE_SECONDS,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+            finally:
+                wakeup.cancel()
+            self._wakeup.clear()
+
+            for read in done:
+                session_id = self._reads.pop(read, None)
+                if session_id is None:
+                    continue
+                self._pending.pop(session_id, None)
+                try:
+                    message = read.result()
+                except Exception as e:
+                    self._lost(session_id, e)
+                    continue
+                self._handle(session_id, message)
+                self._read_next(session_id)
+
+    def _reconcile(self) -> None:
+        for session_id in list(self._streams):
+            if session_id not in self.subscribers or self.target(session_id) is None:
+                self._close_feed(session_id)
+
+        now = time.monotonic()
+        for session_id in self.subscribers:
+            if session_id in self._streams or self._retry_at.get(session_id, (0.0,))[0] > now:
+                continue
+            container_info = self.target(session_id)
+            if container_info is None:
+                continue
+            self._containers[session_id] = container_info["id"]
+            self._streams[session_id] = self.api.stream_container(
+                container_info,
+                "GET",
+                "/api/files/changes",
+                timeout=self.read_timeout
+            )
+            self.stats["feeds_opened"] += 1
+            self._read_next(session_id)
+
+        for session_id in list(self._positions):
+            if session_id not in self.subscribers:
+                # Nobody is left to tell about a gap
+                del self._positions[session_id]
+                self._retry_at.pop(session_id, None)
+
+    def _read_next(self, session_id: str) -> None:
+        read = asyncio.ensure_future(self._streams[session_id].__anext__())
+        # Reads of a closed feed are never awaited; mark their errors as seen
+        read.add_done_callback(lambda future: future.cancelled() or future.exception())
+        self._reads[read] = session_id
+        self._pending[session_id] = read
+
+    def _handle(self, session_id: str, message: Dict[str, Any]) -> None:
+        kind = message.get("type")
+        container_id = self._containers[session_id]
+        if kind == "hello":
+            self._retry_at.pop(session_id, None)
+            position = self._positions.get(session_id)
+            if position is not None and position != (container_id, message["seq"]):
+                self._broadcast(session_id, reset_batch(message.get("path", "/workspace")))
+                self.stats["resets"] += 1
+            self._positions[session_id] = (container_id, message["seq"])
+        elif kind == "changes":
+            self._positions[session_id] = (container_id, message["seq"])
+            self.stats["batches"] += 1
+            self.stats["events"] += len(message["events"])
+            self._broadcast(
+                session_id,
+                {"type": "workspace_changes", "seq": message["seq"], "events": message["events"]}
+            )
+
+    def _broadcast(self, session_id: str, batch: Dict[str, Any]) -> None:
+        for queue in self.subscribers.get(session_id, ()):
+            try:
+                queue.put_nowait(batch)
+            except asyncio.QueueFull:
+                # The client is not keeping up; it re-lists instead of replaying the backlog
+                self.stats["overflows"] += 1
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(reset_batch())
+
+    def _lost(self, session_id: str, error: BaseException) -> None:
+        """A feed ended or failed; reopen it after a backoff that a successful hello resets."""
+        self._streams.pop(session_id, None)
+        self._containers.pop(session_id, None)
+        delay = min(max(self._retry_at.get(session_id, (0.0, 0.0))[1] * 2, 1.0), MAX_RETRY_SECONDS)
+        self._retry_at[session_id] = (time.monotonic() + delay, delay)
+        if not isinstance(error, StopAsyncIteration):
+            self.stats["feed_errors"] += 1
+            logger.debug(f"Workspace feed for session {session_id} failed, retrying in {delay:.0f}s: {error!r}")
+
+    def _close_feed(self, session_id: str) -> None:
+        stream = self._streams.pop(session_id, None)
+        self._containers.pop(session_id, None)
+        read = self._pending.pop(session_id, None)
+        if read is not None:
+            self._reads.pop(read, None)
+            if not read.done():
+                # Cancelling the pending read unwinds the stream and closes its connection
+                read.cancel()
+                return
+        if stream is not None:
+            asyncio.ensure_future(stream.aclose())
@@ -1,31 +1,227 @@
-from typing import Dict, Optional
+import asyncio
+import heapq
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
 from datetime import datetime, timedelta
+from loguru import logger
+
+class DeadlineHeap:
+    """
+    Per-key deadlines in a min-heap.
+
+    Moving a deadline later is O(1): the heap keeps the key's older entry
+    and re-pushes it with the current deadline when it surfaces.
+    """
+
+    def __init__(self):
+        self._deadlines: Dict[str, float] = {}
+        self._heap: List[Tuple[float, str]] = []
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._deadlines
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    @property
+    def heap_size(self) -> int:
+        return len(self._heap)
+
+    def get(self, key: str) -> Optional[float]:
+        return self._deadlines.get(key)
+
+    def set(self, key: str, deadline: float) -> None:
+        current = self._deadlines.get(key)
+        self._deadlines[key] = deadline
+        # Later deadlines are fixed up lazily; earlier ones need an entry now
+        if current is None or deadline < current:
+            heapq.heappush(self._heap, (deadline, key))
+
+    def discard(self, key: str) -> None:
+        """Forget a key; its heap entry is dropped when it surfaces."""
+        self._deadlines.pop(key, None)
+
+    def next_deadline(self) -> Optional[float]:
+        """The earliest deadline, or an earlier stale one (which only wakes early)."""
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: float) -> List[str]:
+        """Remove and return keys whose deadline is at or before ``now``."""
+
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            deadline, key = heapq.heappop(self._heap)
+            current = self._deadlines.get(key)
+            if current is None:
+                continue
+            if current > deadline:
+                # Moved later since this entry was pushed
+                heapq.heappush(self._heap, (current, key))
+                continue
+            del self._deadlines[key]
+            due.append(key)
+        return due
+
 
 class SandboxLifecycle:
-    """Manages the lifecycle of a sandbox."""
+    """
+    Manages the lifecycle of sandboxes.
 
-    def __init__(self, ttl_minutes: int = 30):
+    Each sandbox has a deadline ``ttl`` after its last activity; ``touch``
+    slides it forward. Deadlines are kept in a min-heap, so a background
+    reaper sleeps until the earliest one and then destroys everything that
+    is more than ``grace_seconds`` past its deadline, at most
+    ``max_concurrent_destroys`` at a time. With ``idle_seconds`` set,
+    ``on_idle`` is called for sandboxes without activity for that long;
+    the next touch re-arms it.
+    """
+
+    def __init__(
+        self,
+        ttl_minutes: int = 30,
+        destroy: Optional[Callable[[str], Awaitable[None]]] = None,
+        grace_seconds: float = 0.0,
+        max_concurrent_destroys: int = 4,
+        idle_seconds: float = 0.0,
+        on_idle: Optional[Callable[[str], Awaitable[None]]] = None
+    ):
         self.ttl = timedelta(minutes=ttl_minutes)
-        self.active_sandboxes: Dict[str, Dict] = {}
+        self.destroy = destroy
+        self.grace_seconds = grace_seconds
+        self.max_concurrent_destroys = max(1, max_concurrent_destroys)
+        self.idle_seconds = idle_seconds if on_idle is not None else 0.0
+        self.on_idle = on_idle
+
+        self._expiry = DeadlineHeap()
+        self._idle = DeadlineHeap()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._tasks: Set[asyncio.Task] = set()
+        # Shared by destroys and idle callbacks, which both talk to Docker
+        self._slots = asyncio.Semaphore(self.max_concurrent_destroys)
+        self.stats = {"reaped": 0, "reap_failures": 0, "idled": 0}
 
-    def register_sandbox(self, session_id: str, container: 'docker.models.containers.Container'):
+    def register_sandbox(self, session_id: str) -> None:
         """Registers a new sandbox."""
-        self.active_sandboxes[session_id] = {
-            "container": container,
-            "created_at": datetime.utcnow(),
-            "expires_at": datetime.utcnow() + self.ttl,
-        }
+        now = time.monotonic()
+        self._expiry.set(session_id, now + self.ttl.total_seconds())
+        if self.idle_seconds:
+            self._idle.set(session_id, now + self.idle_seconds)
+        self._wakeup.set()
 
     def unregister_sandbox(self, session_id: str):
         """Unregisters a sandbox."""
-        if session_id in self.active_sandboxes:
-            del self.active_sandboxes[session_id]
-
-    def get_expired_sandboxes(self) -> list[str]:
-        """Returns a list of expired sandbox session IDs."""
-        now = datetime.utcnow()
-        return [
-            sid
-            for sid, info in self.active_sandboxes.items()
-            if info["expires_at"] < now
+        self._expiry.discard(session_id)
+        self._idle.discard(session_id)
+
+    def touch(self, session_id: str) -> bool:
+        """Slide a sandbox's deadlines forward from now; O(1)."""
+
+        if session_id not in self._expiry:
+            return False
+        now = time.monotonic()
+        self._expiry.set(session_id, now + self.ttl.total_seconds())
+        if self.idle_seconds:
+            rearmed = session_id not in self._idle
+            self._idle.set(session_id, now + self.idle_seconds)
+            if rearmed:
+                self._wakeup.set()
+        return True
+
+    def expires_at(self, session_id: str) -> Optional[datetime]:
+        """Wall-clock time at which a sandbox expires."""
+        deadline = self._expiry.get(session_id)
+        if deadline is None:
+            return None
+        return datetime.utcnow() + timedelta(seconds=deadline - time.monotonic())
+
+    def is_expired(self, session_id: str) -> bool:
+        deadline = self._expiry.get(session_id)
+        return deadline is not None and time.monotonic() > deadline
+
+    def get_expired_sandboxes(self, grace_seconds: float = 0.0) -> list[str]:
+        """Pops and returns sandboxes more than ``grace_seconds`` past their deadline."""
+        expired = self._expiry.pop_due(time.monotonic() - grace_seconds)
+        for session_id in expired:
+            self._idle.discard(session_id)
+        return expired
+
+    def start(self) -> None:
+        """Start the background reaper."""
+        if self._task is None and self.destroy is not None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """Stop the reaper and wait for destroys already under way."""
+
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def reap(self, grace_seconds: Optional[float] = None) -> int:
+        """Destroy every expired sandbox now and wait for the destroys."""
+
+        grace = self.grace_seconds if grace_seconds is None else grace_seconds
+        tasks = [
+            self._spawn(self._destroy, session_id)
+            for session_id in self.get_expired_sandboxes(grace)
         ]
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        return len(tasks)
+
+    def get_stats(self) -> Dict:
+        return {
+            **self.stats,
+            "active": len(self._expiry),
+            "armed_idle": len(self._idle),
+            "in_progress": len(self._tasks),
+            "heap_size": self._expiry.heap_size + self._idle.heap_size
+        }
+
+    async def _run(self) -> None:
+        while True:
+            for session_id in self.get_expired_sandboxes(self.grace_seconds):
+                self._spawn(self._destroy, session_id)
+            for session_id in self._idle.pop_due(time.monotonic()):
+                self._spawn(self._idle_callback, session_id)
+
+            self._wakeup.clear()
+            deadlines = []
+            if self._expiry.next_deadline() is not None:
+                deadlines.append(self._expiry.next_deadline() + self.grace_seconds)
+            if self._idle.next_deadline() is not None:
+                deadlines.append(self._idle.next_deadline())
+            timeout = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+            try:
+                # A registration may bring the earliest deadline forward
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _spawn(self, fn: Callable[[str], Awaitable[None]], session_id: str) -> asyncio.Task:
+        task = asyncio.create_task(fn(session_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _destroy(self, session_id: str) -> None:
+        async with self._slots:
+            try:
+                await self.destroy(session_id)
+                self.stats["reaped"] += 1
+                logger.info(f"Reaped idle sandbox for session {session_id}")
+            except Exception as e:
+                self.stats["reap_failures"] += 1
+                logger.error(f"Failed to reap sandbox for session {session_id}: {e}")
+
+    async def _idle_callback(self, session_id: str) -> None:
+        async with self._slots:
+            try:
+                await self.on_idle(session_id)
+                self.stats["idled"] += 1
+            except Exception as e:
+                logger.error(f"Idle handler failed for session {session_id}: {e}")
@@ -1,27 +1,167 @@
-import docker
+import asyncio
+import os
+import shlex
+import shutil
+import time
+import uuid
+import httpx
 from typing import Dict, Optional, List, Any
-from datetime import datetime, timedelta
+from datetime import datetime
 from loguru import logger
 
 from app.config import settings
-from app.core.sandbox.docker_client import DockerClient
+from app.core.sandbox.api_client import SandboxAPIClient, SandboxAPIError
+from app.core.sandbox.docker_client import DockerAPIError, DockerClient, parse_bytes
+from app.core.sandbox.feeds import WorkspaceFeeds
+from app.core.sandbox.lifecycle import SandboxLifecycle
+from app.core.sandbox.placement import DockerHost, NoCapacityError, SandboxPlacement
+from app.core.sandbox.pool import SandboxPool
+from app.core.sandbox.snapshots import SnapshotStore, SnapshotTooLargeError
+from app.core.sandbox.telemetry import ResizePolicy, SandboxTelemetry
+from app.core.sandbox.transfer import WorkspaceSource, seed_workspace
+
+
+# Written when a warm container is bound to a session; overrides SESSION_ID
+SESSION_FILE = "/tmp/sandbox_session_id"
+
+# The sandbox API's port inside the container
+SANDBOX_API_CONTAINER_PORT = 8080
+
+# Where each container's API socket directory is mounted, with socket_dir set
+SANDBOX_SOCKET_MOUNT = "/run/sandbox-api"
+
+# Resources reserved by each sandbox
+SANDBOX_CPU_PERIOD = 100000
+SANDBOX_CPU_QUOTA = 150000  # 1.5 CPU cores
+SANDBOX_MEMORY = "2g"
+SANDBOX_CPUS = SANDBOX_CPU_QUOTA / SANDBOX_CPU_PERIOD
+SANDBOX_MEMORY_BYTES = parse_bytes(SANDBOX_MEMORY)
 
 
 class SandboxManager:
-    """Manages Docker sandbox containers for isolated execution."""
+    """
+    Manages Docker sandbox containers for isolated execution.
+    
+    Containers are spread over the Docker hosts in ``placement``; with
+    only ``docker_client`` given, everything runs on that one daemon.
+    """
     
     def __init__(
         self,
-        docker_client: DockerClient,
+        docker_client: DockerClient = None,
         image: str = None,
         network: str = None,
-        ttl_minutes: int = None
+        ttl_minutes: int = None,
+        placement: SandboxPlacement = None
     ):
-        self.docker = docker_client
+        self.placement = placement or SandboxPlacement([DockerHost("local", docker_client)])
+        remote = [host.name for host in self.placement.hosts.values() if host.address]
+        if settings.sandbox_api_socket_dir and remote:
+            # The socket directory would be bind-mounted from the remote machine's filesystem
+            raise ValueError(f"SANDBOX_API_SOCKET_DIR only works with local Docker hosts, not {', '.join(remote)}")
         self.image = image or settings.sandbox_image
         self.network = network or settings.sandbox_network
-        self.ttl = timedelta(minutes=ttl_minutes or settings.sandbox_ttl_minutes)
         self.active_sandboxes: Dict[str, Dict] = {}
+        # Sliding idle TTL; the reaper hibernates sandboxes nobody has touched
+        self.lifecycle = SandboxLifecycle(
+            ttl_minutes=ttl_minutes or settings.sandbox_ttl_minutes,
+            destroy=self.hibernate_sandbox,
+            grace_seconds=settings.sandbox_ttl_grace_seconds,
+            max_concurrent_destroys=settings.sandbox_max_concurrent_destroys,
+            idle_seconds=settings.sandbox_pause_after_seconds,
+            on_idle=self._pause_idle
+        )
+        self._resume_locks: Dict[str, asyncio.Lock] = {}
+        self.freeze_stats = {
+            "pauses": 0,
+            "resumes": 0,
+            "pause_skipped_vnc": 0,
+            "pause_failures": 0,
+            "resume_latency_avg": 0.0,
+            "resume_latency_max": 0.0
+        }
+        # Expired sandboxes leave a workspace snapshot behind for the next message
+        self.snapshots: Optional[SnapshotStore] = None
+        if settings.sandbox_snapshot_max_total_mb > 0:
+            self.snapshots = SnapshotStore(
+                directory=settings.sandbox_snapshot_dir,
+                max_bytes=settings.sandbox_snapshot_max_total_mb * 1024 * 1024,
+                max_snapshot_bytes=settings.sandbox_snapshot_max_mb * 1024 * 1024
+            )
+        self._hibernating: Dict[str, asyncio.Event] = {}
+        self._restores: Dict[str, asyncio.Task] = {}
+        self.hibernate_stats = {
+            "hibernated": 0,
+            "snapshot_failures": 0,
+            "restored": 0,
+            "restore_failures": 0,
+            "snapshot_seconds_avg": 0.0,
+            "snapshot_seconds_max": 0.0,
+            "restore_seconds_avg": 0.0,
+            "restore_seconds_max": 0.0
+        }
+        # Live usage from each active sandbox's stats stream, optionally resizing it
+        self.telemetry: Optional[SandboxTelemetry] = None
+        if settings.sandbox_stats_enabled:
+            policy = None
+            if settings.sandbox_resize_enabled:
+                policy = ResizePolicy(
+                    min_cpus=settings.sandbox_resize_min_cpus,
+                    max_cpus=settings.sandbox_resize_max_cpus,
+                    min_memory=settings.sandbox_resize_min_memory_mb * 1024 * 1024,
+                    max_memory=settings.sandbox_resize_max_memory_mb * 1024 * 1024
+                )
+            self.telemetry = SandboxTelemetry(
+                capacity=settings.sandbox_stats_window_seconds,
+                policy=policy,
+                resize=self._resize_container,
+                limits=self._resizable_limits,
+                interval=settings.sandbox_resize_interval_seconds,
+                sustain=settings.sandbox_resize_sustain_seconds
+            )
+        # Pooled connections to each sandbox's API, used by tools and health checks
+        self.api = SandboxAPIClient(
+            resolve=self._api_target,
+            port=settings.sandbox_api_port,
+            socket_dir=settings.sandbox_api_socket_dir,
+            http2=settings.sandbox_api_http2,
+            max_connections=settings.sandbox_api_max_connections
+        )
+        self._socket_dirs: Dict[str, str] = {}
+        # Workspace change feeds of sandboxes with a chat WebSocket open, relayed to it
+        self.feeds = WorkspaceFeeds(self.api, self._feed_target)
+        # Running averages of each cold-start phase, in seconds
+        self.startup_stats: Dict[str, Any] = {"cold_starts": 0, "avg_seconds": {}}
+        self.pool: Optional[SandboxPool] = None
+        if settings.sandbox_pool_size > 0:
+            self.pool = SandboxPool(
+                launch=self._launch_warm_container,
+                remove=self._remove_container,
+                target_size=settings.sandbox_pool_size,
+                min_size=settings.sandbox_pool_min_size,
+                idle_timeout=settings.sandbox_pool_idle_minutes * 60,
+                refill_concurrency=settings.sandbox_pool_refill_concurrency
+            )
+    
+    async def start(self) -> None:
+        """Start background work: the expiry reaper and warming the sandbox pool."""
+        await self.placement.refresh()
+        self.lifecycle.start()
+        self.feeds.start()
+        if self.telemetry is not None:
+            self.telemetry.start()
+        if self.pool is not None:
+            self.pool.start()
+    
+    async def close(self) -> None:
+        """Stop background work and remove warm containers."""
+        await self.lifecycle.close()
+        await self.feeds.close()
+        if self.telemetry is not None:
+            await self.telemetry.close()
+        if self.pool is not None:
+            await self.pool.close()
+        await self.api.close()
     
     async def create_sandbox(self, session_id: str) -> Dict:
         """Create a new sandbox container for a session."""
@@ -29,58 +169,160 @@ class SandboxManager:
         container_name = f"{settings.sandbox_name_prefix}-{session_id}"
         
         try:
-            # Create container
-            container = await self.docker.create_container(
-                image=self.image,
-                name=container_name,
-                environment={
-                    "SESSION_ID": session_id,
-                    "DISPLAY": ":99"
-                },
-                network=self.network,
-                cap_add=["SYS_ADMIN"],  # For Chrome
-                shm_size="2g",  # Shared memory for Chrome
-                mem_limit="2g",
-                cpu_period=100000,
-                cpu_quota=150000,  # 1.5 CPU cores
-                ports={
-                    8080: None,  # API port
-                    5900: None,  # VNC port
-                    6080: None   # WebSocket VNC port
-                }
-            )
+            sandbox = self.pool.claim() if self.pool is not None else None
             
-            # Start container
-            await self.docker.start_container(container.id)
+            if sandbox is not None and self.placement.host_for(sandbox["container_id"]).draining:
+                # Started before its host began draining
+                await self._remove_container(sandbox["container_id"])
+                sandbox = None
             
-            # Wait for services to start
-            await self._wait_for_services(container)
+            if sandbox is not None:
+                try:
+                    await self._bind_session(sandbox["container_id"], session_id)
+                except Exception as e:
+                    logger.warning(f"Discarding warm sandbox {sandbox['container_id']}: {e}")
+                    await self._remove_container(sandbox["container_id"])
+                    sandbox = None
             
-            # Get container details
-            container_info = await self._get_container_info(container)
+            if sandbox is None:
+                sandbox = await self._launch_container(container_name, session_id)
             
             # Register sandbox
             self.active_sandboxes[session_id] = {
-                "container": container,
-                "container_id": container.id,
-                "created_at": datetime.utcnow(),
-                "expires_at": datetime.utcnow() + self.ttl,
-                "container_info": container_info
+                **sandbox,
+                "state": "running",
+                "created_at": datetime.utcnow()
             }
+            self.lifecycle.register_sandbox(session_id)
+            if self.telemetry is not None:
+                self.telemetry.watch(sandbox["container_id"], self._docker(sandbox["container_id"]))
+            self.feeds.refresh()
             
             logger.info(f"Created sandbox for session {session_id}")
             
             return {
                 "session_id": session_id,
-                "container_id": container.id,
+                "container_id": sandbox["container_id"],
                 "status": "ready",
-                "container_info": container_info
+                "container_info": sandbox["container_info"]
             }
             
         except Exception as e:
             logger.error(f"Failed to create sandbox for session {session_id}: {e}")
             raise
     
+    async def _launch_container(
+        self,
+        container_name: str,
+        session_id: Optional[str] = None
+    ) -> Dict:
+        """Create and start a container and wait until its services are up."""
+        
+        environment = {"DISPLAY": ":99"}
+        if session_id is not None:
+            environment["SESSION_ID"] = session_id
+        
+        binds = None
+        socket_dir = self.api.socket_path(container_name)
+        if socket_dir:
+            socket_dir = os.path.dirname(socket_dir)
+            os.makedirs(socket_dir, exist_ok=True)
+            binds = [f"{socket_dir}:{SANDBOX_SOCKET_MOUNT}"]
+            environment["SANDBOX_API_SOCKET"] = f"{SANDBOX_SOCKET_MOUNT}/api.sock"
+        
+        host = await self.placement.allocate(SANDBOX_CPUS, SANDBOX_MEMORY_BYTES)
+        
+        # Create container
+        try:
+            container_id = await host.client.create_container(
+                image=self.image,
+                name=container_name,
+                environment=environment,
+                network=self.network,
+                cap_add=["SYS_ADMIN"],  # For Chrome
+                shm_size="2g",  # Shared memory for Chrome
+                mem_limit=SANDBOX_MEMORY,
+                cpu_period=SANDBOX_CPU_PERIOD,
+                cpu_quota=SANDBOX_CPU_QUOTA,
+                ports={
+                    SANDBOX_API_CONTAINER_PORT: None,  # API port
+                    5900: None,  # VNC port
+                    6080: None   # WebSocket VNC port
+                },
+                binds=binds
+            )
+        except BaseException:
+            self.placement.cancel(host, SANDBOX_CPUS, SANDBOX_MEMORY_BYTES)
+            if socket_dir:
+                shutil.rmtree(socket_dir, ignore_errors=True)
+            raise
+        self.placement.assign(container_id, host, SANDBOX_CPUS, SANDBOX_MEMORY_BYTES)
+        if socket_dir:
+            self._socket_dirs[container_id] = socket_dir
+        
+        try:
+            # Start container
+            started = time.monotonic()
+            await host.client.start_container(container_id)
+            container_started = time.monotonic()
+            container_info = await self._get_container_info(container_id)
+            container_info["host"] = host.name
+            
+            # Wait for the sandbox API to come up
+            await self._wait_for_api(container_info)
+        except BaseException:
+            await self._remove_container(container_id)
+            raise
+        self.placement.ready(container_id)
+        
+        container_info["startup"] = self._record_startup(started, container_started)
+        logger.info(f"Sandbox container {container_id[:12]} started: {container_info['startup']}")
+        
+        return {
+            "container_id": container_id,
+            "container_info": container_info
+        }
+    
+    async def _launch_warm_container(self) -> Dict:
+        """Start a container for the pool, not yet bound to a session."""
+        
+        container_name = f"{settings.sandbox_name_prefix}-pool-{uuid.uuid4().hex[:12]}"
+        return await self._launch_container(container_name)
+    
+    async def _bind_session(self, container_id: str, session_id: str) -> None:
+        """Assign a warm container to a session; the sandbox API reads the session file."""
+        
+        result = await self._docker(container_id).execute_command(
+            container_id,
+            f"sh -c {shlex.quote(f'printf %s {shlex.quote(session_id)} > {SESSION_FILE}')}",
+            stdout=True,
+            stderr=True
+        )
+        if result["exit_code"] != 0:
+            raise RuntimeError(f"Failed to bind session {session_id} to container {container_id}")
+    
+    async def _remove_container(self, container_id: str) -> None:
+        """Stop and remove a container, ignoring errors."""
+        
+        try:
+            docker = self._docker(container_id)
+            await docker.stop_container(container_id, timeout=10)
+            await docker.remove_container(container_id, force=True)
+        except Exception as e:
+            logger.error(f"Failed to remove container {container_id}: {e}")
+        await self._forget_container(container_id)
+    
+    async def _forget_container(self, container_id: str) -> None:
+        """Drop everything kept for a removed container: stats, API connections, its reservation."""
+        
+        if self.telemetry is not None:
+            self.telemetry.unwatch(container_id)
+        await self.api.evict(container_id)
+        socket_dir = self._socket_dirs.pop(container_id, None)
+        if socket_dir:
+            shutil.rmtree(socket_dir, ignore_errors=True)
+        self.placement.release(container_id)
+    
     async def destroy_sandbox(self, session_id: str) -> None:
         """Destroy a sandbox container."""
         
@@ -92,72 +334,303 @@ class SandboxManager:
         container_id = sandbox_info["container_id"]
         
         try:
-            # Stop container
-            await self.docker.stop_container(container_id, timeout=10)
+            docker = self._docker(container_id)
             
-            # Remove container
-            await self.docker.remove_container(container_id, force=True)
+            try:
+                # A frozen container cannot be stopped cleanly
+                if sandbox_info.get("state") == "paused":
+                    await docker.unpause_container(container_id)
+                
+                # Stop container
+                await docker.stop_container(container_id, timeout=10)
+                
+                # Remove container
+                await docker.remove_container(container_id, force=True)
+            except DockerAPIError as e:
+                # Removed by hand or lost with its daemon; only our records are left
+                if e.status_code != 404:
+                    raise
+                logger.warning(f"Container {container_id[:12]} for session {session_id} was already removed")
+            await self._forget_container(container_id)
             
             # Remove from active sandboxes
             del self.active_sandboxes[session_id]
+            self.lifecycle.unregister_sandbox(session_id)
+            self._resume_locks.pop(session_id, None)
+            self.api.sandbox_removed(session_id)
             
             logger.info(f"Destroyed sandbox for session {session_id}")
             
         except Exception as e:
+            # Still running; keep it on the reaper's schedule so it is retried
+            self.lifecycle.register_sandbox(session_id)
             logger.error(f"Failed to destroy sandbox for session {session_id}: {e}")
             raise
     
-    async def get_sandbox(self, session_id: str) -> Optional[Dict]:
-        """Get sandbox information for a session."""
+    async def hibernate_sandbox(self, session_id: str) -> None:
+        """Snapshot a sandbox's workspace, then destroy it."""
         
-        if session_id not in self.active_sandboxes:
-            return None
-        
-        sandbox_info = self.active_sandboxes[session_id]
+        sandbox_info = self.active_sandboxes.get(session_id)
+        if self.snapshots is None or sandbox_info is None:
+            await self.destroy_sandbox(session_id)
+            return
         
-        # Check if sandbox has expired
-        if datetime.utcnow() > sandbox_info["expires_at"]:
+        done = self._hibernating[session_id] = asyncio.Event()
+        try:
+            started = time.monotonic()
+            try:
+                size = await self.snapshots.save(
+                    session_id,
+                    self._docker(sandbox_info["container_id"]).export_archive(
+                        sandbox_info["container_id"],
+                        settings.sandbox_snapshot_path
+                    )
+                )
+                elapsed = time.monotonic() - started
+                self.hibernate_stats["hibernated"] += 1
+                self._record_timing("snapshot", elapsed)
+                logger.info(f"Snapshot of session {session_id} workspace: {size} bytes in {elapsed:.1f}s")
+            except SnapshotTooLargeError as e:
+                # An older snapshot would bring back a stale workspace
+                await self.snapshots.delete(session_id)
+                logger.warning(f"Not hibernating session {session_id}: {e}")
+            except Exception as e:
+                self.hibernate_stats["snapshot_failures"] += 1
+                logger.error(f"Failed to snapshot sandbox for session {session_id}: {e}")
+            
             await self.destroy_sandbox(session_id)
+        finally:
+            del self._hibernating[session_id]
+            done.set()
+    
+    async def resume_hibernated(self, session_id: str) -> Optional[Dict]:
+        """
+        Recreate an expired session's sandbox from its workspace snapshot.
+        
+        Returns the new sandbox, or None if the session already has one or
+        was never hibernated. Concurrent callers share a single restore.
+        """
+        
+        if session_id in self._hibernating:
+            await self._hibernating[session_id].wait()
+        if session_id in self.active_sandboxes:
             return None
         
-        return sandbox_info
+        task = self._restores.get(session_id)
+        if task is None:
+            if self.snapshots is None or not self.snapshots.has(session_id):
+                return None
+            task = self._restores[session_id] = asyncio.create_task(self._restore(session_id))
+            task.add_done_callback(lambda _: self._restores.pop(session_id, None))
+        return await asyncio.shield(task)
     
-    async def list_sandboxes(self) -> List[Dict]:
-        """List all active sandboxes."""
+    async def delete_snapshot(self, session_id: str) -> None:
+        """Forget a session's workspace snapshot."""
+        if self.snapshots is not None:
+            await self.snapshots.delete(session_id)
+    
+    def get_hibernate_stats(self) -> Dict[str, Any]:
+        return {
+            **self.hibernate_stats,
+            "enabled": self.snapshots is not None,
+            "hibernating": len(self._hibernating),
+            "restoring": len(self._restores),
+            "store": self.snapshots.get_stats() if self.snapshots is not None else None
+        }
+    
+    async def _restore(self, session_id: str) -> Dict:
+        started = time.monotonic()
+        sandbox = await self.create_sandbox(session_id)
+        
+        # The archive holds the workspace directory itself; extract it into its parent
+        target = os.path.dirname(settings.sandbox_snapshot_path.rstrip("/")) or "/"
+        try:
+            await self._docker(sandbox["container_id"]).put_archive(
+                sandbox["container_id"],
+                target,
+                self.snapshots.read(session_id)
+            )
+        except Exception as e:
+            # The fresh sandbox is still usable, just without the old workspace
+            self.hibernate_stats["restore_failures"] += 1
+            logger.error(f"Failed to restore workspace for session {session_id}: {e}")
+            return sandbox
+        
+        elapsed = time.monotonic() - started
+        self.hibernate_stats["restored"] += 1
+        self._record_timing("restore", elapsed)
+        logger.info(f"Restored sandbox for session {session_id} from snapshot in {elapsed:.1f}s")
+        return sandbox
+    
+    def _record_timing(self, phase: str, seconds: float) -> None:
+        stats = self.hibernate_stats
+        stats[f"{phase}_seconds_avg"] += (seconds - stats[f"{phase}_seconds_avg"]) * 0.1
+        stats[f"{phase}_seconds_max"] = max(stats[f"{phase}_seconds_max"], seconds)
+    
+    async def drain_host(self, name: str, evict: bool = False) -> Dict[str, Any]:
+        """
+        Take a Docker host out of placement for maintenance.
+        
+        Warm containers on it are removed at once. Session sandboxes stay
+        until they expire, or with ``evict`` are hibernated now so their
+        next message restores them on another host.
+        """
         
-        sandboxes = []
-        expired_sessions = []
+        containers = set(self.placement.drain(name))
+        warm = []
+        if self.pool is not None:
+            warm = await self.pool.discard(lambda sandbox: sandbox["container_id"] in containers)
         
-        for session_id, sandbox_info in self.active_sandboxes.items():
-            # Check if sandbox has expired
-            if datetime.utcnow() > sandbox_info["expires_at"]:
-                expired_sessions.append(session_id)
+        sessions = [
+            session_id for session_id, sandbox_info in self.active_sandboxes.items()
+            if sandbox_info["container_id"] in containers
+        ]
+        if evict:
+            for session_id in sessions:
+                self.lifecycle.unregister_sandbox(session_id)
+            await asyncio.gather(
+                *(self.hibernate_sandbox(session_id) for session_id in sessions),
+                return_exceptions=True
+            )
+        
+        return {
+            "host": name,
+            "warm_removed": len(warm),
+            "sessions": len(sessions),
+            "evicted": len(sessions) if evict else 0
+        }
+    
+    def undrain_host(self, name: str) -> None:
+        self.placement.undrain(name)
+    
+    def touch(self, session_id: str) -> None:
+        """Record activity on a session's sandbox, sliding its expiry and idle timers."""
+        self.lifecycle.touch(session_id)
+    
+    async def resume_sandbox(self, session_id: str) -> Optional[float]:
+        """Unpause a session's sandbox if it is frozen; return the resume latency."""
+        
+        sandbox_info = self.active_sandboxes.get(session_id)
+        if sandbox_info is None or sandbox_info.get("state") != "paused":
+            return None
+        
+        lock = self._resume_locks.setdefault(session_id, asyncio.Lock())
+        async with lock:
+            # Another caller may have resumed it while we waited
+            if sandbox_info.get("state") != "paused":
+                return None
+            
+            started = time.monotonic()
+            await self._docker(sandbox_info["container_id"]).unpause_container(sandbox_info["container_id"])
+            latency = time.monotonic() - started
+            
+            sandbox_info["state"] = "running"
+            sandbox_info.pop("paused_at", None)
+            self.touch(session_id)
+            self.feeds.refresh()
+            
+            self.freeze_stats["resumes"] += 1
+            self.freeze_stats["resume_latency_avg"] += (latency - self.freeze_stats["resume_latency_avg"]) * 0.1
+            self.freeze_stats["resume_latency_max"] = max(self.freeze_stats["resume_latency_max"], latency)
+            logger.info(f"Resumed sandbox for session {session_id} in {latency * 1000:.0f}ms")
+            return latency
+    
+    def get_freeze_stats(self) -> Dict[str, Any]:
+        """Pause/resume counters and the resources held by running vs paused sandboxes."""
+        
+        running = paused = 0
+        cpus_running = cpus_paused = 0.0
+        memory = 0
+        for sandbox_info in self.active_sandboxes.values():
+            cpus, memory_bytes = self.placement.limits(sandbox_info["container_id"])
+            memory += memory_bytes
+            if sandbox_info.get("state") == "paused":
+                paused += 1
+                cpus_paused += cpus
             else:
-                sandboxes.append({
-                    "session_id": session_id,
-                    "container_id": sandbox_info["container_id"],
-                    "created_at": sandbox_info["created_at"],
-                    "expires_at": sandbox_info["expires_at"],
-                    "container_info": sandbox_info["container_info"]
-                })
-        
-        # Clean up expired sandboxes
-        for session_id in expired_sessions:
-            await self.destroy_sandbox(session_id)
+                running += 1
+                cpus_running += cpus
         
-        return sandboxes
+        return {
+            **self.freeze_stats,
+            "running": running,
+            "paused": paused,
+            # Paused containers keep their memory but use no CPU
+            "cpus_reserved_running": cpus_running,
+            "cpus_reclaimed": cpus_paused,
+            "memory_bytes_reserved": memory
+        }
     
-    async def cleanup_expired_sandboxes(self) -> None:
-        """Remove expired sandbox containers."""
+    async def _pause_idle(self, session_id: str) -> None:
+        """Freeze a sandbox that has had no tool activity, unless a VNC client is watching."""
         
-        expired_sessions = []
+        sandbox_info = self.active_sandboxes.get(session_id)
+        if sandbox_info is None or sandbox_info.get("state") != "running":
+            return
         
-        for session_id, sandbox_info in self.active_sandboxes.items():
-            if datetime.utcnow() > sandbox_info["expires_at"]:
-                expired_sessions.append(session_id)
+        if await self._vnc_connections(sandbox_info) > 0:
+            self.freeze_stats["pause_skipped_vnc"] += 1
+            self.touch(session_id)
+            return
         
-        for session_id in expired_sessions:
-            await self.destroy_sandbox(session_id)
+        lock = self._resume_locks.setdefault(session_id, asyncio.Lock())
+        async with lock:
+            if sandbox_info.get("state") != "running":
+                return
+            try:
+                await self._docker(sandbox_info["container_id"]).pause_container(sandbox_info["container_id"])
+            except Exception as e:
+                self.freeze_stats["pause_failures"] += 1
+                logger.error(f"Failed to pause sandbox for session {session_id}: {e}")
+                return
+            
+            sandbox_info["state"] = "paused"
+            sandbox_info["paused_at"] = datetime.utcnow()
+            self.freeze_stats["pauses"] += 1
+            logger.info(f"Paused idle sandbox for session {session_id}")
+    
+    async def _vnc_connections(self, sandbox_info: Dict) -> int:
+        """Number of VNC clients connected to a sandbox, 0 if it cannot be asked."""
+        
+        try:
+            response = await self.api.request_container(
+                sandbox_info["container_info"],
+                "GET",
+                "/api/activity",
+                timeout=2.0,
+                retries=0
+            )
+            return response.json().get("vnc_connections", 0)
+        except (httpx.HTTPError, SandboxAPIError, ValueError) as e:
+            logger.debug(f"Could not read activity for sandbox {sandbox_info['container_id']}: {e}")
+            return 0
+    
+    async def get_sandbox(self, session_id: str) -> Optional[Dict]:
+        """Get sandbox information for a session."""
+        
+        sandbox_info = self.active_sandboxes.get(session_id)
+        if sandbox_info is None:
+            return None
+        
+        return {**sandbox_info, "expires_at": self.lifecycle.expires_at(session_id)}
+    
+    async def list_sandboxes(self) -> List[Dict]:
+        """List all active sandboxes."""
+        
+        return [
+            {
+                "session_id": session_id,
+                "container_id": sandbox_info["container_id"],
+                "created_at": sandbox_info["created_at"],
+                "expires_at": self.lifecycle.expires_at(session_id),
+                "container_info": sandbox_info["container_info"]
+            }
+            for session_id, sandbox_info in self.active_sandboxes.items()
+        ]
+    
+    async def cleanup_expired_sandboxes(self) -> None:
+        """Remove expired sandbox containers now, without waiting for the reaper."""
+        await self.lifecycle.reap()
     
     async def execute_command(
         self,
@@ -171,8 +644,30 @@ class SandboxManager:
         if not sandbox_info:
             raise ValueError(f"Sandbox for session {session_id} not found or expired")
         
+        await self.resume_sandbox(session_id)
+        self.touch(session_id)
         container_id = sandbox_info["container_id"]
-        return await self.docker.execute_command(container_id, command, **kwargs)
+        return await self._docker(container_id).execute_command(container_id, command, **kwargs)
+    
+    async def seed_workspace(
+        self,
+        session_id: str,
+        source: WorkspaceSource,
+        path: str = "/workspace",
+        compression: str = "none"
+    ) -> Dict[str, Any]:
+        """Copy a local directory, or files given as path -> content, into a sandbox in one upload."""
+        
+        if not await self.get_sandbox(session_id):
+            raise ValueError(f"Sandbox for session {session_id} not found or expired")
+        
+        started = time.monotonic()
+        result = await seed_workspace(self.api, session_id, source, path=path, compression=compression)
+        logger.info(
+            f"Seeded {result['files']} files ({result['bytes']} bytes) into sandbox for session {session_id} "
+            f"in {time.monotonic() - started:.2f}s"
+        )
+        return result
     
     async def get_container_logs(
         self,
@@ -186,62 +681,173 @@ class SandboxManager:
             raise ValueError(f"Sandbox for session {session_id} not found or expired")
         
         container_id = sandbox_info["container_id"]
-        return await self.docker.get_container_logs(container_id, **kwargs)
+        return await self._docker(container_id).get_container_logs(container_id, **kwargs)
     
-    async def _wait_for_services(self, container) -> None:
-        """Wait for sandbox services to start."""
+    def get_sandbox_stats(self, session_id: str, window: float = 60.0) -> Optional[Dict[str, Any]]:
+        """Recent resource usage of a session's sandbox against its limits."""
         
-        # Wait for container to be ready
-        import time
-        max_wait = 60  # 60 seconds max wait
-        wait_time = 0
+        sandbox_info = self.active_sandboxes.get(session_id)
+        if sandbox_info is None or self.telemetry is None:
+            return None
         
-        while wait_time < max_wait:
+        container_id = sandbox_info["container_id"]
+        cpus, memory = self.placement.limits(container_id)
+        return {
+            "session_id": session_id,
+            "container_id": container_id,
+            "state": sandbox_info.get("state"),
+            "limits": {"cpus": cpus, "memory": memory},
+            **(self.telemetry.summary(container_id, window) or {})
+        }
+    
+    def _resizable_limits(self, container_id: str) -> Optional[tuple]:
+        """Current limits of a running session sandbox; paused ones report no usage."""
+        
+        for sandbox_info in self.active_sandboxes.values():
+            if sandbox_info["container_id"] == container_id:
+                if sandbox_info.get("state") != "running":
+                    return None
+                return self.placement.limits(container_id)
+        return None
+    
+    async def _resize_container(self, container_id: str, cpus: float, memory: int) -> None:
+        """Apply new limits to a running container and its host reservation."""
+        
+        old_cpus, old_memory = self.placement.limits(container_id)
+        if not self.placement.resize(container_id, cpus, memory):
+            raise NoCapacityError(f"Host has no room to grow container {container_id[:12]}")
+        try:
+            await self._docker(container_id).update_container(
+                container_id,
+                cpu_quota=int(cpus * SANDBOX_CPU_PERIOD),
+                memory=memory
+            )
+        except Exception:
+            self.placement.resize(container_id, old_cpus, old_memory)
+            raise
+        logger.info(
+            f"Resized container {container_id[:12]} from {old_cpus} CPUs/{old_memory >> 20}MB "
+            f"to {cpus} CPUs/{memory >> 20}MB"
+        )
+    
+    def _docker(self, container_id: str) -> DockerClient:
+        """The client for the host a container was placed on."""
+        return self.placement.client_for(container_id)
+    
+    async def _api_target(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Container info for a session's sandbox API call, resuming a frozen sandbox first."""
+        
+        sandbox_info = self.active_sandboxes.get(session_id)
+        if sandbox_info is None:
+            return None
+        await self.resume_sandbox(session_id)
+        self.touch(session_id)
+        return sandbox_info["container_info"]
+    
+    def _feed_target(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Container info for a session's change feed; None while it has no running sandbox."""
+        
+        sandbox_info = self.active_sandboxes.get(session_id)
+        if sandbox_info is None or sandbox_info.get("state") == "paused":
+            return None
+        return sandbox_info["container_info"]
+    
+    async def _wait_for_api(
+        self,
+        container_info: Dict[str, Any],
+        max_wait: float = None
+    ) -> None:
+        """
+        Wait for the sandbox API to answer /health.
+        
+        The browser stack starts on first use, so the API is the only
+        thing a new sandbox waits for; until it listens, requests are
+        retried with backoff.
+        """
+        
+        max_wait = max_wait or settings.sandbox_ready_timeout_seconds
+        container_id = container_info["id"]
+        if not (container_info.get("api_address") or container_info.get("ip_address") or self.api.socket_dir):
+            raise RuntimeError(f"Container {container_id} has no published API port or address on network {self.network}")
+        
+        deadline = time.monotonic() + max_wait
+        delay = 0.05
+        
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"Container {container_id} did not become ready within {max_wait} seconds")
+            
             try:
-                # Try to execute a simple command to check if container is ready
-                result = await self.docker.execute_command(
-                    container.id,
-                    "echo 'ready'",
-                    stdout=True,
-                    stderr=True
+                response = await self.api.request_container(
+                    container_info,
+                    "GET",
+                    "/health",
+                    timeout=min(remaining, 5.0),
+                    retries=0
                 )
-                
-                if result["exit_code"] == 0:
-                    break
-                    
-            except Exception as e:
-                logger.debug(f"Waiting for container {container.id} to be ready: {e}")
-                time.sleep(1)
-                wait_time += 1
+                if response.json().get("status") == "healthy":
+                    return
+            except (httpx.HTTPError, SandboxAPIError, ValueError) as e:
+                logger.debug(f"Waiting for container {container_id} to be ready: {e}")
+            await asyncio.sleep(min(delay, remaining))
+            delay = min(delay * 2, 1.0)
+    
+    def _record_startup(self, started: float, container_started: float) -> Dict[str, Any]:
+        """Break a cold start down by phase and fold it into the running averages."""
         
-        if wait_time >= max_wait:
-            raise TimeoutError(f"Container {container.id} did not become ready within {max_wait} seconds")
+        startup = {
+            "container_start_seconds": round(container_started - started, 3),
+            "api_ready_seconds": round(time.monotonic() - container_started, 3)
+        }
+        
+        self.startup_stats["cold_starts"] += 1
+        phases = self.startup_stats["avg_seconds"]
+        samples = {
+            "container_start": startup["container_start_seconds"],
+            "api_ready": startup["api_ready_seconds"]
+        }
+        for phase, seconds in samples.items():
+            previous = phases.get(phase)
+            phases[phase] = round(seconds if previous is None else previous + (seconds - previous) * 0.1, 3)
+        
+        return startup
     
-    async def _get_container_info(self, container) -> Dict[str, Any]:
+    async def _get_container_info(self, container_id: str) -> Dict[str, Any]:
         """Get container information."""
         
         try:
-            container.reload()
+            attrs = await self._docker(container_id).inspect_container(container_id)
             
-            # Get port mappings
-            ports = container.ports
+            networks = attrs["NetworkSettings"].get("Networks") or {}
+            network = networks.get(self.network) or next(iter(networks.values()), {})
             
-            return {
-                "id": container.id,
-                "name": container.name,
-                "status": container.status,
-                "ports": ports,
-                "created": container.attrs["Created"],
-                "image": container.image.tags[0] if container.image.tags else container.image.id
+            info = {
+                "id": attrs["Id"],
+                "name": attrs["Name"].lstrip("/"),
+                "status": attrs["State"]["Status"],
+                # Port mappings
+                "ports": attrs["NetworkSettings"]["Ports"],
+                "created": attrs["Created"],
+                "image": attrs["Config"]["Image"],
+                "ip_address": network.get("IPAddress") or attrs["NetworkSettings"].get("IPAddress")
             }
             
+            # Another machine's sandbox network is out of reach; use the port its host publishes
+            host = self.placement.host_for(container_id)
+            bindings = (info["ports"] or {}).get(f"{SANDBOX_API_CONTAINER_PORT}/tcp") or []
+            if host.address and bindings:
+                info["api_address"] = f"{host.address}:{bindings[0]['HostPort']}"
+            return info
+            
         except Exception as e:
-            logger.error(f"Failed to get container info for {container.id}: {e}")
+            logger.error(f"Failed to get container info for {container_id}: {e}")
             return {
-                "id": container.id,
-                "name": container.name,
+                "id": container_id,
+                "name": None,
                 "status": "unknown",
                 "ports": {},
                 "created": None,
-                "image": None
-            }
\ No newline at end of file
+                "image": None,
+                "ip_address": None
+            }
@@ -0,0 +1,225 @@
+import asyncio
+from typing import Any, Dict, List, Optional, Set, Tuple
+from loguru import logger
+
+from app.core.sandbox.docker_client import DockerClient
+
+
+class NoCapacityError(Exception):
+    """No Docker host can fit another sandbox."""
+
+
+class DockerHost:
+    """
+    A Docker daemon sandboxes can be placed on.
+
+    ``cpus`` and ``memory`` (bytes) are the allocatable capacity; left
+    unset, they are read from the daemon's /info on refresh. ``address``
+    is where this machine reaches ports the host publishes; it is set for
+    hosts whose sandbox network the backend is not on, and their
+    sandboxes are then reached through their published API port.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        client: DockerClient,
+        cpus: Optional[float] = None,
+        memory: Optional[int] = None,
+        address: Optional[str] = None
+    ):
+        self.name = name
+        self.client = client
+        self.cpus = cpus
+        self.memory = memory
+        self.address = address
+        self.configured = cpus is not None and memory is not None
+
+        self.allocated_cpus = 0.0
+        self.allocated_memory = 0
+        # container ID -> (cpus, memory) it holds
+        self.containers: Dict[str, Tuple[float, int]] = {}
+        # Placed but not yet ready; container starts are the expensive part
+        self.starting = 0
+        self.draining = False
+        self.healthy = self.configured
+
+    def fits(self, cpus: float, memory: int) -> bool:
+        return (
+            self.cpus is not None
+            and self.allocated_cpus + cpus <= self.cpus
+            and self.allocated_memory + memory <= self.memory
+        )
+
+    def utilization(self, cpus: float = 0.0, memory: int = 0) -> float:
+        """The fuller of CPU and memory, after adding ``cpus`` and ``memory``."""
+        if not self.cpus or not self.memory:
+            return 1.0
+        return max(
+            (self.allocated_cpus + cpus) / self.cpus,
+            (self.allocated_memory + memory) / self.memory
+        )
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "healthy": self.healthy,
+            "draining": self.draining,
+            "cpus": self.cpus,
+            "memory": self.memory,
+            "allocated_cpus": self.allocated_cpus,
+            "allocated_memory": self.allocated_memory,
+            "containers": len(self.containers),
+            "starting": self.starting,
+            "utilization": round(self.utilization(), 3)
+        }
+
+
+class SandboxPlacement:
+    """
+    Places sandboxes across a set of Docker hosts.
+
+    Placement is best fit: the fullest host that still fits the sandbox,
+    so large gaps stay free for later. To avoid hotspots, hosts that would
+    end up above ``spread_threshold`` utilization, or that already have
+    more container starts in flight, are only used when nothing better
+    fits. Draining hosts take no new sandboxes. Once placed, every
+    operation on a container goes to the host that owns it.
+    """
+
+    def __init__(self, hosts: List[DockerHost], spread_threshold: float = 0.8):
+        if not hosts:
+            raise ValueError("At least one Docker host is required")
+        self.hosts = {host.name: host for host in hosts}
+        self.spread_threshold = spread_threshold
+        self._owners: Dict[str, DockerHost] = {}
+        self._starting: Set[str] = set()
+        self.stats = {"placed": 0, "rejected": 0}
+
+    async def refresh(self) -> None:
+        """Read capacity from hosts not configured explicitly, and mark reachability."""
+        await asyncio.gather(*(self._refresh_host(host) for host in self.hosts.values()))
+
+    async def allocate(self, cpus: float, memory: int) -> DockerHost:
+        """Reserve room for a sandbox and return the host it goes on."""
+
+        host = self._choose(cpus, memory)
+        if host is None and any(not host.healthy for host in self.hosts.values()):
+            # A host that was down or not yet asked may have come up
+            await self.refresh()
+            host = self._choose(cpus, memory)
+        if host is None:
+            self.stats["rejected"] += 1
+            raise NoCapacityError(f"No Docker host has {cpus} CPUs and {memory} bytes free")
+
+        host.allocated_cpus += cpus
+        host.allocated_memory += memory
+        host.starting += 1
+        self.stats["placed"] += 1
+        return host
+
+    def assign(self, container_id: str, host: DockerHost, cpus: float, memory: int) -> None:
+        """Hand a reservation from ``allocate`` to the container created with it."""
+        host.containers[container_id] = (cpus, memory)
+        self._owners[container_id] = host
+        self._starting.add(container_id)
+
+    def ready(self, container_id: str) -> None:
+        """A placed container has finished starting."""
+        if container_id in self._starting:
+            self._starting.discard(container_id)
+            self._owners[container_id].starting -= 1
+
+    def cancel(self, host: DockerHost, cpus: float, memory: int) -> None:
+        """Give back a reservation whose container was never created."""
+        host.starting -= 1
+        host.allocated_cpus -= cpus
+        host.allocated_memory -= memory
+
+    def release(self, container_id: str) -> None:
+        """Free a removed container's resources."""
+
+        self.ready(container_id)
+        host = self._owners.pop(container_id, None)
+        if host is None:
+            return
+        cpus, memory = host.containers.pop(container_id)
+        host.allocated_cpus -= cpus
+        host.allocated_memory -= memory
+
+    def resize(self, container_id: str, cpus: float, memory: int) -> bool:
+        """Change a container's reservation; False if its host lacks room to grow."""
+
+        host = self.host_for(container_id)
+        old_cpus, old_memory = host.containers[container_id]
+        if not host.fits(cpus - old_cpus, memory - old_memory):
+            return False
+        host.allocated_cpus += cpus - old_cpus
+        host.allocated_memory += memory - old_memory
+        host.containers[container_id] = (cpus, memory)
+        return True
+
+    def limits(self, container_id: str) -> Tuple[float, int]:
+        """The (cpus, memory) reserved for a container."""
+        return self.host_for(container_id).containers[container_id]
+
+    def host_for(self, container_id: str) -> DockerHost:
+        try:
+            return self._owners[container_id]
+        except KeyError:
+            raise ValueError(f"Container {container_id} is not placed on any host")
+
+    def client_for(self, container_id: str) -> DockerClient:
+        return self.host_for(container_id).client
+
+    def drain(self, name: str) -> List[str]:
+        """Stop placing on a host; return the containers still on it."""
+        host = self._get_host(name)
+        host.draining = True
+        logger.info(f"Draining Docker host {name} ({len(host.containers)} containers)")
+        return list(host.containers)
+
+    def undrain(self, name: str) -> None:
+        self._get_host(name).draining = False
+
+    async def close(self) -> None:
+        for host in self.hosts.values():
+            await host.client.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "hosts": {name: host.status() for name, host in self.hosts.items()}
+        }
+
+    def _choose(self, cpus: float, memory: int) -> Optional[DockerHost]:
+        candidates = [
+            host for host in self.hosts.values()
+            if host.healthy and not host.draining and host.fits(cpus, memory)
+        ]
+        if not candidates:
+            return None
+
+        cool = [host for host in candidates if host.utilization(cpus, memory) <= self.spread_threshold]
+        candidates = cool or candidates
+        # Fewest starts in flight first, then best fit
+        return min(candidates, key=lambda host: (host.starting, -host.utilization(cpus, memory)))
+
+    def _get_host(self, name: str) -> DockerHost:
+        try:
+            return self.hosts[name]
+        except KeyError:
+            raise ValueError(f"Unknown Docker host: {name}")
+
+    async def _refresh_host(self, host: DockerHost) -> None:
+        try:
+            info = await host.client.info()
+        except Exception as e:
+            if host.healthy:
+                logger.warning(f"Docker host {host.name} is unreachable: {e}")
+            host.healthy = False
+            return
+
+        if not host.configured:
+            host.cpus = float(info.get("NCPU", 0))
+            host.memory = int(info.get("MemTotal", 0))
+        host.healthy = True
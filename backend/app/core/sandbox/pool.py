@@ -0,0 +1,162 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+from loguru import logger
+
+
+class SandboxPool:
+    """
+    A pool of started, ready sandbox containers waiting for a session.
+
+    A background task keeps ``target_size`` containers warm, starting up
+    to ``refill_concurrency`` at a time. Claiming never waits: on a miss
+    the caller falls back to a cold start and the pool refills behind it.
+    After ``idle_timeout`` seconds without a claim the pool shrinks to
+    ``min_size`` and grows back on the next claim.
+    """
+
+    def __init__(
+        self,
+        launch: Callable[[], Awaitable[Dict]],
+        remove: Callable[[str], Awaitable[None]],
+        target_size: int = 2,
+        min_size: int = 0,
+        idle_timeout: float = 600.0,
+        refill_concurrency: int = 2
+    ):
+        self.launch = launch
+        self.remove = remove
+        self.target_size = target_size
+        self.min_size = min(min_size, target_size)
+        self.idle_timeout = idle_timeout
+        self.refill_concurrency = max(1, refill_concurrency)
+
+        self._idle: Deque[Dict] = deque()
+        self._starting = 0
+        self._last_claim = time.monotonic()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._launches: set = set()
+
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "refills": 0,
+            "refill_failures": 0,
+            "shrunk": 0,
+            "refill_latency_avg": 0.0,
+            "refill_latency_max": 0.0
+        }
+
+    @property
+    def desired_size(self) -> int:
+        """Target size, or the minimum while nobody has claimed for a while."""
+        if time.monotonic() - self._last_claim > self.idle_timeout:
+            return self.min_size
+        return self.target_size
+
+    def start(self) -> None:
+        if self._task is None and self.target_size > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """Stop refilling and remove every warm container."""
+
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for task in list(self._launches):
+            task.cancel()
+        await asyncio.gather(*self._launches, return_exceptions=True)
+
+        while self._idle:
+            await self._remove(self._idle.popleft())
+
+    def claim(self) -> Optional[Dict]:
+        """Take a warm container, or return None if the pool is empty."""
+
+        self._last_claim = time.monotonic()
+        self._wakeup.set()
+
+        if not self._idle:
+            self.stats["misses"] += 1
+            return None
+
+        self.stats["hits"] += 1
+        return self._idle.popleft()
+
+    async def discard(self, predicate: Callable[[Dict], bool]) -> List[Dict]:
+        """Remove warm containers matching ``predicate``; the pool refills elsewhere."""
+
+        discarded = [sandbox for sandbox in self._idle if predicate(sandbox)]
+        for sandbox in discarded:
+            self._idle.remove(sandbox)
+        for sandbox in discarded:
+            await self._remove(sandbox)
+        self._wakeup.set()
+        return discarded
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "idle": len(self._idle),
+            "starting": self._starting,
+            "target_size": self.target_size,
+            "desired_size": self.desired_size
+        }
+
+    async def _run(self) -> None:
+        while True:
+            desired = self.desired_size
+
+            while self._idle and len(self._idle) > desired:
+                # Oldest first: they have been idle longest
+                self.stats["shrunk"] += 1
+                await self._remove(self._idle.popleft())
+
+            while (
+                len(self._idle) + self._starting < desired
+                and self._starting < self.refill_concurrency
+            ):
+                self._starting += 1
+                task = asyncio.create_task(self._refill())
+                self._launches.add(task)
+                task.add_done_callback(self._launches.discard)
+
+            self._wakeup.clear()
+            try:
+                # Re-check at least often enough to notice the idle timeout
+                await asyncio.wait_for(self._wakeup.wait(), timeout=min(self.idle_timeout, 30.0))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _refill(self) -> None:
+        started = time.monotonic()
+        try:
+            sandbox = await self.launch()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.stats["refill_failures"] += 1
+            logger.error(f"Failed to start a warm sandbox: {e}")
+            # Back off so a broken image does not spin
+            await asyncio.sleep(5)
+            return
+        finally:
+            self._starting -= 1
+            self._wakeup.set()
+
+        latency = time.monotonic() - started
+        self.stats["refills"] += 1
+        self.stats["refill_latency_avg"] += (latency - self.stats["refill_latency_avg"]) * 0.1
+        self.stats["refill_latency_max"] = max(self.stats["refill_latency_max"], latency)
+        self._idle.append(sandbox)
+        logger.debug(f"Warm sandbox {sandbox['container_id']} ready in {latency:.1f}s")
+
+    async def _remove(self, sandbox: Dict) -> None:
+        try:
+            await self.remove(sandbox["container_id"])
+        except Exception as e:
+            logger.error(f"Failed to remove warm sandbox {sandbox['container_id']}: {e}")
@@ -0,0 +1,185 @@
+import asyncio
+import gzip
+import hashlib
+import os
+from collections import OrderedDict
+from typing import Any, AsyncIterable, AsyncIterator, Dict
+from loguru import logger
+
+
+# Compress in batches of this size so each thread hop does real work
+CHUNK_SIZE = 1024 * 1024
+
+
+class SnapshotTooLargeError(Exception):
+    """A workspace exceeded the per-snapshot size cap."""
+
+
+class SnapshotStore:
+    """
+    Gzipped workspace tarballs on local disk, one per session.
+
+    Snapshots larger than ``max_snapshot_bytes`` (uncompressed) are
+    refused. Once the store holds more than ``max_bytes``, the least
+    recently saved or restored snapshots are evicted; access order
+    survives restarts through file modification times.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_bytes: int = 10 * 1024 ** 3,
+        max_snapshot_bytes: int = 1024 ** 3,
+        compress_level: int = 1
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_snapshot_bytes = max_snapshot_bytes
+        self.compress_level = compress_level
+
+        # key -> compressed size in bytes, least recently used first
+        self._index: "OrderedDict[str, int]" = OrderedDict()
+        self._bytes = 0
+        self.stats = {"saved": 0, "too_large": 0, "evictions": 0, "raw_bytes_saved": 0}
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._load_index()
+
+    def has(self, session_id: str) -> bool:
+        return self._key(session_id) in self._index
+
+    async def save(self, session_id: str, chunks: AsyncIterable[bytes]) -> int:
+        """Compress a tar stream into the store; return its stored size."""
+
+        key = self._key(session_id)
+        path = self._path(key)
+        tmp_path = f"{path}.tmp"
+        raw_bytes = 0
+        buffer = bytearray()
+
+        f = await asyncio.to_thread(gzip.open, tmp_path, "wb", self.compress_level)
+        try:
+            async for chunk in chunks:
+                raw_bytes += len(chunk)
+                if raw_bytes > self.max_snapshot_bytes:
+                    self.stats["too_large"] += 1
+                    raise SnapshotTooLargeError(
+                        f"Snapshot for session {session_id} exceeds {self.max_snapshot_bytes} bytes"
+                    )
+                buffer += chunk
+                if len(buffer) >= CHUNK_SIZE:
+                    await asyncio.to_thread(f.write, bytes(buffer))
+                    buffer.clear()
+            if buffer:
+                await asyncio.to_thread(f.write, bytes(buffer))
+            await asyncio.to_thread(f.close)
+        except BaseException:
+            await asyncio.to_thread(self._discard, f, tmp_path)
+            raise
+
+        # Replace atomically so a concurrent restore never reads a partial snapshot
+        os.replace(tmp_path, path)
+        size = os.path.getsize(path)
+
+        self._bytes -= self._index.pop(key, 0)
+        self._index[key] = size
+        self._bytes += size
+        self.stats["saved"] += 1
+        self.stats["raw_bytes_saved"] += raw_bytes
+
+        evicted = self._select_evictions()
+        if evicted:
+            await asyncio.to_thread(self._remove_files, evicted)
+        return size
+
+    async def read(self, session_id: str) -> AsyncIterator[bytes]:
+        """Stream a stored snapshot, gzip-compressed, and mark it recently used."""
+
+        key = self._key(session_id)
+        if key not in self._index:
+            raise KeyError(f"No snapshot for session {session_id}")
+        self._index.move_to_end(key)
+
+        path = self._path(key)
+        f = await asyncio.to_thread(open, path, "rb")
+        try:
+            await asyncio.to_thread(os.utime, path)
+            while True:
+                chunk = await asyncio.to_thread(f.read, CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            f.close()
+
+    async def delete(self, session_id: str) -> bool:
+        key = self._key(session_id)
+        if key not in self._index:
+            return False
+        self._bytes -= self._index.pop(key)
+        await asyncio.to_thread(self._remove_files, [key])
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "snapshots": len(self._index),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes
+        }
+
+    @staticmethod
+    def _key(session_id: str) -> str:
+        # Session IDs come from clients; never use them as file names
+        return hashlib.sha256(session_id.encode("utf-8")).hexdigest()[:32]
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.tar.gz")
+
+    def _load_index(self) -> None:
+        entries = []
+        for filename in os.listdir(self.directory):
+            path = os.path.join(self.directory, filename)
+            if filename.endswith(".tmp"):
+                # Left behind by an interrupted save
+                os.remove(path)
+                continue
+            if not filename.endswith(".tar.gz"):
+                continue
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, filename[:-len(".tar.gz")], stat.st_size))
+
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self._bytes += size
+
+        logger.info(f"Loaded {len(entries)} sandbox snapshots from {self.directory}")
+
+    def _select_evictions(self) -> list:
+        """Drop least recently used snapshots until under the size cap."""
+
+        evicted = []
+        while self._bytes > self.max_bytes and len(self._index) > 1:
+            key, size = self._index.popitem(last=False)
+            self._bytes -= size
+            self.stats["evictions"] += 1
+            evicted.append(key)
+        return evicted
+
+    def _remove_files(self, keys: list) -> None:
+        for key in keys:
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    @staticmethod
+    def _discard(f, tmp_path: str) -> None:
+        try:
+            f.close()
+        except OSError:
+            pass
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
@@ -0,0 +1,289 @@
+import asyncio
+import time
+from array import array
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from loguru import logger
+
+from app.core.sandbox.docker_client import DockerClient
+
+
+# Per-sample metrics kept for every sandbox
+METRICS = ("cpus", "memory", "io_read", "io_write", "net_rx", "net_tx")
+
+
+class StatsRing:
+    """
+    The last ``capacity`` samples of a container's resource usage.
+
+    Each metric is a fixed-size float array, so a sandbox costs about
+    ``capacity * 28`` bytes however long it runs. ``cpus`` is CPU cores in
+    use, ``memory`` is bytes, and IO and network are bytes per second.
+    """
+
+    def __init__(self, capacity: int = 300):
+        self.capacity = capacity
+        self.times = array("d", bytes(8 * capacity))
+        self.values = {metric: array("f", bytes(4 * capacity)) for metric in METRICS}
+        self.count = 0
+        self._next = 0
+
+    def append(self, at: float, sample: Dict[str, float]) -> None:
+        index = self._next
+        self.times[index] = at
+        for metric in METRICS:
+            self.values[metric][index] = sample[metric]
+        self._next = (index + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def latest(self) -> Optional[Dict[str, float]]:
+        if not self.count:
+            return None
+        index = (self._next - 1) % self.capacity
+        return {metric: float(self.values[metric][index]) for metric in METRICS}
+
+    def summary(self, window: float, now: float = None) -> Dict[str, Any]:
+        """Average, 95th percentile and maximum of each metric over the last ``window`` seconds."""
+
+        since = (now or time.monotonic()) - window
+        indexes = [
+            index
+            for index in ((self._next - 1 - offset) % self.capacity for offset in range(self.count))
+            if self.times[index] >= since
+        ]
+        if not indexes:
+            return {"samples": 0}
+
+        result: Dict[str, Any] = {"samples": len(indexes)}
+        for metric in METRICS:
+            values = sorted(self.values[metric][index] for index in indexes)
+            result[metric] = {
+                "avg": sum(values) / len(values),
+                "p95": values[min(len(values) - 1, int(len(values) * 0.95))],
+                "max": values[-1]
+            }
+        return result
+
+
+def parse_stats(stats: Dict[str, Any]) -> Tuple[float, int, int, int, int, int]:
+    """
+    CPU cores in use, memory in use, and cumulative IO and network byte
+    counters from one Docker stats sample.
+    """
+
+    cpu, precpu = stats.get("cpu_stats") or {}, stats.get("precpu_stats") or {}
+    cpu_delta = (cpu.get("cpu_usage") or {}).get("total_usage", 0) - \
+        (precpu.get("cpu_usage") or {}).get("total_usage", 0)
+    system_delta = cpu.get("system_cpu_usage", 0) - precpu.get("system_cpu_usage", 0)
+    online = cpu.get("online_cpus") or len((cpu.get("cpu_usage") or {}).get("percpu_usage") or []) or 1
+    cpus = cpu_delta / system_delta * online if cpu_delta > 0 and system_delta > 0 else 0.0
+
+    memory_stats = stats.get("memory_stats") or {}
+    detail = memory_stats.get("stats") or {}
+    # Page cache can be reclaimed; cgroup v2 reports it as inactive_file, v1 as cache
+    reclaimable = detail.get("inactive_file", detail.get("total_inactive_file", detail.get("cache", 0)))
+    memory = max(0, memory_stats.get("usage", 0) - reclaimable)
+
+    io_read = io_write = 0
+    for entry in (stats.get("blkio_stats") or {}).get("io_service_bytes_recursive") or []:
+        op = entry.get("op", "").lower()
+        if op == "read":
+            io_read += entry.get("value", 0)
+        elif op == "write":
+            io_write += entry.get("value", 0)
+
+    net_rx = net_tx = 0
+    for interface in (stats.get("networks") or {}).values():
+        net_rx += interface.get("rx_bytes", 0)
+        net_tx += interface.get("tx_bytes", 0)
+
+    return cpus, memory, io_read, io_write, net_rx, net_tx
+
+
+class ResizePolicy:
+    """
+    Adjusts a sandbox's CPU and memory limits from sustained usage.
+
+    A limit grows by ``step`` when usage stays above ``high`` of it, and
+    shrinks towards usage (with headroom) when it stays below ``low``;
+    both are clamped to the configured bounds. CPU follows the window's
+    average, memory its peak, so a brief spike never shrinks memory.
+    """
+
+    def __init__(
+        self,
+        min_cpus: float,
+        max_cpus: float,
+        min_memory: int,
+        max_memory: int,
+        high: float = 0.8,
+        low: float = 0.3,
+        step: float = 1.5
+    ):
+        self.min_cpus = min_cpus
+        self.max_cpus = max_cpus
+        self.min_memory = min_memory
+        self.max_memory = max_memory
+        self.high = high
+        self.low = low
+        self.step = step
+
+    def decide(self, summary: Dict[str, Any], cpus: float, memory: int) -> Tuple[float, int]:
+        """Return the new (cpus, memory) limits; unchanged values mean no resize."""
+
+        cpu_used = summary["cpus"]["avg"]
+        memory_used = summary["memory"]["max"]
+
+        new_cpus = cpus
+        if cpu_used > cpus * self.high:
+            new_cpus = cpus * self.step
+        elif cpu_used < cpus * self.low:
+            new_cpus = cpu_used * self.step / self.high
+        new_cpus = round(min(self.max_cpus, max(self.min_cpus, new_cpus)), 2)
+
+        new_memory = memory
+        if memory_used > memory * self.high:
+            new_memory = memory * self.step
+        elif memory_used < memory * self.low:
+            new_memory = memory_used * self.step / self.high
+        # Whole megabytes, so small drifts in usage do not cause updates
+        new_memory = int(min(self.max_memory, max(self.min_memory, new_memory))) // 2 ** 20 * 2 ** 20
+
+        return new_cpus, new_memory
+
+
+class SandboxTelemetry:
+    """
+    Live resource usage for every watched sandbox.
+
+    Each container's Docker stats stream is consumed by one lightweight
+    task; the daemon pushes a sample about once a second, so nothing is
+    polled. With a ``policy``, every ``interval`` seconds containers with
+    ``sustain`` seconds of samples since they were watched or last
+    resized are checked, and ``resize`` is called for those whose limits
+    should change. ``limits`` returns a container's current limits, or
+    None to leave it alone.
+    """
+
+    def __init__(
+        self,
+        capacity: int = 300,
+        policy: Optional[ResizePolicy] = None,
+        resize: Optional[Callable[[str, float, int], Awaitable[None]]] = None,
+        limits: Optional[Callable[[str], Optional[Tuple[float, int]]]] = None,
+        interval: float = 60.0,
+        sustain: float = 120.0
+    ):
+        self.capacity = capacity
+        self.policy = policy
+        self.resize = resize
+        self.limits = limits
+        self.interval = interval
+        self.sustain = sustain
+
+        self.rings: Dict[str, StatsRing] = {}
+        # When each container's current limits took effect
+        self._settled_at: Dict[str, float] = {}
+        self._streams: Dict[str, asyncio.Task] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"samples": 0, "stream_errors": 0, "resizes": 0, "resize_failures": 0}
+
+    def start(self) -> None:
+        if self._task is None and self.policy is not None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        tasks = set(self._streams.values())
+        if self._task is not None:
+            tasks.add(self._task)
+            self._task = None
+        # anyio 3 drops a cancel that lands while a stream is still
+        # connecting, so keep cancelling until every task has finished
+        while tasks:
+            for task in tasks:
+                task.cancel()
+            _, tasks = await asyncio.wait(tasks, timeout=0.1)
+        self._streams.clear()
+
+    def watch(self, container_id: str, client: DockerClient) -> None:
+        """Start consuming a container's stats stream."""
+        if container_id in self._streams:
+            return
+        self.rings[container_id] = StatsRing(self.capacity)
+        self._settled_at[container_id] = time.monotonic()
+        self._streams[container_id] = asyncio.create_task(self._consume(container_id, client))
+
+    def unwatch(self, container_id: str) -> None:
+        task = self._streams.pop(container_id, None)
+        if task is not None:
+            task.cancel()
+        self.rings.pop(container_id, None)
+        self._settled_at.pop(container_id, None)
+
+    def summary(self, container_id: str, window: float) -> Optional[Dict[str, Any]]:
+        ring = self.rings.get(container_id)
+        if ring is None:
+            return None
+        return {"latest": ring.latest(), "window_seconds": window, **ring.summary(window)}
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "watched": len(self._streams),
+            "resize_enabled": self.policy is not None,
+            # Ring buffers only; each holds a fixed number of samples
+            "buffer_bytes": sum(ring.capacity * (8 + 4 * len(METRICS)) for ring in self.rings.values())
+        }
+
+    async def _consume(self, container_id: str, client: DockerClient) -> None:
+        ring = self.rings[container_id]
+        delay = 1.0
+        while True:
+            previous = None
+            try:
+                async for stats in client.stream_stats(container_id):
+                    now = time.monotonic()
+                    cpus, memory, *counters = parse_stats(stats)
+                    if previous is not None:
+                        elapsed = max(now - previous[0], 1e-3)
+                        rates = [max(0, value - last) / elapsed for value, last in zip(counters, previous[1])]
+                        ring.append(now, dict(zip(METRICS, [cpus, memory, *rates])))
+                        self.stats["samples"] += 1
+                    previous = (now, counters)
+                    delay = 1.0
+                # The daemon ends the stream when the container stops
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats["stream_errors"] += 1
+                logger.debug(f"Stats stream for container {container_id[:12]} failed: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30.0)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            for container_id, settled_at in list(self._settled_at.items()):
+                # Only act on usage sustained under the current limits
+                if time.monotonic() - settled_at < self.sustain:
+                    continue
+                ring = self.rings.get(container_id)
+                limits = self.limits(container_id)
+                if ring is None or limits is None:
+                    continue
+                summary = ring.summary(self.sustain)
+                if not summary["samples"]:
+                    continue
+
+                cpus, memory = limits
+                new_cpus, new_memory = self.policy.decide(summary, cpus, memory)
+                if (new_cpus, new_memory) == (cpus, memory):
+                    continue
+                try:
+                    await self.resize(container_id, new_cpus, new_memory)
+                    self.stats["resizes"] += 1
+                    if container_id in self._settled_at:
+                        self._settled_at[container_id] = time.monotonic()
+                except Exception as e:
+                    self.stats["resize_failures"] += 1
+                    logger.warning(f"Failed to resize container {container_id[:12]}: {e}")
@@ -0,0 +1,98 @@
+import asyncio
+import io
+import os
+import tarfile
+import tempfile
+import time
+from typing import Any, Dict, IO, Mapping, Union
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from .api_client import SandboxAPIClient
+
+# Archives are built in memory up to this size, then spill to a temporary file
+SPOOL_MEMORY_BYTES = 32 * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 256 * 1024
+# Seeding thousands of files is one request; allow it time on a busy sandbox
+SEED_TIMEOUT = 600.0
+
+# A local directory, or relative paths mapped to their content
+WorkspaceSource = Union[str, Mapping[str, Union[str, bytes]]]
+
+
+def build_archive(source: WorkspaceSource, compression: str = "none") -> IO[bytes]:
+    """
+    Pack ``source`` into a tar archive, plain or gzip or zstd compressed,
+    and return it rewound. Symlinks are stored as links, not followed.
+    """
+
+    if compression == "zstd" and zstandard is None:
+        raise ValueError("zstd compression needs the zstandard package")
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_BYTES)
+    target = zstandard.ZstdCompressor(level=3).stream_writer(spool, closefd=False) if compression == "zstd" else spool
+    # Level 1: the archive crosses a local socket, so speed matters more than size
+    options = {"compresslevel": 1} if compression == "gzip" else {}
+    mode = "w:gz" if compression == "gzip" else "w"
+
+    with tarfile.open(fileobj=target, mode=mode, format=tarfile.GNU_FORMAT, **options) as tar:
+        if isinstance(source, str):
+            for name in sorted(os.listdir(source)):
+                tar.add(os.path.join(source, name), arcname=name)
+        else:
+            now = time.time()
+            for name, content in source.items():
+                data = content.encode("utf-8") if isinstance(content, str) else content
+                info = tarfile.TarInfo(name.lstrip("/"))
+                info.size = len(data)
+                info.mtime = int(now)
+                info.mode = 0o644
+                tar.addfile(info, io.BytesIO(data))
+    if target is not spool:
+        target.flush(zstandard.FLUSH_FRAME)
+    spool.seek(0)
+    return spool
+
+
+class _FileBody:
+    """An upload body read from a file off the event loop; it restarts from the top, so retries resend it whole."""
+
+    def __init__(self, file: IO[bytes]):
+        self.file = file
+
+    async def __aiter__(self):
+        await asyncio.to_thread(self.file.seek, 0)
+        while True:
+            chunk = await asyncio.to_thread(self.file.read, UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+
+async def seed_workspace(
+    api: SandboxAPIClient,
+    session_id: str,
+    source: WorkspaceSource,
+    path: str = "/workspace",
+    compression: str = "none"
+) -> Dict[str, Any]:
+    """
+    Copy a local directory or a set of files into a session's sandbox
+    under ``path`` as one streamed tar upload.
+    """
+
+    archive = await asyncio.to_thread(build_archive, source, compression)
+    try:
+        response = await api.request(
+            session_id,
+            "PUT",
+            "/api/files/archive",
+            params={"path": path},
+            content=_FileBody(archive),
+            timeout=SEED_TIMEOUT
+        )
+    finally:
+        archive.close()
+    return response.json()
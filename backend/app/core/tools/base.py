@@ -2,6 +2,11 @@ from abc import ABC, abstractmethod
 from typing import Dict
 
 class BaseTool(ABC):
+    # Read-only tools have no side effects and may run concurrently
+    read_only: bool = False
+    # Streaming tools take an ``on_output(stream, data)`` callback for live output
+    streams_output: bool = False
+
     @property
     @abstractmethod
     def name(self) -> str:
@@ -20,3 +25,7 @@ class BaseTool(ABC):
     @abstractmethod
     async def execute(self, session_id: str, **kwargs) -> Dict:
         pass
+
+    def is_read_only(self, arguments: Dict) -> bool:
+        """Whether a call with these arguments is free of side effects."""
+        return self.read_only
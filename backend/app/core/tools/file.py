@@ -1,7 +1,16 @@
 from .base import BaseTool
-import os
+from app.core.sandbox.api_client import SandboxAPIClient
+
+# Lines returned by head and tail unless the call says otherwise
+DEFAULT_LINES = 100
+# Paths or matching lines returned by glob and search
+MAX_RESULTS = 200
+WORKSPACE = "/workspace"
 
 class FileTool(BaseTool):
+    def __init__(self, sandbox_api: SandboxAPIClient):
+        self.sandbox_api = sandbox_api
+
     @property
     def name(self) -> str:
         return "file"
@@ -18,35 +27,136 @@ class FileTool(BaseTool):
                 "operation": {
                     "type": "string",
                     "description": "The file operation to perform.",
-                    "enum": ["read", "write", "list"]
+                    "enum": ["read", "write", "list", "head", "tail", "lines", "read_many", "write_many", "glob", "search"]
                 },
                 "path": {
                     "type": "string",
                     "description": "The path to the file or directory."
                 },
+                "paths": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "The files to read with read_many."
+                },
+                "files": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {"path": {"type": "string"}, "content": {"type": "string"}},
+                        "required": ["path", "content"]
+                    },
+                    "description": "The files to write with write_many."
+                },
                 "content": {
                     "type": "string",
                     "description": "The content to write to the file."
+                },
+                "pattern": {
+                    "type": "string",
+                    "description": (
+                        "For glob, a file pattern such as '*.py' (any depth) or 'src/**/test_*.py'; "
+                        "for search, a regular expression to find in file contents."
+                    )
+                },
+                "glob": {
+                    "type": "string",
+                    "description": "For search, only look in files matching this pattern."
+                },
+                "ignore_case": {
+                    "type": "boolean",
+                    "description": "For search, match without regard to case."
+                },
+                "lines": {
+                    "type": "integer",
+                    "description": f"How many lines head and tail return (default {DEFAULT_LINES})."
+                },
+                "start_line": {
+                    "type": "integer",
+                    "description": "First line, counting from 1, for the lines operation."
+                },
+                "end_line": {
+                    "type": "integer",
+                    "description": "Last line, inclusive, for the lines operation."
                 }
             },
-            "required": ["operation", "path"]
+            "required": ["operation"]
         }
 
+    def is_read_only(self, arguments: dict) -> bool:
+        return arguments.get("operation") in ("read", "list", "head", "tail", "lines", "read_many", "glob", "search")
+
     async def execute(self, session_id: str, **kwargs) -> dict:
-        # This is a placeholder. In a real implementation, this would
-        # perform the file operation in the sandbox.
         operation = kwargs["operation"]
-        path = kwargs["path"]
-        if operation == "read":
-            with open(path, "r") as f:
-                content = f.read()
-            return {"content": content}
+        path = kwargs.get("path")
+        if operation == "read_many":
+            # One round trip for all of them
+            result = await self.sandbox_api.post(
+                session_id,
+                "/api/files/batch/read",
+                json={"paths": kwargs["paths"]}
+            )
+            return {"files": [self._batch_item(item, "content") for item in result["files"]]}
+        elif operation == "write_many":
+            result = await self.sandbox_api.post(
+                session_id,
+                "/api/files/batch/write",
+                json={"files": [{"path": item["path"], "content": item["content"]} for item in kwargs["files"]]}
+            )
+            return {"files": [self._batch_item(item, "size") for item in result["files"]]}
+        elif operation == "glob":
+            result = await self.sandbox_api.get(
+                session_id,
+                "/api/files/glob",
+                params={"pattern": kwargs["pattern"], "path": path or WORKSPACE, "limit": MAX_RESULTS}
+            )
+            return {
+                "paths": [match["path"] for match in result["matches"]],
+                "truncated": result["next_cursor"] is not None
+            }
+        elif operation == "search":
+            params = {
+                "pattern": kwargs["pattern"],
+                "path": path or WORKSPACE,
+                "ignore_case": bool(kwargs.get("ignore_case")),
+                "limit": MAX_RESULTS
+            }
+            if kwargs.get("glob"):
+                params["glob"] = kwargs["glob"]
+            result = await self.sandbox_api.get(session_id, "/api/files/search", params=params)
+            return {"matches": result["matches"], "truncated": result["truncated"]}
+        elif path is None:
+            raise ValueError(f"The {operation} operation needs a path")
+        elif operation == "read":
+            result = await self.sandbox_api.get(session_id, "/api/files/read", params={"path": path})
+            return {"content": result["content"]}
         elif operation == "write":
-            content = kwargs["content"]
-            with open(path, "w") as f:
-                f.write(content)
+            await self.sandbox_api.post(
+                session_id,
+                "/api/files/write",
+                json={"path": path, "content": kwargs["content"]}
+            )
             return {"status": "ok"}
         elif operation == "list":
-            return {"files": os.listdir(path)}
+            result = await self.sandbox_api.get(session_id, "/api/files/list", params={"path": path})
+            return {"files": result["files"], "directories": result["directories"]}
+        elif operation in ("head", "tail", "lines"):
+            # Only the wanted lines leave the sandbox, so huge logs stay cheap to inspect
+            if operation == "lines":
+                params = {"start": kwargs.get("start_line") or 1, "end": kwargs.get("end_line")}
+            else:
+                params = {operation: kwargs.get("lines") or DEFAULT_LINES}
+            params = {key: value for key, value in params.items() if value is not None}
+            result = await self.sandbox_api.get(session_id, "/api/files/lines", params={"path": path, **params})
+            return {
+                "content": "\n".join(result["lines"]),
+                "start_line": result["start_line"],
+                "truncated": result["truncated"]
+            }
         else:
             raise ValueError(f"Unknown operation: {operation}")
+
+    @staticmethod
+    def _batch_item(item: dict, field: str) -> dict:
+        if item["success"]:
+            return {"path": item["path"], field: item[field]}
+        return {"path": item["path"], "error": item["error"]}
@@ -1,28 +1,53 @@
 from typing import Dict, List
 from .base import BaseTool
+from app.core.sandbox.api_client import SandboxAPIClient
 from .browser import BrowserTool
 from .terminal import TerminalTool
 from .file import FileTool
 from .search import SearchTool
 
 class ToolRegistry:
-    def __init__(self):
+    def __init__(self, sandbox_api: SandboxAPIClient):
         self._tools = {
             "browser": BrowserTool(),
-            "terminal": TerminalTool(),
-            "file": FileTool(),
+            "terminal": TerminalTool(sandbox_api),
+            "file": FileTool(sandbox_api),
             "search": SearchTool(),
         }
+        self._definitions: List[Dict] = None
 
     def get_tool(self, name: str) -> BaseTool:
         return self._tools.get(name)
 
     def get_tool_definitions(self) -> List[Dict]:
-        return [
-            {
-                "name": tool.name,
-                "description": tool.description,
-                "parameters": tool.parameters,
-            }
-            for tool in self._tools.values()
-        ]
+        # Built once: the tool set is fixed, and returning the same list lets
+        # request builders reuse its encoded bytes. Callers must not mutate it.
+        if self._definitions is None:
+            self._definitions = [
+                {
+                    "name": tool.name,
+                    "description": tool.description,
+                    "parameters": tool.parameters,
+                }
+                for tool in self._tools.values()
+            ]
+        return self._definitions
+
+    def get_tool_descriptions(self) -> str:
+        return "\n".join(
+            f"- {tool.name}: {tool.description}" for tool in self._tools.values()
+        )
+
+    def is_read_only(self, name: str, arguments: Dict) -> bool:
+        tool = self.get_tool(name)
+        return tool is not None and tool.is_read_only(arguments)
+
+    def streams_output(self, name: str) -> bool:
+        tool = self.get_tool(name)
+        return tool is not None and tool.streams_output
+
+    async def execute_tool(self, name: str, **kwargs) -> Dict:
+        tool = self.get_tool(name)
+        if tool is None:
+            raise ValueError(f"Unknown tool: {name}")
+        return await tool.execute(**kwargs)
@@ -2,6 +2,8 @@ from .base import BaseTool
 import httpx
 
 class SearchTool(BaseTool):
+    read_only = True
+
     @property
     def name(self) -> str:
         return "search"
@@ -1,7 +1,20 @@
+from typing import Callable, Dict, Optional
 from .base import BaseTool
-import asyncio
+from app.core.sandbox.api_client import SandboxAPIClient, SandboxAPIError
+
+# Seconds a command may run in the sandbox, by default and at most
+COMMAND_TIMEOUT = 300
+MAX_COMMAND_TIMEOUT = 3600
 
 class TerminalTool(BaseTool):
+    streams_output = True
+
+    def __init__(self, sandbox_api: SandboxAPIClient):
+        self.sandbox_api = sandbox_api
+        # Each chat session's persistent shell in its sandbox, until the sandbox is removed
+        self._shells: Dict[str, str] = {}
+        sandbox_api.on_sandbox_removed(self._forget_shell)
+
     @property
     def name(self) -> str:
         return "terminal"
@@ -18,22 +31,93 @@ class TerminalTool(BaseTool):
                 "command": {
                     "type": "string",
                     "description": "The command to execute."
+                },
+                "stdin": {
+                    "type": "string",
+                    "description": "Input to pipe to the command."
+                },
+                "timeout": {
+                    "type": "number",
+                    "description": f"Seconds before the command is killed (default {COMMAND_TIMEOUT})."
+                },
+                "persistent": {
+                    "type": "boolean",
+                    "description": (
+                        "Run in the session's long-lived shell, keeping the working directory, "
+                        "exported variables and activated environments between calls. "
+                        "Output is returned when the command finishes, combined, without live progress."
+                    )
                 }
             },
             "required": ["command"]
         }
 
-    async def execute(self, session_id: str, **kwargs) -> dict:
-        # This is a placeholder. In a real implementation, this would
-        # execute the command in the sandbox.
-        proc = await asyncio.create_subprocess_shell(
-            kwargs["command"],
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
-        stdout, stderr = await proc.communicate()
+    async def execute(
+        self,
+        session_id: str,
+        on_output: Optional[Callable[[str, str], None]] = None,
+        **kwargs
+    ) -> dict:
+        timeout = min(float(kwargs.get("timeout") or COMMAND_TIMEOUT), MAX_COMMAND_TIMEOUT)
+        if kwargs.get("persistent"):
+            return await self._run_in_shell(session_id, kwargs["command"], timeout)
+
+        # Output streams back from the sandbox as the command produces it
+        output = {"stdout": [], "stderr": []}
+        result = {}
+        async for event in self.sandbox_api.stream(
+            session_id,
+            "POST",
+            "/api/terminal/exec",
+            json={"command": kwargs["command"], "stdin": kwargs.get("stdin"), "timeout": timeout},
+            timeout=timeout + 30
+        ):
+            if event["type"] == "exit":
+                result = event
+                continue
+            output[event["type"]].append(event["data"])
+            if on_output is not None:
+                on_output(event["type"], event["data"])
+
+        return {
+            "stdout": "".join(output["stdout"]),
+            "stderr": "".join(output["stderr"]),
+            "exit_code": result.get("exit_code"),
+            "timed_out": result.get("timed_out", False)
+        }
+
+    def _forget_shell(self, session_id: str) -> None:
+        self._shells.pop(session_id, None)
+
+    async def _run_in_shell(self, session_id: str, command: str, timeout: float) -> dict:
+        for attempt in range(2):
+            shell_id = self._shells.get(session_id)
+            if shell_id is None:
+                shell = await self.sandbox_api.post(session_id, "/api/shell/sessions", json={})
+                shell_id = self._shells[session_id] = shell["id"]
+            try:
+                result = await self.sandbox_api.post(
+                    session_id,
+                    f"/api/shell/sessions/{shell_id}/run",
+                    json={"command": command, "timeout": timeout},
+                    timeout=timeout + 30
+                )
+                break
+            except SandboxAPIError as e:
+                # The shell was closed or the sandbox replaced; start a new one once
+                if e.status_code != 404 or attempt:
+                    raise
+                self._shells.pop(session_id, None)
+
+        if not result["done"]:
+            # Interrupt it so the shell is free for the next call
+            await self.sandbox_api.post(
+                session_id,
+                f"/api/shell/sessions/{shell_id}/write",
+                json={"data": "\x03"}
+            )
         return {
-            "stdout": stdout.decode(),
-            "stderr": stderr.decode(),
-            "exit_code": proc.returncode
+            "output": result["output"],
+            "exit_code": result["exit_code"],
+            "timed_out": not result["done"]
         }
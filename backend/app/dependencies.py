@@ -1,6 +1,7 @@
 from typing import Annotated
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from starlette.requests import HTTPConnection
 from jose import JWTError, jwt
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from loguru import logger
@@ -8,6 +9,9 @@ from loguru import logger
 from app.config import settings
 from app.models.user import User
 from app.core.database import get_database
+from app.core.agent.session_store import AgentSessionStore
+from app.core.llm.codestral import CodestralClient
+from app.core.sandbox.manager import SandboxManager
 
 
 security = HTTPBearer()
@@ -67,6 +71,21 @@ async def get_admin_user(
     return current_user
 
 
+def get_llm_client(connection: HTTPConnection) -> CodestralClient:
+    """Get the shared LLM client."""
+    return connection.app.state.llm_client
+
+
+def get_sandbox_manager(connection: HTTPConnection) -> SandboxManager:
+    """Get the sandbox manager."""
+    return connection.app.state.sandbox_manager
+
+
+def get_agent_store(connection: HTTPConnection) -> AgentSessionStore:
+    """Get the store of session-scoped agents."""
+    return connection.app.state.agent_store
+
+
 # Dependency injection aliases
 CurrentUser = Annotated[User, Depends(get_current_active_user)]
 AdminUser = Annotated[User, Depends(get_admin_user)]
\ No newline at end of file
@@ -2,15 +2,23 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from contextlib import asynccontextmanager
+from urllib.parse import urlparse
 from loguru import logger
 
 from app.config import settings
-from app.api.v1 import auth, chat, sessions, tools, sandbox
+from app.api.v1 import auth, chat, sessions, tools, sandbox, llm
 from app.core.sandbox.manager import SandboxManager
 from app.core.llm.codestral import CodestralClient
+from app.core.llm.cache import ResponseCache
+from app.core.llm.gateway import LLMEndpoint, LLMGateway
+from app.core.llm.scheduler import LLMScheduler
+from app.core.llm.singleflight import SingleFlight
 from app.core.tools.registry import ToolRegistry
 from app.core.agent.planact import PlanActAgent
-from app.core.sandbox.docker_client import DockerClient
+from app.core.agent.session_store import AgentSessionStore
+from app.core.database import close_database, db_manager, init_database
+from app.core.sandbox.docker_client import DockerClient, parse_bytes
+from app.core.sandbox.placement import DockerHost, SandboxPlacement
 
 
 @asynccontextmanager
@@ -20,24 +28,87 @@ async def lifespan(app: FastAPI):
     logger.info("Starting Agent Sheikh Backend...")
     
     # Initialize core services
-    app.state.docker_client = DockerClient()
+    await init_database()
+    
+    hosts = [
+        DockerHost(
+            name=host.get("name", host["host"]),
+            client=DockerClient(host=host["host"]),
+            cpus=host.get("cpus"),
+            memory=parse_bytes(host.get("memory")),
+            # A tcp:// host is another machine unless its address is set to null
+            address=host.get("address", urlparse(host["host"]).hostname)
+        )
+        for host in settings.docker_hosts
+    ] or [DockerHost("local", DockerClient())]
+    app.state.sandbox_placement = SandboxPlacement(
+        hosts,
+        spread_threshold=settings.sandbox_spread_threshold
+    )
     app.state.sandbox_manager = SandboxManager(
-        docker_client=app.state.docker_client,
         network=settings.sandbox_network,
-        ttl_minutes=settings.sandbox_ttl_minutes
+        ttl_minutes=settings.sandbox_ttl_minutes,
+        placement=app.state.sandbox_placement
     )
+    await app.state.sandbox_manager.start()
+    
+    app.state.llm_cache = ResponseCache(
+        mode=settings.llm_cache_mode,
+        directory=settings.llm_cache_dir,
+        memory_entries=settings.llm_cache_memory_entries,
+        max_disk_bytes=settings.llm_cache_max_disk_mb * 1024 * 1024
+    )
+    
+    endpoints = [
+        LLMEndpoint(
+            base_url=endpoint["base_url"],
+            api_key=endpoint.get("api_key", settings.api_key),
+            weight=endpoint.get("weight", 1.0),
+            name=endpoint.get("name"),
+            timeout=settings.llm_timeout_seconds
+        )
+        for endpoint in settings.llm_endpoints
+    ] or [
+        LLMEndpoint(
+            base_url=settings.api_base,
+            api_key=settings.api_key,
+            timeout=settings.llm_timeout_seconds
+        )
+    ]
     
     app.state.llm_client = CodestralClient(
         api_key=settings.api_key,
         base_url=settings.api_base,
-        model=settings.model_name
+        model=settings.model_name,
+        cache=app.state.llm_cache,
+        singleflight=SingleFlight() if settings.llm_singleflight_enabled else None,
+        scheduler=LLMScheduler(
+            initial_limit=settings.llm_concurrency_initial,
+            min_limit=settings.llm_concurrency_min,
+            max_limit=settings.llm_concurrency_max,
+            latency_target=settings.llm_latency_target_seconds
+        ),
+        gateway=LLMGateway(
+            endpoints,
+            hedge=settings.llm_hedge_enabled,
+            hedge_min_delay=settings.llm_hedge_min_delay_seconds,
+            hedge_min_samples=settings.llm_hedge_min_samples
+        )
     )
     
-    app.state.tool_registry = ToolRegistry()
-    app.state.agent = PlanActAgent(
-        llm_client=app.state.llm_client,
-        tool_registry=app.state.tool_registry,
-        max_iterations=settings.max_agent_iterations
+    # Sandbox tools share the manager's pooled connections to each sandbox
+    app.state.tool_registry = ToolRegistry(app.state.sandbox_manager.api)
+    # One agent per session; idle sessions spill to MongoDB
+    app.state.agent_store = AgentSessionStore(
+        agent_factory=lambda: PlanActAgent(
+            llm_client=app.state.llm_client,
+            tool_registry=app.state.tool_registry,
+            max_iterations=settings.max_agent_iterations
+        ),
+        collection=db_manager.get_database()["agent_sessions"],
+        max_sessions=settings.agent_max_sessions,
+        max_session_bytes=settings.agent_max_session_kb * 1024,
+        recent_messages=settings.agent_context_recent_messages
     )
     
     logger.info("Agent Sheikh Backend started successfully")
@@ -45,7 +116,12 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     logger.info("Shutting down Agent Sheikh Backend...")
+    await app.state.agent_store.close()
     await app.state.sandbox_manager.cleanup_expired_sandboxes()
+    await app.state.sandbox_manager.close()
+    await app.state.sandbox_placement.close()
+    await app.state.llm_client.close()
+    await close_database()
     logger.info("Agent Sheikh Backend shutdown complete")
 
 
@@ -78,6 +154,7 @@ def create_app() -> FastAPI:
     app.include_router(sessions.router, prefix="/api/v1", tags=["Sessions"])
     app.include_router(tools.router, prefix="/api/v1", tags=["Tools"])
     app.include_router(sandbox.router, prefix="/api/v1", tags=["Sandbox"])
+    app.include_router(llm.router, prefix="/api/v1", tags=["LLM"])
     
     @app.get("/")
     async def root():
@@ -0,0 +1,45 @@
+import gc
+
+import pytest
+
+from app.config import settings
+from app.tests.fake_docker import FakeDockerAPI
+
+
+@pytest.fixture
+def sandbox_settings(monkeypatch):
+    """Settings for a SandboxManager driven by FakeDockerAPI: no warm pool, no snapshots."""
+    monkeypatch.setattr(settings, "sandbox_pool_size", 0)
+    monkeypatch.setattr(settings, "sandbox_network", "check")
+    monkeypatch.setattr(settings, "sandbox_snapshot_max_total_mb", 0)
+    monkeypatch.setattr(settings, "sandbox_api_socket_dir", None)
+    return settings
+
+
+@pytest.fixture
+def fake_docker():
+    """Start FakeDockerAPI processes with ``fake_docker(...)``, which returns the port; all are stopped afterwards."""
+    fakes = []
+
+    def start(*args, **kwargs) -> int:
+        fake = FakeDockerAPI(*args, **kwargs)
+        fakes.append(fake)
+        return fake.start()
+
+    yield start
+    for fake in fakes:
+        fake.stop()
+
+
+@pytest.fixture
+def frozen_heap():
+    """
+    Move every object allocated so far out of the collector's reach.
+
+    Otherwise a full collection of the app and earlier tests' survivors
+    can land mid-test and show up as 100ms of event-loop lag.
+    """
+    gc.collect()
+    gc.freeze()
+    yield
+    gc.unfreeze()
@@ -0,0 +1,261 @@
+"""
+A fake Docker Engine API for sandbox tests.
+
+It runs in a child process and serves just enough of the Engine API for
+SandboxManager. Each fake container gets its own loopback address
+serving the sandbox /health endpoint, or with ``publish`` its own port
+on 127.0.0.1, published as every port the container exposes, as for a
+host on another machine. That endpoint reports ready ``ready_delay``
+seconds after the container starts. Stats are streamed
+with chunked encoding, as the daemon does.
+"""
+import asyncio
+import json
+import multiprocessing
+import re
+import socket
+import struct
+import time
+import uuid
+
+
+class FakeDockerAPI:
+    """Just enough of the Docker Engine API for SandboxManager."""
+
+    def __init__(
+        self,
+        ready_delay: float,
+        containers: int,
+        subnet: str = "127.0.1",
+        health_port: int = 0,
+        cpus: int = 64,
+        memory: int = 256 * 1024 ** 3,
+        stats_interval: float = 1.0,
+        publish: bool = False
+    ):
+        self.ready_delay = ready_delay
+        # Container n answers /health on <subnet>.n, on the API port unless health_port is set
+        self.addresses = [f"{subnet}.{index}" for index in range(1, containers + 1)]
+        self.health_port = health_port
+        self.cpus = cpus
+        self.memory = memory
+        self.stats_interval = stats_interval
+        self.publish = publish
+        # Container address -> the port its /health is published on
+        self.published = {}
+        self.container_ids = {}
+        self.exposed = {}
+        self.started_at = {}
+        self.execs = {}
+        self._process = None
+
+    def start(self) -> int:
+        """Serve from a child process, so it does not compete for our GIL; return the port."""
+
+        receiver, sender = multiprocessing.Pipe(duplex=False)
+        self._process = multiprocessing.Process(target=self._run, args=(sender,), daemon=True)
+        self._process.start()
+        return receiver.recv()
+
+    def stop(self) -> None:
+        if self._process is not None:
+            self._process.terminate()
+            self._process.join()
+            self._process = None
+
+    def _run(self, sender) -> None:
+        asyncio.run(self._serve(sender))
+
+    async def _serve(self, sender) -> None:
+        server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        for address in self.addresses:
+            if self.publish:
+                published = await asyncio.start_server(
+                    lambda reader, writer, address=address: self._handle(reader, writer, address),
+                    "127.0.0.1",
+                    0
+                )
+                self.published[address] = published.sockets[0].getsockname()[1]
+            else:
+                await asyncio.start_server(self._handle, address, self.health_port or port)
+        sender.send(port)
+        async with server:
+            await server.serve_forever()
+
+    async def _handle(self, reader, writer, address: str = None) -> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode().split(" ", 2)
+                headers = {}
+                while True:
+                    line = (await reader.readline()).decode().strip()
+                    if not line:
+                        break
+                    name, value = line.split(":", 1)
+                    headers[name.lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                path = target.partition("?")[0]
+                address = address or writer.get_extra_info("sockname")[0]
+                match = re.fullmatch(r"/v[\d.]+/containers/(\w+)/stats", path)
+                if match:
+                    await self._stats(writer, match.group(1))
+                    break
+                if path == "/health":
+                    status, payload, content_type = self._health(address)
+                else:
+                    status, payload, content_type = self._route(method, path, body)
+                writer.write(
+                    f"HTTP/1.1 {status} OK\r\n"
+                    f"Content-Type: {content_type}\r\n"
+                    f"Content-Length: {len(payload)}\r\n\r\n".encode() + payload
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def _route(self, method: str, path: str, body: bytes):
+        path = re.sub(r"^/v[\d.]+", "", path)
+
+        if path == "/_ping":
+            return 200, b"OK", "text/plain"
+
+        if path == "/info":
+            return 200, self._json({"NCPU": self.cpus, "MemTotal": self.memory}), "application/json"
+
+        if path == "/containers/create":
+            container_id = uuid.uuid4().hex
+            in_use = set(self.container_ids.values())
+            self.container_ids[container_id] = next(address for address in self.addresses if address not in in_use)
+            self.exposed[container_id] = list(json.loads(body).get("ExposedPorts") or {})
+            return 201, self._json({"Id": container_id}), "application/json"
+
+        match = re.fullmatch(r"/containers/(\w+)/(start|stop|pause|unpause|exec|json|logs|update)", path)
+        if match:
+            container_id, action = match.groups()
+            if container_id not in self.container_ids:
+                return 404, self._json({"message": f"No such container: {container_id}"}), "application/json"
+            if action == "start":
+                self.started_at[container_id] = time.monotonic()
+            elif action == "exec":
+                exec_id = uuid.uuid4().hex
+                self.execs[exec_id] = container_id
+                return 201, self._json({"Id": exec_id}), "application/json"
+            elif action == "logs":
+                output = b"log\n"
+                return 200, struct.pack(">BxxxL", 1, len(output)) + output, \
+                    "application/vnd.docker.multiplexed-stream"
+            elif action == "json":
+                address, ports = self.container_ids[container_id], {}
+                if self.publish:
+                    ports = {
+                        port: [{"HostIp": "0.0.0.0", "HostPort": str(self.published[address])}]
+                        for port in self.exposed[container_id]
+                    }
+                    # A bridge address on the other machine, which no one here can reach
+                    address = f"192.0.2.{address.rsplit('.', 1)[1]}"
+                return 200, self._json({
+                    "Id": container_id,
+                    "Name": f"/{container_id}",
+                    "State": {"Status": "running"},
+                    "NetworkSettings": {
+                        "Ports": ports,
+                        "Networks": {"check": {"IPAddress": address}}
+                    },
+                    "Created": "2024-01-01T00:00:00Z",
+                    "Config": {"Image": "fake"}
+                }), "application/json"
+            return 204, b"", "text/plain"
+
+        match = re.fullmatch(r"/exec/(\w+)/(start|json)", path)
+        if match:
+            exec_id, action = match.groups()
+            if action == "start":
+                output = b"ready\n"
+                return 200, struct.pack(">BxxxL", 1, len(output)) + output, \
+                    "application/vnd.docker.multiplexed-stream"
+            started = self.started_at.get(self.execs[exec_id], time.monotonic())
+            ready = time.monotonic() - started >= self.ready_delay
+            return 200, self._json({"ExitCode": 0 if ready else 1}), "application/json"
+
+        match = re.fullmatch(r"/containers/(\w+)", path)
+        if match and method == "DELETE":
+            if self.container_ids.pop(match.group(1), None) is None:
+                return 404, self._json({"message": f"No such container: {match.group(1)}"}), "application/json"
+            return 204, b"", "text/plain"
+
+        return 404, self._json({"message": f"no route for {method} {path}"}), "application/json"
+
+    async def _stats(self, writer, container_id: str) -> None:
+        """Stream stats samples with chunked encoding until the client goes away."""
+
+        if container_id not in self.container_ids:
+            payload = self._json({"message": f"No such container: {container_id}"})
+            writer.write(
+                b"HTTP/1.1 404 Not Found\r\n"
+                b"Content-Type: application/json\r\n"
+                + f"Content-Length: {len(payload)}\r\n\r\n".encode() + payload
+            )
+            await writer.drain()
+            return
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: application/json\r\n"
+            b"Transfer-Encoding: chunked\r\n\r\n"
+        )
+        tick = 0
+        while True:
+            tick += 1
+            sample = {
+                "cpu_stats": {
+                    "cpu_usage": {"total_usage": tick * 5 * 10 ** 8},
+                    "system_cpu_usage": tick * 4 * 10 ** 9,
+                    "online_cpus": 4
+                },
+                "precpu_stats": {
+                    "cpu_usage": {"total_usage": (tick - 1) * 5 * 10 ** 8},
+                    "system_cpu_usage": (tick - 1) * 4 * 10 ** 9
+                },
+                "memory_stats": {"usage": 300 * 1024 ** 2, "stats": {"inactive_file": 50 * 1024 ** 2}},
+                "blkio_stats": {"io_service_bytes_recursive": [{"op": "read", "value": tick * 4096}]},
+                "networks": {"eth0": {"rx_bytes": tick * 1500, "tx_bytes": tick * 500}}
+            }
+            payload = json.dumps(sample).encode() + b"\n"
+            writer.write(f"{len(payload):x}\r\n".encode() + payload + b"\r\n")
+            await writer.drain()
+            await asyncio.sleep(self.stats_interval)
+
+    def _health(self, address: str):
+        """Like the sandbox API: unavailable until ``ready_delay`` after the container starts."""
+
+        container_id = next(key for key, value in self.container_ids.items() if value == address)
+        started = self.started_at.get(container_id, time.monotonic())
+        if time.monotonic() - started < self.ready_delay:
+            return 503, self._json({"detail": "starting"}), "application/json"
+        return 200, self._json({"status": "healthy", "ready": True, "browser": "stopped"}), "application/json"
+
+    @staticmethod
+    def _json(value) -> bytes:
+        return json.dumps(value).encode()
+
+
+async def measure_lag(stop: asyncio.Event, interval: float = 0.005) -> float:
+    """The worst event-loop lag seen until ``stop`` is set, in seconds."""
+    worst = 0.0
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - started - interval)
+    return worst
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
@@ -0,0 +1,127 @@
+import asyncio
+import time
+import httpx
+import pytest
+
+from app.core.llm.gateway import LLMEndpoint, LLMGateway
+
+
+def endpoint(name: str, handler, weight: float = 1.0) -> LLMEndpoint:
+    """An endpoint served by the local stand-in ``handler``."""
+    return LLMEndpoint(f"http://{name}.test/v1", "key", weight=weight, name=name, transport=httpx.MockTransport(handler))
+
+
+def delayed(seconds: float, status: int = 200):
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(seconds)
+        return httpx.Response(status, json={"served_by": request.url.host})
+    return handler
+
+
+async def post(gateway: LLMGateway, stream: bool = False):
+    async with gateway.open("/chat/completions", b"{}", stream) as (chosen, response):
+        await response.aread()
+        return chosen, response
+
+
+async def test_routes_by_latency_per_unit_of_weight():
+    fast = endpoint("fast", delayed(0))
+    heavy = endpoint("heavy", delayed(0), weight=4.0)
+    fast.latency[False].record(0.1)
+    heavy.latency[False].record(0.2)
+    gateway = LLMGateway([fast, heavy], hedge=False)
+    try:
+        assert gateway.rank() == [heavy, fast]
+        chosen, response = await post(gateway)
+        assert chosen is heavy
+        assert response.json() == {"served_by": "heavy.test"}
+    finally:
+        await gateway.close()
+
+
+async def test_fails_over_on_server_and_transport_errors():
+    def refused(request: httpx.Request) -> httpx.Response:
+        raise httpx.ConnectError("connection refused", request=request)
+
+    broken = endpoint("broken", delayed(0, status=503))
+    down = endpoint("down", refused)
+    healthy = endpoint("healthy", delayed(0))
+    gateway = LLMGateway([broken, down, healthy], hedge=False)
+    try:
+        chosen, response = await post(gateway)
+        assert chosen is healthy
+        assert response.status_code == 200
+        assert gateway.get_stats()["failovers"] == 2
+        assert not broken.healthy and not down.healthy
+        # Cooling down endpoints go to the back of the line
+        assert gateway.rank()[0] is healthy
+    finally:
+        await gateway.close()
+
+
+async def test_every_endpoint_rate_limited_returns_the_429():
+    def rate_limited(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(429, headers={"Retry-After": "5"})
+
+    first = endpoint("first", rate_limited)
+    second = endpoint("second", rate_limited)
+    gateway = LLMGateway([first, second], hedge=False)
+    try:
+        _, response = await post(gateway)
+        assert response.status_code == 429
+        assert not gateway.available()
+        # Retry-After sets the cooldown
+        assert first.unhealthy_until - time.monotonic() > 4
+    finally:
+        await gateway.close()
+
+
+async def test_all_endpoints_failing_raises():
+    gateway = LLMGateway([endpoint("a", delayed(0, status=500)), endpoint("b", delayed(0, status=502))], hedge=False)
+    try:
+        with pytest.raises(httpx.HTTPStatusError):
+            await post(gateway)
+    finally:
+        await gateway.close()
+
+
+async def test_slow_primary_is_hedged_and_the_loser_cancelled():
+    cancelled = asyncio.Event()
+
+    async def stalls(request: httpx.Request) -> httpx.Response:
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+        return httpx.Response(200)
+
+    primary = endpoint("primary", stalls)
+    backup = endpoint("backup", delayed(0.01))
+    for _ in range(5):
+        primary.latency[False].record(0.01)
+    backup.latency[False].record(0.05)
+    gateway = LLMGateway([primary, backup], hedge_min_delay=0.05, hedge_min_samples=5)
+    try:
+        started = time.monotonic()
+        chosen, response = await post(gateway)
+        assert chosen is backup
+        assert response.status_code == 200
+        assert time.monotonic() - started < 1.0
+        assert gateway.get_stats()["hedges"] == 1
+        assert gateway.get_stats()["hedge_wins"] == 1
+        await asyncio.wait_for(cancelled.wait(), 1.0)
+    finally:
+        await gateway.close()
+
+
+async def test_no_hedge_without_enough_samples():
+    primary = endpoint("primary", delayed(0.2))
+    backup = endpoint("backup", delayed(0))
+    gateway = LLMGateway([primary, backup], hedge_min_delay=0.01, hedge_min_samples=20)
+    try:
+        chosen, _ = await post(gateway)
+        assert chosen is primary
+        assert gateway.get_stats()["hedges"] == 0
+    finally:
+        await gateway.close()
@@ -0,0 +1,156 @@
+import asyncio
+import httpx
+import pytest
+
+from app.core.llm.codestral import CodestralClient
+from app.core.llm.gateway import LLMEndpoint, LLMGateway
+from app.core.llm.scheduler import LLMScheduler, RequestPriority, parse_retry_after
+
+COMPLETION = {"choices": [{"message": {"role": "assistant", "content": "ok"}}]}
+
+
+def make_client(handler, scheduler: LLMScheduler, max_retries: int = 0) -> CodestralClient:
+    """A client whose single endpoint is the local stand-in ``handler``."""
+    endpoint = LLMEndpoint("http://llm.test/v1", "key", transport=httpx.MockTransport(handler))
+    return CodestralClient(
+        api_key="key",
+        model="test-model",
+        scheduler=scheduler,
+        gateway=LLMGateway([endpoint], hedge=False),
+        max_retries=max_retries
+    )
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after("-1") == 0.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    assert parse_retry_after("soon") is None
+
+
+async def test_successes_raise_the_limit():
+    scheduler = LLMScheduler(initial_limit=2, max_limit=4)
+    for _ in range(10):
+        async with scheduler.slot():
+            pass
+    assert scheduler.limit > 2
+    assert scheduler.get_stats()["limit_increases"] >= 1
+
+
+async def test_rate_limit_halves_the_limit_and_pauses_dispatch():
+    scheduler = LLMScheduler(initial_limit=8)
+    async with scheduler.slot() as slot:
+        slot.rate_limited(0.2)
+    assert scheduler.limit == 4
+    assert scheduler.get_stats()["paused_for"] > 0
+
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    async with scheduler.slot():
+        pass
+    assert loop.time() - started >= 0.15
+
+
+async def test_priorities_and_sessions_are_served_in_order():
+    scheduler = LLMScheduler(initial_limit=1, max_limit=1)
+    order = []
+
+    async def request(name, priority, session_id):
+        async with scheduler.slot(priority, session_id):
+            order.append(name)
+
+    async with scheduler.slot():
+        waiters = [
+            asyncio.create_task(request("a1", RequestPriority.BACKGROUND, "a")),
+            asyncio.create_task(request("b1", RequestPriority.INTERACTIVE, "b")),
+            asyncio.create_task(request("b2", RequestPriority.INTERACTIVE, "b")),
+            asyncio.create_task(request("c1", RequestPriority.INTERACTIVE, "c"))
+        ]
+        await asyncio.sleep(0)
+    await asyncio.gather(*waiters)
+    # Interactive before background; sessions b and c take turns
+    assert order == ["b1", "c1", "b2", "a1"]
+
+
+async def test_cancelled_grant_returns_the_slot_without_raising_the_limit():
+    scheduler = LLMScheduler(initial_limit=1, max_limit=4)
+    await scheduler.acquire()
+    waiter = asyncio.create_task(scheduler.acquire())
+    await asyncio.sleep(0)
+
+    # The failure keeps the limit at its floor and grants the slot to the waiter
+    scheduler.release(0.0, failed=True)
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+
+    assert scheduler.limit == 1
+    assert scheduler.get_stats()["in_flight"] == 0
+    assert scheduler.get_stats()["limit_increases"] == 0
+
+
+async def test_exhausted_429_lowers_the_limit():
+    requests = []
+
+    def always_rate_limited(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(429, headers={"Retry-After": "0"}, json={"detail": "slow down"})
+
+    scheduler = LLMScheduler(initial_limit=8)
+    client = make_client(always_rate_limited, scheduler, max_retries=0)
+    try:
+        with pytest.raises(httpx.HTTPStatusError):
+            await client.chat_complete([{"role": "user", "content": "hi"}])
+    finally:
+        await client.close()
+
+    assert len(requests) == 1
+    assert scheduler.limit == 4
+    assert scheduler.get_stats()["rate_limited"] == 1
+    assert scheduler.get_stats()["in_flight"] == 0
+
+
+async def test_429_is_retried_until_it_succeeds():
+    responses = [
+        httpx.Response(429, headers={"Retry-After": "0"}),
+        httpx.Response(429, headers={"Retry-After": "0"}),
+        httpx.Response(200, json=COMPLETION)
+    ]
+
+    scheduler = LLMScheduler(initial_limit=8)
+    client = make_client(lambda request: responses.pop(0), scheduler, max_retries=2)
+    try:
+        result = await client.chat_complete([{"role": "user", "content": "hi"}])
+    finally:
+        await client.close()
+
+    assert result == COMPLETION
+    assert scheduler.get_stats()["rate_limited"] == 2
+    assert scheduler.limit < 8
+
+
+async def test_server_errors_lower_the_limit():
+    scheduler = LLMScheduler(initial_limit=8)
+    client = make_client(lambda request: httpx.Response(503), scheduler)
+    try:
+        with pytest.raises(httpx.HTTPStatusError):
+            await client.chat_complete([{"role": "user", "content": "hi"}])
+    finally:
+        await client.close()
+
+    assert scheduler.limit == 4
+    assert scheduler.get_stats()["failures"] == 1
+
+
+async def test_client_errors_do_not_lower_the_limit():
+    scheduler = LLMScheduler(initial_limit=8)
+    client = make_client(lambda request: httpx.Response(400), scheduler)
+    try:
+        with pytest.raises(httpx.HTTPStatusError):
+            await client.chat_complete([{"role": "user", "content": "hi"}])
+    finally:
+        await client.close()
+
+    assert scheduler.limit == 8
+    assert scheduler.get_stats()["failures"] == 0
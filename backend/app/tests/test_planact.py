@@ -0,0 +1,74 @@
+import asyncio
+import time
+
+from app.core.agent.planact import PlanActAgent
+
+
+class StubTools:
+    """A tool registry where ``read`` is read-only and slow, and ``fail`` raises."""
+
+    def __init__(self):
+        self.running = 0
+        self.max_running = 0
+
+    def is_read_only(self, name, arguments):
+        return name == "read"
+
+    def streams_output(self, name):
+        return False
+
+    async def execute_tool(self, name, **kwargs):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await asyncio.sleep(0.1)
+            if name == "fail":
+                raise RuntimeError("disk on fire")
+            return {"tool": name, "result": kwargs["path"], "status": "ok"}
+        finally:
+            self.running -= 1
+
+
+async def run_calls(agent, tool_calls):
+    events, results = [], []
+    async for event, result in agent._run_tool_calls(tool_calls, "session"):
+        events.append(event)
+        if result is not None:
+            results.append(result)
+    return events, results
+
+
+async def test_failed_tool_is_reported_with_its_timing_and_returned_to_the_model():
+    agent = PlanActAgent(llm_client=None, tool_registry=StubTools())
+    events, results = await run_calls(agent, [
+        {"name": "read", "arguments": {"path": "a"}},
+        {"name": "fail", "arguments": {"path": "b"}}
+    ])
+
+    assert [event["type"] for event in events] == ["tool_execution", "tool_error"]
+    assert events[1]["tool"] == "fail"
+    assert events[1]["error"] == "disk on fire"
+    assert events[1]["duration_ms"] >= 100
+    assert results[1] == {"tool": "fail", "result": "disk on fire", "status": "error"}
+
+
+async def test_read_only_calls_run_concurrently_in_call_order():
+    tools = StubTools()
+    agent = PlanActAgent(llm_client=None, tool_registry=tools)
+    started = time.monotonic()
+    events, _ = await run_calls(agent, [{"name": "read", "arguments": {"path": str(i)}} for i in range(3)])
+
+    assert [event["result"]["result"] for event in events] == ["0", "1", "2"]
+    assert tools.max_running == 3
+    assert time.monotonic() - started < 0.25
+
+
+async def test_mutating_call_runs_alone():
+    tools = StubTools()
+    agent = PlanActAgent(llm_client=None, tool_registry=tools)
+    await run_calls(agent, [
+        {"name": "read", "arguments": {"path": "a"}},
+        {"name": "write", "arguments": {"path": "b"}},
+        {"name": "read", "arguments": {"path": "c"}}
+    ])
+    assert tools.max_running == 1
@@ -0,0 +1,73 @@
+import json
+
+from app.core.llm.request_builder import ChatRequestBuilder, request_key
+
+TOOLS = [
+    {
+        "name": name,
+        "description": f"A tool for {name} operations.",
+        "parameters": {"type": "object", "properties": {"arg": {"type": "string"}}, "required": ["arg"]}
+    }
+    for name in ("browser", "terminal", "file", "search")
+]
+
+
+def build_payload(messages, **overrides):
+    return {
+        "model": "codestral-latest",
+        "messages": messages,
+        "max_tokens": 2000,
+        "temperature": 0.7,
+        "tools": TOOLS,
+        "tool_choice": "auto",
+        **overrides
+    }
+
+
+def test_body_matches_plain_json_encoding():
+    payload = build_payload([{"role": "user", "content": "héllo \"quoted\""}], stream=True)
+    body = ChatRequestBuilder().build(payload).body
+    assert json.loads(body) == payload
+
+
+def test_growing_history_encodes_only_new_messages():
+    tool_output = "x" * (64 * 1024)
+    history = [{"role": "user", "content": "Build and test the project."}]
+    builder = ChatRequestBuilder()
+    naive_total = 0
+
+    for iteration in range(10):
+        payload = build_payload(history, stream=True)
+        encoded_before = builder.stats["bytes_encoded"]
+        body = builder.build(payload).body
+        naive_total += len(json.dumps(payload).encode("utf-8"))
+
+        assert json.loads(body) == payload
+        if iteration:
+            # Two new messages plus the small scalar fields; the history and tools are reused
+            assert builder.stats["bytes_encoded"] - encoded_before < len(tool_output) + 1024
+
+        history.append({"role": "assistant", "content": f"Step {iteration}: running a tool."})
+        history.append({"role": "tool", "content": tool_output, "name": "tool_result"})
+
+    # Re-serializing the whole payload each call costs several times more
+    assert naive_total > 4 * builder.stats["bytes_encoded"]
+
+
+def test_key_ignores_transport_fields_and_follows_content():
+    messages = [{"role": "user", "content": "hi"}]
+    assert request_key(build_payload(messages)) == request_key(build_payload(messages, stream=True))
+    assert request_key(build_payload(messages)) != request_key(build_payload(messages, temperature=0))
+    assert request_key(build_payload(messages)) != request_key(
+        build_payload([{"role": "user", "content": "hello"}])
+    )
+
+
+def test_replaced_messages_are_re_encoded():
+    builder = ChatRequestBuilder()
+    messages = [{"role": "user", "content": "first"}, {"role": "assistant", "content": "long answer"}]
+    builder.build(build_payload(messages))
+    # Compaction swaps a message for a new, shorter dict
+    compacted = [messages[0], {"role": "assistant", "content": "summary"}]
+    body = builder.build(build_payload(compacted)).body
+    assert json.loads(body)["messages"] == compacted
@@ -0,0 +1,37 @@
+import asyncio
+import time
+
+from app.core.sandbox.docker_client import DockerClient
+from app.core.sandbox.manager import SandboxManager
+from app.tests.fake_docker import measure_lag
+
+SANDBOXES = 20
+READY_DELAY = 1.0
+# Blocking calls stall the loop for whole seconds; the fake daemon shares the CPU, so allow some scheduling noise
+MAX_LAG_MS = 100.0
+
+
+async def test_concurrent_starts_do_not_block_the_event_loop(sandbox_settings, fake_docker, monkeypatch, frozen_heap):
+    port = fake_docker(READY_DELAY, SANDBOXES)
+    monkeypatch.setattr(sandbox_settings, "sandbox_api_port", port)
+    docker_client = DockerClient(host=f"tcp://127.0.0.1:{port}")
+    manager = SandboxManager(docker_client=docker_client)
+    # Connect once first so one-time client setup is not counted as lag
+    await docker_client.ping()
+
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(measure_lag(stop))
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(manager.create_sandbox(f"check-{index}") for index in range(SANDBOXES)))
+        elapsed = time.perf_counter() - started
+    finally:
+        stop.set()
+        worst_lag_ms = await lag_task * 1000
+        await manager.close()
+        await docker_client.close()
+
+    assert len(manager.active_sandboxes) == SANDBOXES
+    # Readiness waits overlap instead of adding up
+    assert elapsed < READY_DELAY * 4
+    assert worst_lag_ms <= MAX_LAG_MS, f"worst event-loop lag {worst_lag_ms:.1f}ms"
@@ -0,0 +1,99 @@
+import pytest
+
+from app.core.sandbox.docker_client import DockerAPIError, DockerClient
+from app.core.sandbox.manager import SandboxManager
+from app.core.tools.terminal import TerminalTool
+
+
+@pytest.fixture
+async def manager(sandbox_settings, fake_docker, monkeypatch):
+    """A SandboxManager on one fake Docker daemon."""
+    port = fake_docker(0, 4)
+    monkeypatch.setattr(sandbox_settings, "sandbox_api_port", port)
+    docker_client = DockerClient(host=f"tcp://127.0.0.1:{port}")
+    manager = SandboxManager(docker_client=docker_client)
+    yield manager
+    await manager.close()
+    await docker_client.close()
+
+
+async def test_failed_destroy_keeps_the_sandbox_scheduled_for_reaping(manager, monkeypatch):
+    await manager.create_sandbox("session")
+    # The reaper pops expired sessions before destroying them
+    manager.lifecycle.unregister_sandbox("session")
+
+    docker = manager._docker(manager.active_sandboxes["session"]["container_id"])
+    stop_container = docker.stop_container
+    failures = [DockerAPIError(500, "daemon busy")]
+
+    async def flaky_stop(container_id, timeout=10):
+        if failures:
+            raise failures.pop()
+        await stop_container(container_id, timeout=timeout)
+
+    monkeypatch.setattr(docker, "stop_container", flaky_stop)
+    with pytest.raises(DockerAPIError):
+        await manager.destroy_sandbox("session")
+
+    assert "session" in manager.active_sandboxes
+    assert manager.lifecycle.expires_at("session") is not None
+
+    await manager.destroy_sandbox("session")
+    assert "session" not in manager.active_sandboxes
+    assert manager.lifecycle.expires_at("session") is None
+
+
+async def test_destroying_a_container_removed_by_hand_forgets_the_sandbox(manager):
+    await manager.create_sandbox("session")
+    manager.lifecycle.unregister_sandbox("session")
+    container_id = manager.active_sandboxes["session"]["container_id"]
+    await manager._docker(container_id).remove_container(container_id, force=True)
+
+    await manager.destroy_sandbox("session")
+
+    assert "session" not in manager.active_sandboxes
+    assert manager.lifecycle.expires_at("session") is None
+
+
+async def test_removed_sandboxes_drop_their_terminal_shells(manager):
+    terminal = TerminalTool(manager.api)
+    for session_id in ("destroyed", "hibernated", "kept"):
+        await manager.create_sandbox(session_id)
+        terminal._shells[session_id] = f"shell-{session_id}"
+
+    await manager.destroy_sandbox("destroyed")
+    await manager.hibernate_sandbox("hibernated")
+
+    assert terminal._shells == {"kept": "shell-kept"}
+
+
+async def test_refused_snapshot_drops_the_previous_one(sandbox_settings, fake_docker, monkeypatch, tmp_path):
+    monkeypatch.setattr(sandbox_settings, "sandbox_snapshot_dir", str(tmp_path))
+    monkeypatch.setattr(sandbox_settings, "sandbox_snapshot_max_total_mb", 10)
+    monkeypatch.setattr(sandbox_settings, "sandbox_snapshot_max_mb", 1)
+    port = fake_docker(0, 4)
+    monkeypatch.setattr(sandbox_settings, "sandbox_api_port", port)
+    docker_client = DockerClient(host=f"tcp://127.0.0.1:{port}")
+    manager = SandboxManager(docker_client=docker_client)
+
+    workspace_size = 1024
+
+    async def export_archive(container_id, path):
+        yield b"x" * workspace_size
+
+    monkeypatch.setattr(docker_client, "export_archive", export_archive)
+    try:
+        await manager.create_sandbox("session")
+        await manager.hibernate_sandbox("session")
+        assert manager.snapshots.has("session")
+
+        # The workspace outgrows the cap after the session is restored
+        await manager.create_sandbox("session")
+        workspace_size = 2 * 1024 * 1024
+        await manager.hibernate_sandbox("session")
+    finally:
+        await manager.close()
+        await docker_client.close()
+
+    assert "session" not in manager.active_sandboxes
+    assert not manager.snapshots.has("session")
@@ -0,0 +1,117 @@
+import asyncio
+from collections import Counter
+
+import pytest
+
+from app.core.sandbox.docker_client import DockerClient
+from app.core.sandbox.manager import SandboxManager
+from app.core.sandbox.placement import DockerHost, NoCapacityError, SandboxPlacement
+from app.tests.fake_docker import free_port
+
+# (name, cpus, memory in GiB) of each fake host; they fit 10, 5 and 5 sandboxes
+HOSTS = [("large", 16, 32), ("small-a", 8, 16), ("small-b", 8, 16)]
+CAPACITY = 20
+
+
+@pytest.fixture
+async def manager(sandbox_settings, fake_docker, monkeypatch):
+    """A SandboxManager placing sandboxes on one fake Docker daemon per host."""
+    # Every fake container answers /health on the same port, on its own address
+    monkeypatch.setattr(sandbox_settings, "sandbox_api_port", free_port())
+    hosts = []
+    for index, (name, cpus, memory) in enumerate(HOSTS):
+        port = fake_docker(
+            0.1,
+            CAPACITY,
+            subnet=f"127.0.{index + 2}",
+            health_port=sandbox_settings.sandbox_api_port,
+            cpus=cpus,
+            memory=memory * 1024 ** 3
+        )
+        hosts.append(DockerHost(name, DockerClient(host=f"tcp://127.0.0.1:{port}")))
+
+    placement = SandboxPlacement(hosts, spread_threshold=sandbox_settings.sandbox_spread_threshold)
+    manager = SandboxManager(placement=placement)
+    await placement.refresh()
+    yield manager
+    await manager.close()
+    await placement.close()
+
+
+def hosts_of(manager: SandboxManager, prefix: str = "") -> Counter:
+    return Counter(
+        info["container_info"]["host"]
+        for session_id, info in manager.active_sandboxes.items()
+        if session_id.startswith(prefix)
+    )
+
+
+async def test_full_hosts_reject_sandboxes_without_overcommitting(manager):
+    results = await asyncio.gather(
+        *(manager.create_sandbox(f"check-{index}") for index in range(CAPACITY + 4)),
+        return_exceptions=True
+    )
+
+    assert sum(isinstance(result, NoCapacityError) for result in results) == 4
+    assert not [result for result in results if isinstance(result, Exception) and not isinstance(result, NoCapacityError)]
+    assert hosts_of(manager) == {"large": 10, "small-a": 5, "small-b": 5}
+    for host in manager.placement.hosts.values():
+        assert host.allocated_cpus <= host.cpus
+        assert host.allocated_memory <= host.memory
+
+
+async def test_commands_reach_the_host_owning_the_container(manager):
+    await asyncio.gather(*(manager.create_sandbox(f"check-{index}") for index in range(8)))
+    assert len(hosts_of(manager)) > 1
+
+    for session_id in manager.active_sandboxes:
+        result = await manager.execute_command(session_id, "true")
+        assert result["exit_code"] == 0
+        assert await manager.get_container_logs(session_id) == "log\n"
+
+
+async def test_draining_host_takes_no_new_sandboxes(manager):
+    await asyncio.gather(*(manager.create_sandbox(f"check-{index}") for index in range(4)))
+    await manager.drain_host("large")
+    await asyncio.gather(*(manager.create_sandbox(f"refill-{index}") for index in range(4)))
+
+    refills = hosts_of(manager, "refill-")
+    assert sum(refills.values()) == 4
+    assert "large" not in refills
+
+
+async def test_sandboxes_on_other_machines_are_reached_through_published_ports(sandbox_settings, fake_docker, monkeypatch):
+    monkeypatch.setattr(sandbox_settings, "sandbox_api_port", free_port())
+    monkeypatch.setattr(sandbox_settings, "sandbox_ready_timeout_seconds", 5.0)
+    # One sandbox fits on each; the remote host's container network is out of reach
+    local_port = fake_docker(0.1, 2, subnet="127.0.5", health_port=sandbox_settings.sandbox_api_port, cpus=2)
+    remote_port = fake_docker(0.1, 2, publish=True, cpus=2)
+    placement = SandboxPlacement([
+        DockerHost("local", DockerClient(host=f"tcp://127.0.0.1:{local_port}")),
+        DockerHost("remote", DockerClient(host=f"tcp://127.0.0.1:{remote_port}"), address="127.0.0.1")
+    ])
+    manager = SandboxManager(placement=placement)
+    await placement.refresh()
+    try:
+        await asyncio.gather(*(manager.create_sandbox(f"check-{index}") for index in range(2)))
+
+        container_info = {
+            info["container_info"]["host"]: info["container_info"] for info in manager.active_sandboxes.values()
+        }
+        assert "api_address" not in container_info["local"]
+        assert container_info["remote"]["api_address"].startswith("127.0.0.1:")
+        for session_id in manager.active_sandboxes:
+            assert (await manager.api.get(session_id, "/health"))["status"] == "healthy"
+    finally:
+        await manager.close()
+        await placement.close()
+
+
+async def test_api_sockets_are_refused_with_remote_hosts(sandbox_settings, monkeypatch, tmp_path):
+    monkeypatch.setattr(sandbox_settings, "sandbox_api_socket_dir", str(tmp_path))
+    placement = SandboxPlacement([DockerHost("remote", DockerClient(host="tcp://192.0.2.1:2375"), address="192.0.2.1")])
+    try:
+        with pytest.raises(ValueError, match="remote"):
+            SandboxManager(placement=placement)
+    finally:
+        await placement.close()
@@ -0,0 +1,69 @@
+import asyncio
+import time
+
+import pytest
+
+from app.core.sandbox.docker_client import DockerAPIError, DockerClient
+from app.core.sandbox.manager import SandboxManager
+from app.tests.fake_docker import measure_lag
+
+SANDBOXES = 20
+INTERVAL = 0.1
+# Blocking calls stall the loop for whole seconds; the fake daemon shares the CPU, so allow some scheduling noise
+MAX_LAG_MS = 100.0
+
+
+async def test_stream_stats_yields_each_sample(fake_docker):
+    port = fake_docker(0, 1, stats_interval=0.01)
+    docker_client = DockerClient(host=f"tcp://127.0.0.1:{port}")
+    try:
+        container_id = await docker_client.create_container("fake")
+        samples = []
+        async for stats in docker_client.stream_stats(container_id):
+            samples.append(stats)
+            if len(samples) == 3:
+                break
+    finally:
+        await docker_client.close()
+
+    assert [stats["networks"]["eth0"]["rx_bytes"] for stats in samples] == [1500, 3000, 4500]
+
+
+async def test_stream_stats_raises_on_api_errors(fake_docker):
+    port = fake_docker(0, 1)
+    docker_client = DockerClient(host=f"tcp://127.0.0.1:{port}")
+    try:
+        with pytest.raises(DockerAPIError):
+            async for _ in docker_client.stream_stats("missing"):
+                pass
+    finally:
+        await docker_client.close()
+
+
+async def test_every_sandbox_streams_stats_without_blocking_the_loop(sandbox_settings, fake_docker, monkeypatch, frozen_heap):
+    port = fake_docker(0.1, SANDBOXES, stats_interval=INTERVAL)
+    monkeypatch.setattr(sandbox_settings, "sandbox_api_port", port)
+    docker_client = DockerClient(host=f"tcp://127.0.0.1:{port}")
+    manager = SandboxManager(docker_client=docker_client)
+    try:
+        await asyncio.gather(*(manager.create_sandbox(f"check-{index}") for index in range(SANDBOXES)))
+
+        stop = asyncio.Event()
+        lag_task = asyncio.create_task(measure_lag(stop))
+        await asyncio.sleep(10 * INTERVAL)
+        stop.set()
+        worst_lag_ms = await lag_task * 1000
+
+        window = 10 * INTERVAL
+        usage = [manager.get_sandbox_stats(session_id, window) for session_id in manager.active_sandboxes]
+    finally:
+        started = time.monotonic()
+        await manager.close()
+        await docker_client.close()
+
+    # Closing cancels every open stream promptly
+    assert time.monotonic() - started < 1.0
+    assert all(stats["samples"] > 0 for stats in usage)
+    assert usage[0]["cpus"]["max"] == pytest.approx(0.5)
+    assert usage[0]["net_rx"]["avg"] > 0
+    assert worst_lag_ms <= MAX_LAG_MS, f"worst event-loop lag {worst_lag_ms:.1f}ms"
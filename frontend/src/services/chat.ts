@@ -2,7 +2,7 @@ import axios from 'axios'
 import type { Message } from '../types/models'
 
 export interface ChatResponse {
-  type: 'plan' | 'tool_execution' | 'tool_error' | 'reflection' | 'completion'
+  type: 'plan' | 'plan_delta' | 'tool_execution' | 'tool_error' | 'reflection' | 'reflection_delta' | 'completion'
   content?: string
   tool?: string
   arguments?: any
@@ -6,6 +6,8 @@ export function useWebSocket(sessionId: string) {
   const ws = ref<WebSocket | null>(null);
   const messages = ref<any[]>([]);
   const isConnected = ref(false);
+  // Workspace change batches pushed from the sandbox go to listeners, not into the chat
+  const changeListeners: ((batch: any) => void)[] = [];
 
   const connect = () => {
     ws.value = new WebSocket(`${WS_URL}/${sessionId}`);
@@ -16,7 +18,12 @@ export function useWebSocket(sessionId: string) {
     };
 
     ws.value.onmessage = (event) => {
-      messages.value.push(JSON.parse(event.data));
+      const data = JSON.parse(event.data);
+      if (data.type === 'workspace_changes') {
+        changeListeners.forEach((listener) => listener(data));
+      } else {
+        messages.value.push(data);
+      }
     };
 
     ws.value.onclose = () => {
@@ -37,6 +44,10 @@ export function useWebSocket(sessionId: string) {
     }
   };
 
+  const onWorkspaceChanges = (listener: (batch: any) => void) => {
+    changeListeners.push(listener);
+  };
+
   const disconnect = () => {
     if (ws.value) {
       ws.value.close();
@@ -49,6 +60,7 @@ export function useWebSocket(sessionId: string) {
     isConnected,
     connect,
     send,
+    onWorkspaceChanges,
     disconnect,
   };
 }
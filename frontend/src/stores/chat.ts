@@ -44,20 +44,50 @@ export const useChatStore = defineStore('chat', () => {
       // Send message and get streaming response
       const response = await chatService.sendMessage(content, session)
       
+      // Plan/reflection tokens accumulate into a draft message until the full text arrives
+      let draftId: string | null = null
+
       // Handle streaming response
       for await (const chunk of response) {
-        if (chunk.type === 'plan') {
+        if (chunk.type === 'plan_delta' || chunk.type === 'reflection_delta') {
+          if (draftId === null) {
+            draftId = `plan-${Date.now()}`
+            addMessage({
+              id: draftId,
+              content: chunk.content || '',
+              role: 'assistant',
+              type: 'plan',
+              timestamp: new Date()
+            })
+          } else {
+            const draft = messages.value.find(m => m.id === draftId)
+            updateMessage(draftId, { content: (draft?.content || '') + (chunk.content || '') })
+          }
+        } else if (chunk.type === 'plan' || chunk.type === 'reflection') {
+          if (draftId !== null) {
+            updateMessage(draftId, { content: chunk.content })
+            draftId = null
+          } else if (chunk.type === 'plan') {
+            addMessage({
+              id: `plan-${Date.now()}`,
+              content: chunk.content,
+              role: 'assistant',
+              type: 'plan',
+              timestamp: new Date()
+            })
+          }
+        } else if (chunk.type === 'tool_execution') {
           addMessage({
-            id: `plan-${Date.now()}`,
-            content: chunk.content,
+            id: `tool-${Date.now()}`,
+            content: `Tool: ${chunk.tool}\nResult: ${JSON.stringify(chunk.result)}`,
             role: 'assistant',
-            type: 'plan',
+            type: 'tool',
             timestamp: new Date()
           })
-        } else if (chunk.type === 'tool_execution') {
+        } else if (chunk.type === 'tool_error') {
           addMessage({
             id: `tool-${Date.now()}`,
-            content: `Tool: ${chunk.tool}\nResult: ${JSON.stringify(chunk.result)}`,
+            content: `Tool: ${chunk.tool}\nError: ${chunk.error}`,
             role: 'assistant',
             type: 'tool',
             timestamp: new Date()
@@ -0,0 +1,240 @@
+import asyncio
+import os
+import tarfile
+from typing import AsyncIterable, AsyncIterator, Dict
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Bytes handed between the event loop and the tar thread at a time, and how
+# many such chunks may be in flight before the faster side waits
+CHUNK_SIZE = 256 * 1024
+PIPE_DEPTH = 8
+
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+# Members are checked by _safe_member before extraction; newer Pythons
+# would otherwise apply their own filter on top
+TRUSTED = {"filter": "fully_trusted"} if hasattr(tarfile, "fully_trusted_filter") else {}
+MEDIA_TYPES = {
+    "none": "application/x-tar",
+    "gzip": "application/gzip",
+    "zstd": "application/zstd"
+}
+
+
+def compressions() -> list:
+    """Compressions this sandbox can read and write."""
+    return [name for name in MEDIA_TYPES if name != "zstd" or zstandard is not None]
+
+
+class _ThreadPipe:
+    """
+    A file object whose bytes cross between a worker thread and the
+    event loop through a bounded queue, so tarfile can stream from or to
+    an HTTP body without holding the archive in memory.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(PIPE_DEPTH)
+        self.closed = False
+        self._pending = bytearray()
+        self._eof = False
+
+    # Worker side
+    def write(self, data: bytes) -> int:
+        if self.closed:
+            raise BrokenPipeError("Archive reader went away")
+        self._pending += data
+        if len(self._pending) >= CHUNK_SIZE:
+            self._put(bytes(self._pending))
+            self._pending.clear()
+        return len(data)
+
+    def read(self, size: int = -1) -> bytes:
+        while not self._eof and (size < 0 or len(self._pending) < size):
+            chunk = asyncio.run_coroutine_threadsafe(self.queue.get(), self.loop).result()
+            if not chunk:
+                self._eof = True
+            else:
+                self._pending += chunk
+        if size < 0:
+            size = len(self._pending)
+        data = bytes(self._pending[:size])
+        del self._pending[:size]
+        return data
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        # tarfile and zstandard close their file object when done; finish() ends the stream
+        pass
+
+    def finish(self) -> None:
+        if self._pending:
+            self._put(bytes(self._pending))
+            self._pending.clear()
+        self._put(b"")
+
+    def _put(self, chunk: bytes) -> None:
+        asyncio.run_coroutine_threadsafe(self.queue.put(chunk), self.loop).result()
+
+
+async def stream_tar(root: str, compression: str = "none") -> AsyncIterator[bytes]:
+    """
+    Yield a tar archive of ``root`` as it is built.
+
+    Members are relative to ``root``; symlinks are stored as links, not
+    followed. If the consumer stops early the worker thread is stopped too.
+    """
+
+    pipe = _ThreadPipe(asyncio.get_running_loop())
+
+    def build() -> None:
+        try:
+            if compression == "zstd":
+                writer = zstandard.ZstdCompressor(level=3).stream_writer(pipe)
+            else:
+                writer = pipe
+            mode = "w|gz" if compression == "gzip" else "w|"
+            with tarfile.open(fileobj=writer, mode=mode, format=tarfile.GNU_FORMAT) as tar:
+                for name in sorted(os.listdir(root)):
+                    tar.add(os.path.join(root, name), arcname=name)
+            if writer is not pipe:
+                writer.flush(zstandard.FLUSH_FRAME)
+        finally:
+            if not pipe.closed:
+                pipe.finish()
+
+    worker = asyncio.ensure_future(asyncio.to_thread(build))
+    try:
+        while True:
+            getter = asyncio.ensure_future(pipe.queue.get())
+            await asyncio.wait({getter, worker}, return_when=asyncio.FIRST_COMPLETED)
+            if not getter.done():
+                # The worker failed before ending the stream
+                getter.cancel()
+                worker.result()
+                return
+            chunk = getter.result()
+            if not chunk:
+                break
+            yield chunk
+        await worker
+    finally:
+        if not worker.done():
+            # Unblock the worker so it sees the pipe is closed and stops
+            pipe.closed = True
+            while not worker.done():
+                while not pipe.queue.empty():
+                    pipe.queue.get_nowait()
+                await asyncio.wait({worker}, timeout=0.05)
+            # Expected to be the BrokenPipeError from the closed pipe
+            worker.exception()
+
+
+async def extract_tar(chunks: AsyncIterable[bytes], destination: str) -> Dict:
+    """
+    Extract a tar stream (plain, gzip, bzip2, xz or zstd) under ``destination``.
+
+    Every member must land inside ``destination`` once symlinks are
+    resolved, and links must point inside it too; device files and
+    members under a link or a file are skipped, and set-id bits dropped.
+    Returns counts of what was written.
+    """
+
+    loop = asyncio.get_running_loop()
+    pipe = _ThreadPipe(loop)
+    root = os.path.realpath(destination)
+    os.makedirs(root, exist_ok=True)
+    stats = {"files": 0, "directories": 0, "links": 0, "skipped": 0, "bytes": 0}
+    first = bytearray()
+
+    def extract() -> None:
+        source = pipe
+        if bytes(first[:4]) == ZSTD_MAGIC:
+            if zstandard is None:
+                raise ValueError("zstd archives are not supported in this sandbox")
+            source = zstandard.ZstdDecompressor().stream_reader(pipe)
+        with tarfile.open(fileobj=source, mode="r|*") as tar:
+            for member in tar:
+                if not _safe_member(root, member):
+                    stats["skipped"] += 1
+                    continue
+                # Files belong to the sandbox user, without set-id bits
+                member.mode &= 0o777
+                member.uid, member.gid = os.getuid(), os.getgid()
+                tar.extract(member, root, numeric_owner=True, **TRUSTED)
+                if member.isdir():
+                    stats["directories"] += 1
+                elif member.issym() or member.islnk():
+                    stats["links"] += 1
+                else:
+                    stats["files"] += 1
+                    stats["bytes"] += member.size
+
+    async def feed(chunk: bytes) -> bool:
+        putter = asyncio.ensure_future(pipe.queue.put(chunk))
+        await asyncio.wait({putter, worker}, return_when=asyncio.FIRST_COMPLETED)
+        if not putter.done():
+            # The worker stopped reading: a bad archive, or it is finished
+            putter.cancel()
+            return False
+        return True
+
+    worker = None
+    try:
+        async for chunk in chunks:
+            if worker is None:
+                # Sniff the compression from the first bytes before starting
+                first += chunk
+                if len(first) < len(ZSTD_MAGIC):
+                    continue
+                chunk = bytes(first)
+                worker = asyncio.ensure_future(asyncio.to_thread(extract))
+            if chunk and not await feed(chunk):
+                break
+        if worker is None:
+            if not first:
+                raise ValueError("Empty archive")
+            worker = asyncio.ensure_future(asyncio.to_thread(extract))
+            await feed(bytes(first))
+        await feed(b"")
+        await worker
+    except BaseException:
+        if worker is not None and not worker.done():
+            # Let the worker run to the end of what it has, then fail on EOF
+            while not worker.done():
+                await feed(b"")
+            worker.exception()
+        raise
+    return stats
+
+
+def _safe_member(root: str, member: tarfile.TarInfo) -> bool:
+    """Whether a member can be extracted without escaping ``root``."""
+    if not (member.isfile() or member.isdir() or member.issym() or member.islnk()):
+        return False
+    target = os.path.realpath(os.path.join(root, member.name))
+    if not _inside(root, target):
+        return False
+    # tarfile creates missing parents itself; a link or file in the way
+    # would make it fail part way, or write through the link
+    parent = root
+    for part in os.path.normpath(member.name).split(os.sep)[:-1]:
+        parent = os.path.join(parent, part)
+        if os.path.islink(parent) or (os.path.lexists(parent) and not os.path.isdir(parent)):
+            return False
+    if member.issym():
+        link = os.path.realpath(os.path.join(os.path.dirname(target), member.linkname))
+        return _inside(root, link)
+    if member.islnk():
+        return _inside(root, os.path.realpath(os.path.join(root, member.linkname)))
+    return True
+
+
+def _inside(root: str, path: str) -> bool:
+    return path == root or path.startswith(root + os.sep)
@@ -0,0 +1,209 @@
+import asyncio
+import logging
+import time
+from typing import Callable, Dict, List, Optional
+
+from services import CDP_PORT, NOVNC_PORT, VNC_PORT, Service, ServiceSupervisor
+
+logger = logging.getLogger(__name__)
+
+# Public port -> internal port of the service behind it
+PROXIED_PORTS = {5900: VNC_PORT, 6080: NOVNC_PORT, 9222: CDP_PORT}
+
+
+class BrowserStack:
+    """
+    Xvfb, VNC and Chrome, started on first use and stopped when idle.
+
+    Most sessions never open the browser, so nothing runs until a client
+    connects to one of the public ports or ``ensure_started`` is called.
+    Connections are piped to the stack's internal ports and count as
+    activity; after ``idle_timeout`` seconds with no open connection and
+    no ``touch`` the stack is stopped, and the next use starts it again.
+    """
+
+    def __init__(
+        self,
+        services: Callable[[], List[Service]],
+        idle_timeout: float = 300.0,
+        ready_timeout: float = 60.0
+    ):
+        self.services = services
+        self.idle_timeout = idle_timeout
+        self.ready_timeout = ready_timeout
+
+        # stopped, starting, running, stopping or failed
+        self.state = "stopped"
+        self.error: Optional[str] = None
+        self.supervisor: Optional[ServiceSupervisor] = None
+        self.connections: Dict[int, int] = {port: 0 for port in PROXIED_PORTS}
+        self.last_used = time.monotonic()
+        self.started_at: Optional[float] = None
+        self.stats = {"starts": 0, "start_failures": 0, "idle_stops": 0, "last_start_seconds": None}
+
+        self._lock = asyncio.Lock()
+        self._servers: List[asyncio.AbstractServer] = []
+        self._idle_task: Optional[asyncio.Task] = None
+
+    async def listen(self, host: str = "0.0.0.0") -> None:
+        """Accept connections on the public ports."""
+        for public_port in PROXIED_PORTS:
+            server = await asyncio.start_server(
+                lambda reader, writer, port=public_port: self._proxy(reader, writer, port),
+                host,
+                public_port
+            )
+            self._servers.append(server)
+
+    async def close(self) -> None:
+        for server in self._servers:
+            server.close()
+        self._servers = []
+        if self._idle_task is not None:
+            self._idle_task.cancel()
+            self._idle_task = None
+        async with self._lock:
+            await self._stop()
+
+    def touch(self) -> None:
+        self.last_used = time.monotonic()
+
+    async def ensure_started(self) -> bool:
+        """Start the stack unless it is running; concurrent callers share one start."""
+
+        self.touch()
+        if self.state == "running":
+            return True
+        async with self._lock:
+            if self.state != "running":
+                await self._start()
+            return self.state == "running"
+
+    async def stop(self) -> None:
+        async with self._lock:
+            await self._stop()
+
+    def status(self) -> Dict:
+        status = {
+            "state": self.state,
+            "error": self.error,
+            "connections": dict(self.connections),
+            "idle_seconds": round(time.monotonic() - self.last_used, 1),
+            "idle_timeout": self.idle_timeout,
+            "uptime_seconds": (
+                round(time.monotonic() - self.started_at, 1)
+                if self.state == "running" and self.started_at else None
+            ),
+            **self.stats
+        }
+        if self.supervisor is not None:
+            status["services"] = self.supervisor.status()["services"]
+        return status
+
+    async def _start(self) -> None:
+        self.state = "starting"
+        self.error = None
+        started = time.monotonic()
+        self.supervisor = ServiceSupervisor(self.services())
+        self.supervisor.start()
+
+        if await self.supervisor.wait_ready(self.ready_timeout):
+            self.state = "running"
+            self.started_at = time.monotonic()
+            self.stats["starts"] += 1
+            self.stats["last_start_seconds"] = round(self.started_at - started, 3)
+            logger.info(f"Browser stack started in {self.started_at - started:.2f}s")
+            if self._idle_task is None:
+                self._idle_task = asyncio.create_task(self._stop_when_idle())
+            return
+
+        self.stats["start_failures"] += 1
+        failed = {
+            name: service["error"]
+            for name, service in self.supervisor.status()["services"].items()
+            if service["state"] == "failed"
+        }
+        self.error = f"services failed: {failed}" if failed else f"not ready after {self.ready_timeout:.0f}s"
+        # Do not leave half a stack holding ports and memory
+        await self.supervisor.stop()
+        self.state = "failed"
+
+    async def _stop(self) -> None:
+        if self.supervisor is None or self.state in ("stopped", "failed"):
+            return
+        self.state = "stopping"
+        await self.supervisor.stop()
+        self.state = "stopped"
+        self.started_at = None
+        logger.info("Browser stack stopped")
+
+    def _idle(self) -> bool:
+        return (
+            not any(self.connections.values())
+            and time.monotonic() - self.last_used >= self.idle_timeout
+        )
+
+    async def _stop_when_idle(self) -> None:
+        try:
+            while self.state == "running":
+                # Open connections keep the stack up; closing one touches it
+                delay = self.idle_timeout if any(self.connections.values()) else \
+                    self.last_used + self.idle_timeout - time.monotonic()
+                await asyncio.sleep(max(1.0, delay))
+                if self.state != "running" or not self._idle():
+                    continue
+                async with self._lock:
+                    # A client may have connected while we waited for the lock
+                    if self.state == "running" and self._idle():
+                        self.stats["idle_stops"] += 1
+                        await self._stop()
+        finally:
+            self._idle_task = None
+
+    async def _proxy(
+        self,
+        client_reader: asyncio.StreamReader,
+        client_writer: asyncio.StreamWriter,
+        public_port: int
+    ) -> None:
+        self.connections[public_port] += 1
+        try:
+            if not await self.ensure_started():
+                return
+            try:
+                upstream_reader, upstream_writer = await asyncio.open_connection(
+                    "127.0.0.1", PROXIED_PORTS[public_port]
+                )
+            except OSError as e:
+                logger.error(f"Browser stack port {PROXIED_PORTS[public_port]} refused: {e}")
+                return
+            try:
+                await asyncio.gather(
+                    self._pipe(client_reader, upstream_writer),
+                    self._pipe(upstream_reader, client_writer)
+                )
+            finally:
+                upstream_writer.close()
+        finally:
+            self.connections[public_port] -= 1
+            self.touch()
+            client_writer.close()
+
+    @staticmethod
+    async def _pipe(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                writer.write(data)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            # Half-close so the other direction can finish
+            if writer.can_write_eof():
+                try:
+                    writer.write_eof()
+                except OSError:
+                    pass
@@ -0,0 +1,193 @@
+import asyncio
+import hashlib
+import os
+import re
+import uuid
+from collections import OrderedDict
+from typing import AsyncIterable, AsyncIterator, Dict, List, Optional, Tuple
+
+CHUNK_SIZE = 1024 * 1024
+# Most bytes of text a line read returns; the rest is reported as truncated
+MAX_LINES_BYTES = 1024 * 1024
+
+_RANGE = re.compile(r"bytes=(\d*)-(\d*)$")
+# (path, size, mtime_ns) -> sha256, so unchanged files are hashed once
+_hashes: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+MAX_CACHED_HASHES = 4096
+
+
+def etag(stat: os.stat_result) -> str:
+    """A validator that changes whenever the file's size or modification time does."""
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    The byte range (start, end exclusive) requested by a Range header.
+
+    Only single ranges are supported. Raises ValueError for a range
+    that cannot be satisfied.
+    """
+
+    match = _RANGE.match(header.strip())
+    if not match:
+        raise ValueError(f"Unsupported range: {header}")
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last) + 1, size) if last else size
+    elif last:
+        # A suffix range: the last N bytes
+        start, end = max(size - int(last), 0), size
+    else:
+        raise ValueError(f"Unsupported range: {header}")
+    if start >= size or start >= end:
+        raise ValueError(f"Range not satisfiable for {size} bytes: {header}")
+    return start, end
+
+
+async def iter_file(path: str, start: int, end: int) -> AsyncIterator[bytes]:
+    """Yield bytes [start, end) of a file in chunks read off the event loop."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        offset = start
+        while offset < end:
+            data = await asyncio.to_thread(os.pread, fd, min(CHUNK_SIZE, end - offset), offset)
+            if not data:
+                return
+            offset += len(data)
+            yield data
+    finally:
+        os.close(fd)
+
+
+async def write_stream(path: str, chunks: AsyncIterable[bytes]) -> Tuple[int, str]:
+    """
+    Write a stream to ``path`` atomically; return its size and SHA-256.
+
+    Chunks are batched into large writes in a worker thread and land in
+    a temporary file beside the target, which replaces it at the end.
+    """
+
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    temp = os.path.join(directory, f".{os.path.basename(path)}.upload-{uuid.uuid4().hex[:8]}")
+    digest = hashlib.sha256()
+    size = 0
+    pending = bytearray()
+
+    def flush(f, data: bytes) -> None:
+        f.write(data)
+        digest.update(data)
+
+    try:
+        with open(temp, "wb") as f:
+            async for chunk in chunks:
+                pending += chunk
+                if len(pending) >= CHUNK_SIZE:
+                    size += len(pending)
+                    await asyncio.to_thread(flush, f, bytes(pending))
+                    pending.clear()
+            size += len(pending)
+            await asyncio.to_thread(flush, f, bytes(pending))
+        os.replace(temp, path)
+    except BaseException:
+        try:
+            os.remove(temp)
+        except FileNotFoundError:
+            pass
+        raise
+
+    _remember_hash(path, digest.hexdigest())
+    return size, digest.hexdigest()
+
+
+def file_hash(path: str) -> str:
+    """SHA-256 of a file, reusing the last result while its size and mtime are unchanged."""
+    stat = os.stat(path)
+    key = (path, stat.st_size, stat.st_mtime_ns)
+    cached = _hashes.get(key)
+    if cached is not None:
+        _hashes.move_to_end(key)
+        return cached
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            data = f.read(CHUNK_SIZE)
+            if not data:
+                break
+            digest.update(data)
+    _remember_hash(path, digest.hexdigest(), stat)
+    return digest.hexdigest()
+
+
+def _remember_hash(path: str, sha256: str, stat: os.stat_result = None) -> None:
+    stat = stat or os.stat(path)
+    _hashes[(path, stat.st_size, stat.st_mtime_ns)] = sha256
+    while len(_hashes) > MAX_CACHED_HASHES:
+        _hashes.popitem(last=False)
+
+
+def read_lines(
+    path: str,
+    head: Optional[int] = None,
+    tail: Optional[int] = None,
+    start: Optional[int] = None,
+    end: Optional[int] = None
+) -> Dict:
+    """
+    Lines of a text file without reading all of it: the first ``head``,
+    the last ``tail``, or ``start`` to ``end`` (1-based, inclusive).
+    """
+
+    if tail is not None:
+        lines, first, complete = _tail(path, tail)
+        return _lines_result(lines, first, complete)
+
+    first = max(start or 1, 1)
+    last = head if head is not None else end
+    lines: List[bytes] = []
+    used = 0
+    with open(path, "rb") as f:
+        for number, line in enumerate(f, 1):
+            if number < first:
+                continue
+            if last is not None and number > last:
+                break
+            used += len(line)
+            if used > MAX_LINES_BYTES:
+                return _lines_result(lines, first, complete=False)
+            lines.append(line)
+    return _lines_result(lines, first, complete=True)
+
+
+def _tail(path: str, count: int) -> Tuple[List[bytes], Optional[int], bool]:
+    """The last ``count`` lines read backwards from the end, their first line number if known, and whether all fit."""
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        data = b""
+        # One extra newline marks the start of the first wanted line
+        while position > 0 and data.count(b"\n") <= count and len(data) < MAX_LINES_BYTES:
+            step = min(CHUNK_SIZE, position)
+            position -= step
+            f.seek(position)
+            data = f.read(step) + data
+    complete = position == 0 or data.count(b"\n") > count
+    lines = data.splitlines(keepends=True)
+    if position > 0 and lines:
+        # The first line is partial unless we reached the start of the file
+        lines = lines[1:]
+    # Line numbers are only known when the whole file was read
+    first = 1 + max(len(lines) - count, 0) if position == 0 else None
+    return (lines[-count:] if count else []), first, complete
+
+
+def _lines_result(lines: List[bytes], first: Optional[int], complete: bool) -> Dict:
+    return {
+        "lines": [line.decode("utf-8", errors="replace").rstrip("\r\n") for line in lines],
+        "start_line": first,
+        "count": len(lines),
+        "truncated": not complete
+    }
@@ -1,12 +1,25 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
-from typing import Dict, Any, Optional
-import subprocess
+from typing import Dict, Any, List, Optional, Tuple
+import asyncio
+import base64
+import binascii
 import os
 import json
 import logging
+import re
+import tarfile
+
+from archive import MEDIA_TYPES, compressions, extract_tar, stream_tar
+from browser import BrowserStack
+from files import etag, file_hash, iter_file, parse_range, read_lines, write_stream
+from process import spawn, stream_output
+from pty_sessions import ShellSessions
+from services import default_services
+from workspace_index import DEFAULT_IGNORE, WorkspaceIndex
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -27,23 +40,149 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Warm containers are started without a session and bound to one later
+SESSION_FILE = "/tmp/sandbox_session_id"
+
+def current_session_id() -> str:
+    """Return the bound session ID, falling back to the SESSION_ID variable."""
+    try:
+        with open(SESSION_FILE) as f:
+            return f.read().strip() or "unknown"
+    except FileNotFoundError:
+        return os.environ.get("SESSION_ID", "unknown")
+
 class CommandRequest(BaseModel):
     command: str
     cwd: Optional[str] = None
     timeout: Optional[int] = 30
 
+class ExecRequest(BaseModel):
+    command: str
+    cwd: Optional[str] = None
+    timeout: Optional[float] = 300
+    stdin: Optional[str] = None
+
+class ShellCreateRequest(BaseModel):
+    cwd: Optional[str] = None
+    env: Optional[Dict[str, str]] = None
+    cols: Optional[int] = 120
+    rows: Optional[int] = 40
+
+class ShellRunRequest(BaseModel):
+    command: str
+    timeout: Optional[float] = 300
+
+class ShellWriteRequest(BaseModel):
+    data: str
+
+class ShellResizeRequest(BaseModel):
+    cols: int
+    rows: int
+
 class FileRequest(BaseModel):
     path: str
     content: Optional[str] = None
     recursive: Optional[bool] = False
+    # "utf-8", or "base64" for binary content
+    encoding: Optional[str] = "utf-8"
+
+class BatchReadRequest(BaseModel):
+    paths: List[str]
+    encoding: Optional[str] = "utf-8"
+
+class BatchWriteRequest(BaseModel):
+    files: List[FileRequest]
+
+WORKSPACE = "/workspace"
+# Largest file /api/files/read returns inline; use /api/files/raw or /api/files/lines beyond it
+MAX_INLINE_READ_BYTES = 8 * 1024 * 1024
+# Files per batch read or write; whole trees go through /api/files/archive
+MAX_BATCH_FILES = 1000
+
+def _safe_path(path: str) -> str:
+    """Resolve ``path``, following symlinks, and refuse anything outside the workspace."""
+    abs_path = os.path.realpath(path)
+    if abs_path != WORKSPACE and not abs_path.startswith(WORKSPACE + os.sep):
+        raise HTTPException(status_code=403, detail="Access denied")
+    return abs_path
+
+def _regular_file(path: str) -> str:
+    abs_path = _safe_path(path)
+    if not os.path.exists(abs_path):
+        raise HTTPException(status_code=404, detail="File not found")
+    if not os.path.isfile(abs_path):
+        raise HTTPException(status_code=400, detail="Path is not a file")
+    return abs_path
 
 @app.get("/")
 async def root():
-    return {"message": "Sandbox API is running", "session_id": os.environ.get("SESSION_ID", "unknown")}
+    return {"message": "Sandbox API is running", "session_id": current_session_id()}
+
+# Seconds without a browser or VNC client before the browser stack is stopped
+BROWSER_IDLE_SECONDS = float(os.environ.get("BROWSER_IDLE_SECONDS", "300"))
+
+# Persistent shells: how many at once, when an unused one is closed, and scrollback per shell
+SHELL_MAX_SESSIONS = int(os.environ.get("SHELL_MAX_SESSIONS", "8"))
+SHELL_IDLE_SECONDS = float(os.environ.get("SHELL_IDLE_SECONDS", "3600"))
+SHELL_SCROLLBACK_BYTES = int(os.environ.get("SHELL_SCROLLBACK_BYTES", str(256 * 1024)))
+
+# In-memory index of /workspace for listing, glob and search; contents are
+# trigram-indexed up to WORKSPACE_INDEX_CONTENT_BYTES in total
+WORKSPACE_INDEX = os.environ.get("WORKSPACE_INDEX", "true").lower() == "true"
+WORKSPACE_INDEX_CONTENT = os.environ.get("WORKSPACE_INDEX_CONTENT", "true").lower() == "true"
+WORKSPACE_INDEX_CONTENT_BYTES = int(os.environ.get("WORKSPACE_INDEX_CONTENT_BYTES", str(128 * 1024 * 1024)))
+WORKSPACE_INDEX_IGNORE = [
+    name for name in os.environ.get("WORKSPACE_INDEX_IGNORE", ",".join(DEFAULT_IGNORE)).split(",") if name
+]
+# Idle change feeds send a ping this often, so readers can tell a quiet workspace from a dead connection
+CHANGE_FEED_PING_SECONDS = float(os.environ.get("CHANGE_FEED_PING_SECONDS", "15"))
+
+@app.on_event("startup")
+async def start_services():
+    # The desktop and browser start on first use, not with the container
+    app.state.browser = BrowserStack(default_services, idle_timeout=BROWSER_IDLE_SECONDS)
+    await app.state.browser.listen()
+    app.state.shells = ShellSessions(
+        max_sessions=SHELL_MAX_SESSIONS,
+        idle_timeout=SHELL_IDLE_SECONDS,
+        scrollback=SHELL_SCROLLBACK_BYTES
+    )
+    app.state.shells.start()
+    app.state.workspace_index = None
+    if WORKSPACE_INDEX and os.path.isdir(WORKSPACE):
+        app.state.workspace_index = WorkspaceIndex(
+            WORKSPACE,
+            ignore=WORKSPACE_INDEX_IGNORE,
+            content=WORKSPACE_INDEX_CONTENT,
+            content_budget=WORKSPACE_INDEX_CONTENT_BYTES
+        )
+        await app.state.workspace_index.start()
+
+@app.on_event("shutdown")
+async def stop_services():
+    if app.state.workspace_index is not None:
+        await app.state.workspace_index.close()
+    await app.state.shells.close_all()
+    await app.state.browser.close()
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "session_id": os.environ.get("SESSION_ID", "unknown")}
+    """Report the API ready; the browser stack starts on demand and does not gate health."""
+    return {
+        "status": "healthy",
+        "session_id": current_session_id(),
+        "ready": True,
+        "browser": app.state.browser.state
+    }
+
+# VNC server and its WebSocket bridge
+VNC_PORTS = {5900, 6080}
+
+@app.get("/api/activity")
+async def activity():
+    """Report VNC clients, so the backend does not pause a sandbox someone is watching."""
+    connections = app.state.browser.connections
+    return {"vnc_connections": sum(connections[port] for port in VNC_PORTS)}
 
 @app.post("/api/terminal/command")
 async def execute_command(request: CommandRequest):
@@ -55,40 +194,172 @@ async def execute_command(request: CommandRequest):
         # Ensure working directory exists
         os.makedirs(cwd, exist_ok=True)
         
-        # Execute command
-        result = subprocess.run(
-            request.command,
-            shell=True,
-            capture_output=True,
-            text=True,
-            cwd=cwd,
-            timeout=request.timeout
-        )
+        # Execute command without blocking the event loop
+        process = await spawn(request.command, cwd)
+        output = {"stdout": [], "stderr": []}
+        async for event in stream_output(process, request.timeout):
+            if event["type"] == "exit":
+                result = event
+            else:
+                output[event["type"]].append(event["data"])
+        
+        if result["timed_out"]:
+            raise HTTPException(status_code=408, detail="Command timed out")
         
         return {
             "success": True,
             "command": request.command,
             "cwd": cwd,
-            "exit_code": result.returncode,
-            "stdout": result.stdout,
-            "stderr": result.stderr
+            "exit_code": result["exit_code"],
+            "stdout": "".join(output["stdout"]),
+            "stderr": "".join(output["stderr"])
         }
         
-    except subprocess.TimeoutExpired:
-        raise HTTPException(status_code=408, detail="Command timed out")
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Command execution failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/terminal/exec")
+async def exec_command(request: ExecRequest):
+    """Run a command, streaming its output as NDJSON events until it exits or times out."""
+    cwd = request.cwd or "/workspace"
+    try:
+        os.makedirs(cwd, exist_ok=True)
+        process = await spawn(request.command, cwd, stdin=request.stdin is not None)
+    except Exception as e:
+        logger.error(f"Command execution failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    async def events():
+        async for event in stream_output(process, request.timeout, request.stdin):
+            yield json.dumps(event) + "\n"
+    
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+def get_shell(shell_id: str):
+    shell = app.state.shells.get(shell_id)
+    if shell is None:
+        raise HTTPException(status_code=404, detail="Shell session not found")
+    return shell
+
+@app.post("/api/shell/sessions")
+async def create_shell(request: ShellCreateRequest):
+    """Start a persistent shell; cd, exports and activated environments carry over between commands."""
+    cwd = request.cwd or "/workspace"
+    os.makedirs(cwd, exist_ok=True)
+    try:
+        shell = await app.state.shells.create(cwd=cwd, env=request.env, cols=request.cols, rows=request.rows)
+    except OverflowError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except Exception as e:
+        logger.error(f"Shell start failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"success": True, **shell.status()}
+
+@app.get("/api/shell/sessions")
+async def list_shells():
+    return {"success": True, "sessions": app.state.shells.list()}
+
+@app.post("/api/shell/sessions/{shell_id}/run")
+async def run_in_shell(shell_id: str, request: ShellRunRequest):
+    """Run a command and wait for its prompt; ``done`` is false if it is still running at the timeout."""
+    shell = get_shell(shell_id)
+    try:
+        result = await shell.run(request.command, request.timeout)
+    except BufferError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"success": True, **result}
+
+@app.post("/api/shell/sessions/{shell_id}/write")
+async def write_to_shell(shell_id: str, request: ShellWriteRequest):
+    """Send raw input, e.g. an answer to a prompt or "\\x03" to interrupt."""
+    shell = get_shell(shell_id)
+    try:
+        shell.write(request.data.encode())
+    except BufferError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"success": True, "offset": shell.end}
+
+@app.get("/api/shell/sessions/{shell_id}/read")
+async def read_from_shell(shell_id: str, offset: int = 0, wait: float = 0):
+    """Output since ``offset``; with ``wait``, hold the reply up to that many seconds for new output."""
+    shell = get_shell(shell_id)
+    if wait > 0:
+        await shell.wait_output(offset, min(wait, 30))
+    data, end, truncated = shell.read(offset)
+    return {
+        "success": True,
+        "data": data.decode("utf-8", errors="replace"),
+        "offset": end,
+        "truncated": truncated,
+        "alive": shell.alive
+    }
+
+@app.post("/api/shell/sessions/{shell_id}/resize")
+async def resize_shell(shell_id: str, request: ShellResizeRequest):
+    shell = get_shell(shell_id)
+    shell.resize(request.cols, request.rows)
+    return {"success": True, **shell.status()}
+
+@app.delete("/api/shell/sessions/{shell_id}")
+async def close_shell(shell_id: str):
+    if not await app.state.shells.close(shell_id):
+        raise HTTPException(status_code=404, detail="Shell session not found")
+    return {"success": True}
+
+@app.websocket("/api/shell/sessions/{shell_id}/attach")
+async def attach_shell(websocket: WebSocket, shell_id: str, offset: int = 0):
+    """Interactive terminal: scrollback from ``offset``, then live output; text frames are typed input."""
+    shell = app.state.shells.get(shell_id)
+    await websocket.accept()
+    if shell is None:
+        await websocket.close(code=4404)
+        return
+    
+    async def send_output():
+        position = offset
+        while shell.alive:
+            await shell.wait_output(position, 30)
+            data, position, _ = shell.read(position)
+            if data:
+                await websocket.send_bytes(data)
+        await websocket.close()
+    
+    sender = asyncio.create_task(send_output())
+    try:
+        while True:
+            shell.write((await websocket.receive_text()).encode())
+    except (WebSocketDisconnect, BufferError):
+        pass
+    finally:
+        sender.cancel()
+
+def _workspace_index(abs_path: str) -> Optional[WorkspaceIndex]:
+    """The workspace index, if it is built and holds everything under ``abs_path``."""
+    index = app.state.workspace_index
+    if index is not None and index.ready and index.covers(abs_path):
+        return index
+    return None
+
+def _index_entry(path: str, entry) -> Dict[str, Any]:
+    size, mtime, is_dir = entry
+    return {"path": path, "size": size, "mtime": mtime, "is_dir": is_dir}
+
 @app.get("/api/files/list")
-async def list_files(path: str = "/workspace", recursive: bool = False):
-    """List files in a directory."""
+async def list_files(
+    path: str = "/workspace",
+    recursive: bool = False,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None
+):
+    """
+    List files in a directory, from the workspace index when it covers the path.
+    With ``limit``, returns a page and a ``next_cursor`` to pass back for the next.
+    """
     try:
-        abs_path = os.path.abspath(path)
-        
-        # Security check: ensure path is within workspace
-        if not abs_path.startswith("/workspace"):
-            raise HTTPException(status_code=403, detail="Access denied")
+        abs_path = _safe_path(path)
         
         if not os.path.exists(abs_path):
             raise HTTPException(status_code=404, detail="Path not found")
@@ -98,8 +369,15 @@ async def list_files(path: str = "/workspace", recursive: bool = False):
         
         files = []
         directories = []
-        
-        if recursive:
+        next_cursor = None
+        index = _workspace_index(abs_path)
+        
+        if index is not None:
+            page, next_cursor = index.list(abs_path, recursive=recursive, cursor=cursor, limit=limit)
+            skip = len(abs_path) + 1
+            for item_path, (_, _, is_dir) in page:
+                (directories if is_dir else files).append(item_path[skip:])
+        elif recursive:
             for root, dirs, filenames in os.walk(abs_path):
                 rel_root = os.path.relpath(root, abs_path)
                 if rel_root == ".":
@@ -118,13 +396,25 @@ async def list_files(path: str = "/workspace", recursive: bool = False):
                 elif os.path.isdir(item_path):
                     directories.append(item)
         
+        if index is None and (cursor or limit is not None):
+            # Same paging as the index: by path, across files and directories
+            items = sorted([(name, False) for name in files] + [(name, True) for name in directories])
+            if cursor:
+                items = [item for item in items if os.path.join(abs_path, item[0]) > cursor]
+            if limit is not None and len(items) > limit:
+                items = items[:limit]
+                next_cursor = os.path.join(abs_path, items[-1][0])
+            files = [name for name, is_dir in items if not is_dir]
+            directories = [name for name, is_dir in items if is_dir]
+        
         return {
             "success": True,
             "path": abs_path,
             "files": sorted(files),
             "directories": sorted(directories),
             "total_files": len(files),
-            "total_directories": len(directories)
+            "total_directories": len(directories),
+            "next_cursor": next_cursor
         }
         
     except HTTPException:
@@ -133,31 +423,104 @@ async def list_files(path: str = "/workspace", recursive: bool = False):
         logger.error(f"List files failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/files/index")
+async def workspace_index_status():
+    """State of the workspace index: entries, watches and content indexing progress."""
+    index = app.state.workspace_index
+    if index is None:
+        return {"state": "disabled"}
+    return index.status()
+
+@app.get("/api/files/changes")
+async def watch_changes(path: str = "/workspace"):
+    """
+    Stream changes under a path as NDJSON, one line per debounced batch:
+    {"type": "changes", "seq", "events": [{"type": "created" | "modified" | "deleted" | "reset", "path", ...}]}.
+    The first line is {"type": "hello", "seq"}; a seq that moved on since a
+    reader last saw it means it missed changes. Idle feeds send {"type": "ping"}.
+    """
+    abs_path = _safe_path(path)
+    index = app.state.workspace_index
+    if index is None:
+        raise HTTPException(status_code=404, detail="Workspace index is disabled")
+    queue = index.subscribe()
+    prefix = abs_path.rstrip("/") + "/"
+    
+    async def events():
+        try:
+            yield json.dumps({"type": "hello", "seq": index.seq, "path": abs_path}) + "\n"
+            while True:
+                try:
+                    batch = await asyncio.wait_for(queue.get(), CHANGE_FEED_PING_SECONDS)
+                except asyncio.TimeoutError:
+                    yield json.dumps({"type": "ping"}) + "\n"
+                    continue
+                changes = [
+                    event for event in batch["events"]
+                    if event["type"] == "reset" or event["path"].startswith(prefix)
+                ]
+                if changes:
+                    yield json.dumps({"type": "changes", "seq": batch["seq"], "events": changes}) + "\n"
+        finally:
+            index.unsubscribe(queue)
+    
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+def _indexed_path(path: str) -> Tuple[str, WorkspaceIndex]:
+    abs_path = _safe_path(path)
+    index = app.state.workspace_index
+    if index is None:
+        raise HTTPException(status_code=404, detail="Workspace index is disabled")
+    if not index.ready:
+        raise HTTPException(status_code=503, detail="Workspace index is still being built", headers={"Retry-After": "1"})
+    if not index.covers(abs_path):
+        raise HTTPException(status_code=400, detail=f"Path is not indexed; ignored directories: {sorted(index.ignore)}")
+    return abs_path, index
+
+@app.get("/api/files/glob")
+async def glob_files(pattern: str, path: str = "/workspace", cursor: Optional[str] = None, limit: int = 1000):
+    """
+    Paths matching a glob such as ``*.py`` (any depth) or ``src/**/test_*.py``,
+    a page at a time.
+    """
+    abs_path, index = _indexed_path(path)
+    matches, next_cursor = index.glob(pattern, abs_path, cursor=cursor, limit=min(limit, 10000))
+    return {
+        "success": True,
+        "path": abs_path,
+        "matches": [_index_entry(item_path, entry) for item_path, entry in matches],
+        "next_cursor": next_cursor
+    }
+
+@app.get("/api/files/search")
+async def search_files(
+    pattern: str,
+    path: str = "/workspace",
+    glob: Optional[str] = None,
+    ignore_case: bool = False,
+    limit: int = 200,
+    max_per_file: int = 20
+):
+    """Lines matching a regex in text files, narrowed by the trigram index."""
+    abs_path, index = _indexed_path(path)
+    try:
+        result = await index.search(
+            pattern,
+            abs_path,
+            glob=glob,
+            ignore_case=ignore_case,
+            limit=min(limit, 5000),
+            max_per_file=max_per_file
+        )
+    except re.error as e:
+        raise HTTPException(status_code=400, detail=f"Invalid pattern: {e}")
+    return {"success": True, "path": abs_path, **result}
+
 @app.get("/api/files/read")
-async def read_file(path: str):
-    """Read a file."""
+async def read_file(path: str, encoding: str = "utf-8"):
+    """Read a whole file inline, as UTF-8 text or base64; large files go through /api/files/raw."""
     try:
-        abs_path = os.path.abspath(path)
-        
-        # Security check: ensure path is within workspace
-        if not abs_path.startswith("/workspace"):
-            raise HTTPException(status_code=403, detail="Access denied")
-        
-        if not os.path.exists(abs_path):
-            raise HTTPException(status_code=404, detail="File not found")
-        
-        if not os.path.isfile(abs_path):
-            raise HTTPException(status_code=400, detail="Path is not a file")
-        
-        with open(abs_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        return {
-            "success": True,
-            "path": abs_path,
-            "content": content,
-            "size": len(content)
-        }
+        return await asyncio.to_thread(_read_content, path, encoding)
         
     except HTTPException:
         raise
@@ -169,26 +532,7 @@ async def read_file(path: str):
 async def write_file(request: FileRequest):
     """Write to a file."""
     try:
-        abs_path = os.path.abspath(request.path)
-        
-        # Security check: ensure path is within workspace
-        if not abs_path.startswith("/workspace"):
-            raise HTTPException(status_code=403, detail="Access denied")
-        
-        if not request.content:
-            raise HTTPException(status_code=400, detail="Content is required")
-        
-        # Create parent directories if they don't exist
-        os.makedirs(os.path.dirname(abs_path), exist_ok=True)
-        
-        with open(abs_path, 'w', encoding='utf-8') as f:
-            f.write(request.content)
-        
-        return {
-            "success": True,
-            "path": abs_path,
-            "size": len(request.content)
-        }
+        return await asyncio.to_thread(_write_content, request.path, request.content, request.encoding)
         
     except HTTPException:
         raise
@@ -196,15 +540,229 @@ async def write_file(request: FileRequest):
         logger.error(f"Write file failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def _read_content(path: str, encoding: str) -> Dict[str, Any]:
+    abs_path = _regular_file(path)
+    
+    stat = os.stat(abs_path)
+    if stat.st_size > MAX_INLINE_READ_BYTES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"File is {stat.st_size} bytes; use /api/files/raw or /api/files/lines"
+        )
+    
+    with open(abs_path, 'rb') as f:
+        data = f.read()
+    
+    if encoding == "base64":
+        content = base64.b64encode(data).decode()
+    else:
+        try:
+            content = data.decode("utf-8")
+        except UnicodeDecodeError:
+            raise HTTPException(status_code=415, detail="File is not UTF-8 text; use encoding=base64")
+    
+    return {
+        "success": True,
+        "path": abs_path,
+        "content": content,
+        "encoding": encoding,
+        "size": len(data),
+        "etag": etag(stat)
+    }
+
+def _write_content(path: str, content: Optional[str], encoding: str) -> Dict[str, Any]:
+    abs_path = _safe_path(path)
+    
+    if content is None:
+        raise HTTPException(status_code=400, detail="Content is required")
+    
+    if encoding == "base64":
+        try:
+            data = base64.b64decode(content, validate=True)
+        except binascii.Error:
+            raise HTTPException(status_code=400, detail="Content is not valid base64")
+    else:
+        data = content.encode("utf-8")
+    
+    # Create parent directories if they don't exist
+    os.makedirs(os.path.dirname(abs_path), exist_ok=True)
+    
+    with open(abs_path, 'wb') as f:
+        f.write(data)
+    
+    return {
+        "success": True,
+        "path": abs_path,
+        "size": len(data),
+        "etag": etag(os.stat(abs_path))
+    }
+
+def _batch(operation, items) -> Dict[str, Any]:
+    """Run a file operation per item; one failure does not stop the rest."""
+    results = []
+    for args in items:
+        try:
+            results.append(operation(*args))
+        except HTTPException as e:
+            results.append({"success": False, "path": args[0], "status": e.status_code, "error": e.detail})
+        except Exception as e:
+            results.append({"success": False, "path": args[0], "status": 500, "error": str(e)})
+    return {
+        "success": all(result["success"] for result in results),
+        "files": results
+    }
+
+@app.post("/api/files/batch/read")
+async def read_files(request: BatchReadRequest):
+    """Read many files in one round trip; each result says whether it succeeded."""
+    if len(request.paths) > MAX_BATCH_FILES:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_FILES} files per batch")
+    return await asyncio.to_thread(_batch, _read_content, [(path, request.encoding) for path in request.paths])
+
+@app.post("/api/files/batch/write")
+async def write_files(request: BatchWriteRequest):
+    """Write many files in one round trip; each result says whether it succeeded."""
+    if len(request.files) > MAX_BATCH_FILES:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_FILES} files per batch")
+    return await asyncio.to_thread(
+        _batch,
+        _write_content,
+        [(item.path, item.content, item.encoding) for item in request.files]
+    )
+
+@app.get("/api/files/archive")
+async def download_archive(path: str = WORKSPACE, compression: str = "none"):
+    """Stream a directory under /workspace as a tar archive, optionally gzip or zstd compressed."""
+    abs_path = _safe_path(path)
+    if not os.path.isdir(abs_path):
+        raise HTTPException(status_code=404, detail="Directory not found")
+    if compression not in compressions():
+        raise HTTPException(status_code=400, detail=f"Compression must be one of {compressions()}")
+    
+    suffix = {"none": "tar", "gzip": "tar.gz", "zstd": "tar.zst"}[compression]
+    name = os.path.basename(abs_path) or "workspace"
+    return StreamingResponse(
+        stream_tar(abs_path, compression),
+        media_type=MEDIA_TYPES[compression],
+        headers={"Content-Disposition": f'attachment; filename="{name}.{suffix}"'}
+    )
+
+@app.put("/api/files/archive")
+async def upload_archive(request: Request, path: str = WORKSPACE):
+    """
+    Extract a tar archive streamed in the request body under a directory
+    in /workspace. Plain, gzip, bzip2, xz and zstd archives are detected
+    from their content; members that would land outside the directory
+    are skipped.
+    """
+    abs_path = _safe_path(path)
+    try:
+        stats = await extract_tar(request.stream(), abs_path)
+    except (tarfile.TarError, ValueError, EOFError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid archive: {e}")
+    except Exception as e:
+        logger.error(f"Archive upload failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    return {"success": True, "path": abs_path, **stats}
+
+@app.get("/api/files/raw")
+async def read_raw(request: Request, path: str, offset: Optional[int] = None, length: Optional[int] = None):
+    """
+    Stream a file's bytes. A Range header, or ``offset`` and ``length``,
+    selects part of it; If-None-Match with the current ETag returns 304.
+    """
+    abs_path = _regular_file(path)
+    stat = os.stat(abs_path)
+    tag = etag(stat)
+    headers = {"ETag": tag, "Accept-Ranges": "bytes"}
+    
+    if request.headers.get("if-none-match") == tag:
+        return Response(status_code=304, headers=headers)
+    
+    byte_range = None
+    try:
+        if request.headers.get("range"):
+            byte_range = parse_range(request.headers["range"], stat.st_size)
+        elif offset is not None or length is not None:
+            start = offset or 0
+            end = stat.st_size if length is None else min(start + length, stat.st_size)
+            byte_range = parse_range(f"bytes={start}-{end - 1}", stat.st_size)
+    except ValueError as e:
+        raise HTTPException(status_code=416, detail=str(e), headers={"Content-Range": f"bytes */{stat.st_size}"})
+    
+    if byte_range is None:
+        # Whole file: the server may send it with sendfile
+        return FileResponse(abs_path, headers=headers, media_type="application/octet-stream")
+    
+    start, end = byte_range
+    return StreamingResponse(
+        iter_file(abs_path, start, end),
+        status_code=206,
+        media_type="application/octet-stream",
+        headers={
+            **headers,
+            "Content-Range": f"bytes {start}-{end - 1}/{stat.st_size}",
+            "Content-Length": str(end - start)
+        }
+    )
+
+@app.put("/api/files/raw")
+async def write_raw(request: Request, path: str):
+    """
+    Store the request body as a file, streamed to disk and replaced
+    atomically. With If-Match, the write only happens if the file still
+    has that ETag ("*" for any existing file).
+    """
+    abs_path = _safe_path(path)
+    expected = request.headers.get("if-match")
+    if expected is not None:
+        current = etag(os.stat(abs_path)) if os.path.isfile(abs_path) else None
+        if current is None or (expected != "*" and expected != current):
+            raise HTTPException(status_code=412, detail="File changed", headers={"ETag": current or ""})
+    
+    try:
+        size, sha256 = await write_stream(abs_path, request.stream())
+    except Exception as e:
+        logger.error(f"Upload failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    return {
+        "success": True,
+        "path": abs_path,
+        "size": size,
+        "sha256": sha256,
+        "etag": etag(os.stat(abs_path))
+    }
+
+@app.get("/api/files/lines")
+async def read_file_lines(
+    path: str,
+    head: Optional[int] = None,
+    tail: Optional[int] = None,
+    start: Optional[int] = None,
+    end: Optional[int] = None
+):
+    """Read the first ``head`` or last ``tail`` lines, or lines ``start``-``end``, of a text file."""
+    abs_path = _regular_file(path)
+    if head is None and tail is None and start is None:
+        raise HTTPException(status_code=400, detail="Give head, tail or start")
+    result = await asyncio.to_thread(read_lines, abs_path, head, tail, start, end)
+    return {"success": True, "path": abs_path, "etag": etag(os.stat(abs_path)), **result}
+
+@app.get("/api/files/hash")
+async def hash_file(path: str):
+    """SHA-256 and ETag of a file, to skip transferring content that has not changed."""
+    abs_path = _regular_file(path)
+    sha256 = await asyncio.to_thread(file_hash, abs_path)
+    stat = os.stat(abs_path)
+    return {"success": True, "path": abs_path, "size": stat.st_size, "sha256": sha256, "etag": etag(stat)}
+
 @app.delete("/api/files/delete")
 async def delete_file(path: str, recursive: bool = False):
     """Delete a file or directory."""
     try:
-        abs_path = os.path.abspath(path)
-        
-        # Security check: ensure path is within workspace
-        if not abs_path.startswith("/workspace"):
-            raise HTTPException(status_code=403, detail="Access denied")
+        abs_path = _safe_path(path)
         
         if not os.path.exists(abs_path):
             raise HTTPException(status_code=404, detail="File or directory not found")
@@ -242,11 +800,7 @@ async def delete_file(path: str, recursive: bool = False):
 async def create_directory(request: FileRequest):
     """Create a directory."""
     try:
-        abs_path = os.path.abspath(request.path)
-        
-        # Security check: ensure path is within workspace
-        if not abs_path.startswith("/workspace"):
-            raise HTTPException(status_code=403, detail="Access denied")
+        abs_path = _safe_path(request.path)
         
         os.makedirs(abs_path, exist_ok=True, mode=0o755)
         
@@ -266,11 +820,7 @@ async def create_directory(request: FileRequest):
 async def check_exists(path: str):
     """Check if file or directory exists."""
     try:
-        abs_path = os.path.abspath(path)
-        
-        # Security check: ensure path is within workspace
-        if not abs_path.startswith("/workspace"):
-            raise HTTPException(status_code=403, detail="Access denied")
+        abs_path = _safe_path(path)
         
         exists = os.path.exists(abs_path)
         file_type = "file" if os.path.isfile(abs_path) else "directory" if os.path.isdir(abs_path) else "unknown"
@@ -290,38 +840,28 @@ async def check_exists(path: str):
 
 @app.get("/api/browser/status")
 async def browser_status():
-    """Check browser status."""
-    try:
-        # Check if Chrome is running
-        result = subprocess.run(
-            "pgrep -f chrome",
-            shell=True,
-            capture_output=True,
-            text=True
-        )
-        
-        chrome_running = result.returncode == 0
-        
-        # Check if remote debugging port is open
-        debug_port_result = subprocess.run(
-            "netstat -tlnp | grep 9222",
-            shell=True,
-            capture_output=True,
-            text=True
-        )
-        
-        debug_port_open = debug_port_result.returncode == 0
-        
-        return {
-            "success": True,
-            "chrome_running": chrome_running,
-            "debug_port_open": debug_port_open,
-            "debug_port": 9222
-        }
-        
-    except Exception as e:
-        logger.error(f"Browser status check failed: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+    """Report the browser stack's lifecycle state, connections and per-service status."""
+    browser = app.state.browser
+    return {
+        "success": True,
+        "chrome_running": browser.state == "running",
+        "debug_port": 9222,
+        **browser.status()
+    }
+
+@app.post("/api/browser/start")
+async def browser_start():
+    """Start the browser stack if needed and wait until it is ready."""
+    browser = app.state.browser
+    if not await browser.ensure_started():
+        raise HTTPException(status_code=503, detail=browser.error or "Browser failed to start")
+    return {"success": True, "debug_port": 9222, **browser.status()}
+
+@app.post("/api/browser/stop")
+async def browser_stop():
+    """Stop the browser stack now instead of waiting for the idle timeout."""
+    await app.state.browser.stop()
+    return {"success": True, **app.state.browser.status()}
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,122 @@
+import asyncio
+import codecs
+import os
+import signal
+import time
+from typing import AsyncIterator, Dict, Optional
+
+# Bytes read from a pipe at a time, and output events held before the reader
+# waits for the client; a slow client then stalls the process, not our memory
+READ_SIZE = 65536
+MAX_PENDING_EVENTS = 16
+
+
+async def spawn(command: str, cwd: str, stdin: bool = False) -> asyncio.subprocess.Process:
+    """Start a shell command in its own process group, with piped output."""
+    return await asyncio.create_subprocess_shell(
+        command,
+        cwd=cwd,
+        stdin=asyncio.subprocess.PIPE if stdin else asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        start_new_session=True
+    )
+
+
+def kill_group(process: asyncio.subprocess.Process) -> None:
+    """Kill a process and everything it started."""
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+async def stream_output(
+    process: asyncio.subprocess.Process,
+    timeout: Optional[float],
+    stdin: Optional[str] = None
+) -> AsyncIterator[Dict]:
+    """
+    Yield a process's output as it is produced, then its exit.
+
+    Events are ``{"type": "stdout" | "stderr", "data": text}`` and finally
+    ``{"type": "exit", "exit_code", "timed_out", "duration"}``. After
+    ``timeout`` seconds, unless it is None, the whole process group is
+    killed; it is also killed if the consumer stops iterating early.
+    """
+
+    started = time.monotonic()
+    events: asyncio.Queue = asyncio.Queue(MAX_PENDING_EVENTS)
+
+    async def pump(stream: asyncio.StreamReader, name: str) -> None:
+        # Incremental, so a multi-byte character split across reads survives
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        while True:
+            data = await stream.read(READ_SIZE)
+            text = decoder.decode(data, final=not data)
+            if text:
+                await events.put({"type": name, "data": text})
+            if not data:
+                return
+
+    async def feed() -> None:
+        try:
+            process.stdin.write(stdin.encode())
+            await process.stdin.drain()
+            process.stdin.close()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    tasks = [
+        asyncio.create_task(pump(process.stdout, "stdout")),
+        asyncio.create_task(pump(process.stderr, "stderr"))
+    ]
+    if stdin is not None and process.stdin is not None:
+        tasks.append(asyncio.create_task(feed()))
+    pumps = asyncio.gather(*tasks[:2])
+    # Read a failed or cancelled pump's error so it is not logged as unretrieved
+    pumps.add_done_callback(lambda future: future.cancelled() or future.exception())
+    timed_out = False
+
+    try:
+        while True:
+            remaining = None if timeout is None else max(started + timeout - time.monotonic(), 0)
+            getter = asyncio.ensure_future(events.get())
+            done, _ = await asyncio.wait(
+                {getter, pumps},
+                timeout=remaining,
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            if getter in done:
+                yield getter.result()
+                continue
+            getter.cancel()
+            if pumps in done:
+                break
+            timed_out = True
+            kill_group(process)
+            break
+
+        # Output still in flight when the pipes closed or the group was killed
+        while not pumps.done() or not events.empty():
+            getter = asyncio.ensure_future(events.get())
+            done, _ = await asyncio.wait({getter, pumps}, timeout=1.0, return_when=asyncio.FIRST_COMPLETED)
+            if getter in done:
+                yield getter.result()
+            else:
+                getter.cancel()
+                if not done:
+                    break
+
+        exit_code = await process.wait()
+        yield {
+            "type": "exit",
+            "exit_code": exit_code,
+            "timed_out": timed_out,
+            "duration": round(time.monotonic() - started, 3)
+        }
+    finally:
+        if process.returncode is None:
+            kill_group(process)
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,319 @@
+import asyncio
+import fcntl
+import os
+import re
+import signal
+import struct
+import termios
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+# Every prompt starts with the last command's exit status and the nonce of
+# the run that issued it between RS bytes, and ends with a US byte;
+# \[ \] tell bash the markers take no room on screen
+PROMPT_COMMAND = "__sandbox_status=$?"
+PROMPT = r"\[\036\]${__sandbox_status}:${__sandbox_run}\[\036\]\w\$ \[\037\]"
+MARKER = re.compile(rb"\x1e(\d+):(\w*)\x1e")
+PROMPT_END = b"\x1f"
+
+
+class ShellSession:
+    """
+    A long-lived bash on a pseudo-terminal.
+
+    The working directory, environment and shell state persist between
+    commands. Output is kept in a scrollback ring of ``scrollback``
+    bytes addressed by absolute offsets, so readers can resume where
+    they left off and learn when they fell behind. Readline is off and
+    the prompt carries the exit status, so ``run`` knows when a command
+    has finished without polling. Each run tags its prompt with a nonce,
+    so a prompt left over from an interrupted command is never taken for
+    the next one's.
+    """
+
+    def __init__(
+        self,
+        cwd: str = "/workspace",
+        env: Optional[Dict[str, str]] = None,
+        cols: int = 120,
+        rows: int = 40,
+        scrollback: int = 256 * 1024
+    ):
+        self.id = uuid.uuid4().hex[:12]
+        self.cwd = cwd
+        self.env = env or {}
+        self.cols = cols
+        self.rows = rows
+        self.scrollback = scrollback
+        self.created_at = time.time()
+        self.last_used = time.monotonic()
+
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self._master: Optional[int] = None
+        self._buffer = bytearray()
+        # Absolute offset of the first byte still in the buffer
+        self._start = 0
+        self._output = asyncio.Condition()
+        self._run_lock = asyncio.Lock()
+
+    @property
+    def end(self) -> int:
+        """Absolute offset just past the newest output."""
+        return self._start + len(self._buffer)
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.returncode is None
+
+    async def start(self, timeout: float = 10.0) -> None:
+        master, slave = os.openpty()
+        self._master = master
+        self._set_size(self.cols, self.rows)
+
+        def controlling_tty() -> None:
+            # Runs in the child after setsid: adopt the pty so job control and ^C work
+            fcntl.ioctl(0, termios.TIOCSCTTY, 0)
+
+        try:
+            self.process = await asyncio.create_subprocess_exec(
+                "bash", "--noprofile", "--norc", "--noediting", "-i",
+                stdin=slave,
+                stdout=slave,
+                stderr=slave,
+                cwd=self.cwd,
+                env={
+                    **os.environ,
+                    **self.env,
+                    "TERM": "xterm-256color",
+                    "PROMPT_COMMAND": PROMPT_COMMAND,
+                    "PS1": PROMPT,
+                    "PS2": ""
+                },
+                start_new_session=True,
+                preexec_fn=controlling_tty
+            )
+        finally:
+            os.close(slave)
+
+        os.set_blocking(master, False)
+        asyncio.get_running_loop().add_reader(master, self._on_readable)
+        # The first prompt means the shell is ready
+        if await self._wait_marker(0, timeout, "") is None:
+            await self.close()
+            raise TimeoutError("Shell did not start")
+
+    async def run(self, command: str, timeout: float = 300.0) -> Dict:
+        """
+        Run a command and return its output and exit code.
+
+        Commands run one at a time per session. On timeout the command
+        keeps running; ``done`` is False and ``offset`` says where to
+        resume reading its output.
+        """
+
+        async with self._run_lock:
+            self.last_used = time.monotonic()
+            nonce = uuid.uuid4().hex[:8]
+            # eval keeps a syntax error from skipping the nonce, and a
+            # multi-line command ends in a single prompt; the subshell
+            # hands the previous exit status on to the command
+            quoted = "'" + command.strip().replace("'", "'\\''") + "'"
+            data = f"__sandbox_run={nonce}; (exit $__sandbox_status); eval {quoted}\n".encode()
+            started = self.end
+            self.write(data)
+
+            found = await self._wait_marker(started, timeout, nonce)
+            if found is None:
+                output, offset, _ = self.read(started)
+                exit_code = None
+            else:
+                marker_start, marker_end, exit_code = found
+                output, _, _ = self.read(started, marker_start)
+                offset = self._prompt_end(marker_end)
+
+            # Drop prompts of earlier commands that finished after we typed
+            output = output[output.rfind(PROMPT_END) + 1:]
+            # The terminal echoes what we typed before the output
+            echo = data.replace(b"\n", b"\r\n")
+            if output.startswith(echo):
+                output = output[len(echo):]
+            return {"output": self._decode(output), "exit_code": exit_code, "done": found is not None, "offset": offset}
+
+    def write(self, data: bytes) -> None:
+        """Send raw input, as typed."""
+        self.last_used = time.monotonic()
+        view = memoryview(data)
+        while view:
+            try:
+                written = os.write(self._master, view)
+            except BlockingIOError:
+                # Terminal input buffer full; the shell is not reading
+                raise BufferError("Shell is not accepting input")
+            view = view[written:]
+
+    def read(self, offset: int, until: Optional[int] = None) -> Tuple[bytes, int, bool]:
+        """Output from ``offset`` (to ``until``), the offset after it, and whether some was lost."""
+        truncated = offset < self._start
+        start = max(offset, self._start) - self._start
+        stop = len(self._buffer) if until is None else max(until - self._start, start)
+        return bytes(self._buffer[start:stop]), self._start + stop, truncated
+
+    async def wait_output(self, offset: int, timeout: float) -> None:
+        """Wait until there is output past ``offset``, the shell exits, or ``timeout`` passes."""
+        async with self._output:
+            try:
+                await asyncio.wait_for(
+                    self._output.wait_for(lambda: self.end > offset or not self.alive),
+                    timeout
+                )
+            except asyncio.TimeoutError:
+                pass
+
+    def resize(self, cols: int, rows: int) -> None:
+        self.cols, self.rows = cols, rows
+        self._set_size(cols, rows)
+        if self.alive:
+            self.process.send_signal(signal.SIGWINCH)
+
+    def interrupt(self) -> None:
+        """Send ^C to whatever is running in the foreground."""
+        self.write(b"\x03")
+
+    async def close(self) -> None:
+        if self._master is not None:
+            asyncio.get_running_loop().remove_reader(self._master)
+        if self.alive:
+            try:
+                os.killpg(self.process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            await self.process.wait()
+        if self._master is not None:
+            os.close(self._master)
+            self._master = None
+        async with self._output:
+            self._output.notify_all()
+
+    def status(self) -> Dict:
+        return {
+            "id": self.id,
+            "alive": self.alive,
+            "pid": self.process.pid if self.process else None,
+            "cols": self.cols,
+            "rows": self.rows,
+            "offset": self.end,
+            "scrollback_bytes": len(self._buffer),
+            "created_at": self.created_at,
+            "idle_seconds": round(time.monotonic() - self.last_used, 1)
+        }
+
+    def _on_readable(self) -> None:
+        try:
+            data = os.read(self._master, 65536)
+        except BlockingIOError:
+            return
+        except OSError:
+            # EIO: the shell exited and closed the terminal
+            data = b""
+        if not data:
+            asyncio.get_running_loop().remove_reader(self._master)
+        else:
+            self._buffer += data
+            overflow = len(self._buffer) - self.scrollback
+            if overflow > 0:
+                del self._buffer[:overflow]
+                self._start += overflow
+        asyncio.ensure_future(self._notify())
+
+    async def _notify(self) -> None:
+        async with self._output:
+            self._output.notify_all()
+
+    async def _wait_marker(self, offset: int, timeout: float, nonce: str) -> Optional[Tuple[int, int, int]]:
+        """Find the next prompt marker tagged ``nonce`` after ``offset``: its start, end and exit status."""
+        deadline = time.monotonic() + timeout
+        searched = offset
+        while True:
+            data, end, _ = self.read(searched)
+            base = max(searched, self._start)
+            for match in MARKER.finditer(data):
+                if match.group(2).decode() == nonce:
+                    return base + match.start(), base + match.end(), int(match.group(1))
+                # Stale markers are never searched again
+                searched = base + match.end()
+            # A marker may straddle reads; keep its possible start for the next search
+            searched = max(searched, end - 24)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self.alive:
+                return None
+            await self.wait_output(end, remaining)
+
+    def _prompt_end(self, marker_end: int) -> int:
+        """Offset past the visible rest of the prompt that follows a marker."""
+        data, _, _ = self.read(marker_end)
+        index = data.find(PROMPT_END)
+        return marker_end + index + 1 if index >= 0 else marker_end
+
+    def _set_size(self, cols: int, rows: int) -> None:
+        fcntl.ioctl(self._master, termios.TIOCSWINSZ, struct.pack("HHHH", rows, cols, 0, 0))
+
+    @staticmethod
+    def _decode(data: bytes) -> str:
+        return data.decode("utf-8", errors="replace").replace("\r\n", "\n")
+
+
+class ShellSessions:
+    """
+    The sandbox's shell sessions, at most ``max_sessions`` at a time.
+
+    Sessions idle for ``idle_timeout`` seconds, or whose shell exited,
+    are closed by a background sweep.
+    """
+
+    def __init__(self, max_sessions: int = 8, idle_timeout: float = 3600.0, scrollback: int = 256 * 1024):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.scrollback = scrollback
+        self.sessions: Dict[str, ShellSession] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._sweep())
+
+    async def create(self, **kwargs) -> ShellSession:
+        if len(self.sessions) >= self.max_sessions:
+            raise OverflowError(f"At most {self.max_sessions} shell sessions")
+        session = ShellSession(scrollback=self.scrollback, **kwargs)
+        await session.start()
+        self.sessions[session.id] = session
+        return session
+
+    def get(self, session_id: str) -> Optional[ShellSession]:
+        return self.sessions.get(session_id)
+
+    def list(self) -> List[Dict]:
+        return [session.status() for session in self.sessions.values()]
+
+    async def close(self, session_id: str) -> bool:
+        session = self.sessions.pop(session_id, None)
+        if session is None:
+            return False
+        await session.close()
+        return True
+
+    async def close_all(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for session_id in list(self.sessions):
+            await self.close(session_id)
+
+    async def _sweep(self) -> None:
+        while True:
+            await asyncio.sleep(60)
+            now = time.monotonic()
+            for session_id, session in list(self.sessions.items()):
+                if not session.alive or now - session.last_used > self.idle_timeout:
+                    await self.close(session_id)
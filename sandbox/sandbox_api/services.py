@@ -0,0 +1,246 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DISPLAY = ":99"
+
+
+async def port_open(port: int, host: str = "127.0.0.1") -> bool:
+    """Return True if something accepts TCP connections on the port."""
+    try:
+        _, writer = await asyncio.open_connection(host, port)
+    except OSError:
+        return False
+    writer.close()
+    return True
+
+
+async def display_ready() -> bool:
+    """Return True once the X server has created its socket."""
+    return os.path.exists(f"/tmp/.X11-unix/X{DISPLAY.lstrip(':')}")
+
+
+class Service:
+    """A background process with a readiness probe."""
+
+    def __init__(
+        self,
+        name: str,
+        command: List[str],
+        probe: Callable[[], Awaitable[bool]],
+        depends_on: Optional[List[str]] = None,
+        timeout: float = 30.0
+    ):
+        self.name = name
+        self.command = command
+        self.probe = probe
+        self.depends_on = depends_on or []
+        self.timeout = timeout
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.state = "pending"
+        self.error: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.ready_at: Optional[float] = None
+        self.ready = asyncio.Event()
+
+    def status(self, boot_at: float) -> Dict:
+        return {
+            "state": self.state,
+            "pid": self.process.pid if self.process else None,
+            "error": self.error,
+            # Seconds since the supervisor started, and from spawn to ready
+            "started_after": round(self.started_at - boot_at, 3) if self.started_at else None,
+            "ready_after": round(self.ready_at - boot_at, 3) if self.ready_at else None,
+            "startup_seconds": (
+                round(self.ready_at - self.started_at, 3)
+                if self.ready_at and self.started_at else None
+            )
+        }
+
+
+class ServiceSupervisor:
+    """
+    Starts the sandbox's desktop and browser services in parallel.
+
+    Each service starts as soon as the services it depends on are ready,
+    and is ready when its probe succeeds rather than after a fixed sleep.
+    ``wait_ready`` lets callers block until everything is up.
+    """
+
+    def __init__(self, services: List[Service], probe_interval: float = 0.05):
+        self.services = {service.name: service for service in services}
+        self.probe_interval = probe_interval
+        self.boot_at = time.monotonic()
+        self._tasks: List[asyncio.Task] = []
+        self._watcher: Optional[asyncio.Task] = None
+        self._settled = asyncio.Event()
+
+    @property
+    def ready(self) -> bool:
+        return all(service.state == "ready" for service in self.services.values())
+
+    @property
+    def failed(self) -> bool:
+        return any(service.state == "failed" for service in self.services.values())
+
+    def start(self) -> None:
+        self.boot_at = time.monotonic()
+        self._tasks = [
+            asyncio.create_task(self._run(service)) for service in self.services.values()
+        ]
+        self._watcher = asyncio.create_task(self._watch())
+
+    async def stop(self, timeout: float = 5.0) -> None:
+        """Terminate every service and wait for it to exit, killing stragglers."""
+        if self._watcher is not None:
+            self._watcher.cancel()
+            self._watcher = None
+        for task in self._tasks:
+            task.cancel()
+        processes = [
+            service.process for service in self.services.values()
+            if service.process and service.process.returncode is None
+        ]
+        for process in processes:
+            process.terminate()
+        if not processes:
+            return
+        _, pending = await asyncio.wait(
+            [asyncio.create_task(process.wait()) for process in processes],
+            timeout=timeout
+        )
+        for process in processes:
+            if process.returncode is None:
+                process.kill()
+        if pending:
+            await asyncio.wait(pending)
+
+    async def wait_ready(self, timeout: float) -> bool:
+        """Wait until every service is ready or one has failed."""
+        try:
+            await asyncio.wait_for(self._settled.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self.ready
+
+    def status(self) -> Dict:
+        return {
+            "ready": self.ready,
+            "services": {
+                name: service.status(self.boot_at) for name, service in self.services.items()
+            }
+        }
+
+    async def _watch(self) -> None:
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._settled.set()
+        elapsed = time.monotonic() - self.boot_at
+        if self.ready:
+            logger.info(f"All services ready in {elapsed:.2f}s")
+        else:
+            logger.error(f"Services failed to start: {self.status()['services']}")
+
+    async def _run(self, service: Service) -> None:
+        for dependency in service.depends_on:
+            await self.services[dependency].ready.wait()
+            if self.services[dependency].state == "failed":
+                self._fail(service, f"dependency {dependency} failed")
+                return
+
+        service.state = "starting"
+        service.started_at = time.monotonic()
+        try:
+            service.process = await asyncio.create_subprocess_exec(
+                *service.command,
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.DEVNULL,
+                env={**os.environ, "DISPLAY": DISPLAY}
+            )
+        except OSError as e:
+            self._fail(service, f"failed to spawn: {e}")
+            return
+
+        deadline = service.started_at + service.timeout
+        while True:
+            if service.process.returncode is not None:
+                self._fail(service, f"exited with code {service.process.returncode}")
+                return
+            if await service.probe():
+                break
+            if time.monotonic() > deadline:
+                self._fail(service, f"not ready after {service.timeout:.0f}s")
+                return
+            await asyncio.sleep(self.probe_interval)
+
+        service.state = "ready"
+        service.ready_at = time.monotonic()
+        service.ready.set()
+        logger.info(f"{service.name} ready in {service.ready_at - service.started_at:.2f}s")
+
+    def _fail(self, service: Service, error: str) -> None:
+        service.state = "failed"
+        service.error = error
+        logger.error(f"{service.name} {error}")
+        # Wake dependents so they fail too instead of waiting forever
+        service.ready.set()
+
+
+# The browser stack listens on these internal ports; the sandbox API owns the
+# public ones and starts the stack when a client first connects
+VNC_PORT = 5901
+NOVNC_PORT = 6081
+CDP_PORT = 9223
+
+
+def default_services() -> List[Service]:
+    """The sandbox's desktop, VNC bridge and browser."""
+
+    return [
+        Service(
+            "xvfb",
+            ["Xvfb", DISPLAY, "-screen", "0", "1920x1080x24"],
+            display_ready
+        ),
+        Service(
+            "x11vnc",
+            ["x11vnc", "-display", DISPLAY, "-forever", "-shared", "-rfbport", str(VNC_PORT), "-passwd", ""],
+            lambda: port_open(VNC_PORT),
+            depends_on=["xvfb"]
+        ),
+        # websockify only connects to VNC when a client arrives, so it need not wait
+        Service(
+            "websockify",
+            ["websockify", "--web", "/usr/share/novnc", str(NOVNC_PORT), f"localhost:{VNC_PORT}"],
+            lambda: port_open(NOVNC_PORT)
+        ),
+        Service(
+            "chrome",
+            [
+                "google-chrome-stable",
+                "--headless",
+                "--disable-gpu",
+                f"--remote-debugging-port={CDP_PORT}",
+                "--no-sandbox",
+                "--disable-dev-shm-usage",
+                "--disable-software-rasterizer",
+                "--disable-background-timer-throttling",
+                "--disable-backgrounding-occluded-windows",
+                "--disable-renderer-backgrounding",
+                "--disable-features=TranslateUI",
+                "--disable-ipc-flooding-protection",
+                "--disable-background-media-suspend",
+                "--disable-extensions",
+                "--disable-default-apps",
+                "--disable-component-extensions-with-background-pages",
+                "--disable-breakpad",
+                "--disable-crash-reporter",
+                "--disable-features=ImprovedCookieControls,LazyImageLoading,GlobalMediaControls,DestroyProfileOnBrowserClose,MediaRouter",
+                "--disable-background-networking"
+            ],
+            lambda: port_open(CDP_PORT)
+        )
+    ]
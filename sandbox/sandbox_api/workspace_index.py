@@ -0,0 +1,826 @@
+import asyncio
+import bisect
+import errno
+import itertools
+import logging
+import os
+import re
+import stat
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+try:
+    from re import _parser as sre_parse
+except ImportError:
+    import sre_parse
+
+from inotify import (
+    IN_ATTRIB, IN_CLOSE_WRITE, IN_CREATE, IN_DELETE, IN_DELETE_SELF, IN_DONT_FOLLOW, IN_EXCL_UNLINK,
+    IN_IGNORED, IN_MODIFY, IN_MOVE_SELF, IN_MOVED_FROM, IN_MOVED_TO, IN_ONLYDIR, IN_Q_OVERFLOW, Inotify
+)
+
+logger = logging.getLogger(__name__)
+
+WATCH_MASK = (
+    IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR | IN_DONT_FOLLOW | IN_EXCL_UNLINK
+)
+# Directories listed but not descended into or watched
+DEFAULT_IGNORE = (".git", "node_modules")
+# Events are applied in batches, this long after the first of a burst
+DEBOUNCE_SECONDS = 0.1
+# Full rescans when inotify is unavailable or out of watches
+POLL_SECONDS = 30.0
+# Files read per worker-thread hop while indexing or searching contents
+CONTENT_BATCH = 128
+MAX_LINE_CHARS = 500
+# Trigram removals done between yields to the event loop
+PRUNE_SLICE = 20000
+# Change batches a subscriber may fall behind by, and the most events one
+# batch carries; past either, subscribers get a reset instead
+FEED_QUEUE_SIZE = 64
+MAX_FEED_EVENTS = 500
+
+# path -> (size, mtime, is_dir)
+Entry = Tuple[int, float, bool]
+
+
+class WorkspaceIndex:
+    """
+    The workspace tree held in memory and kept current from inotify.
+
+    Paths are kept sorted, so a directory's subtree is one contiguous
+    slice: listings page through it with a cursor, and globs only look
+    at the part of the tree they can match. File contents can also be
+    indexed by trigram; a regex search then opens only the files that
+    contain every trigram of the pattern's literal parts. Files that are
+    not indexed yet (still queued, or past ``content_budget`` bytes)
+    are searched directly, and binary files or those over
+    ``max_file_bytes`` are not searched.
+
+    Without inotify, or once the kernel's watch limit is hit, the tree
+    is rescanned every ``POLL_SECONDS`` instead.
+
+    Each applied batch of changes is also published to subscribers as
+    created / modified / deleted events, numbered by ``seq``. A deleted
+    directory is one event for its whole subtree. A ``reset`` event
+    means changes under its path were not itemised and it should be
+    listed again.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        ignore: Iterable[str] = DEFAULT_IGNORE,
+        content: bool = True,
+        max_file_bytes: int = 1024 * 1024,
+        content_budget: int = 256 * 1024 * 1024
+    ):
+        self.root = os.path.realpath(root)
+        self.ignore = frozenset(ignore)
+        self.content_enabled = content
+        self.max_file_bytes = max_file_bytes
+        self.content_budget = content_budget
+
+        # scanning or ready; inotify or polling
+        self.state = "scanning"
+        self.mode = "inotify"
+        self.entries: Dict[str, Entry] = {}
+        self._paths: List[str] = []
+        self._children: Dict[str, Set[str]] = {}
+        self._file_count = 0
+
+        self._trigrams: Dict[bytes, Set[str]] = {}
+        self._content: Dict[str, FrozenSet[bytes]] = {}
+        self._content_sizes: Dict[str, int] = {}
+        self._content_bytes = 0
+        self._unsearchable: Set[str] = set()
+        self._content_queue: "OrderedDict[str, None]" = OrderedDict()
+        self._stale: Deque[Tuple[str, FrozenSet[bytes]]] = deque()
+
+        self._inotify: Optional[Inotify] = None
+        self._watches: Dict[int, str] = {}
+        self._watched: Dict[str, int] = {}
+        self._dirty: Set[str] = set()
+        self._rescan_needed = False
+        self._changed: Optional[asyncio.Event] = None
+        self._content_changed: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self._subscribers: Set[asyncio.Queue] = set()
+        self.seq = 0
+        self.stats = {"scans": 0, "scan_seconds": 0.0, "events": 0, "overflows": 0, "updates": 0}
+
+    async def start(self) -> None:
+        self._changed = asyncio.Event()
+        self._content_changed = asyncio.Event()
+        try:
+            self._inotify = Inotify()
+            asyncio.get_running_loop().add_reader(self._inotify.fd, self._on_events)
+        except OSError as e:
+            logger.warning(f"inotify unavailable, polling the workspace instead: {e}")
+            self.mode = "polling"
+        self._tasks = [asyncio.create_task(self._run())]
+        if self.content_enabled:
+            self._tasks.append(asyncio.create_task(self._index_contents()))
+
+    async def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        self._stop_inotify()
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def subscribe(self) -> asyncio.Queue:
+        """A queue of change batches, ``{"seq", "events"}``, from now until ``unsubscribe``."""
+        queue: asyncio.Queue = asyncio.Queue(FEED_QUEUE_SIZE)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self._subscribers.discard(queue)
+
+    def covers(self, path: str) -> bool:
+        """Whether the index holds everything under ``path``."""
+        if path != self.root and not path.startswith(self.root + os.sep):
+            return False
+        relative = os.path.relpath(path, self.root)
+        return relative == "." or not any(part in self.ignore for part in relative.split(os.sep))
+
+    def list(
+        self,
+        path: str,
+        recursive: bool = False,
+        cursor: Optional[str] = None,
+        limit: Optional[int] = None
+    ) -> Tuple[List[Tuple[str, Entry]], Optional[str]]:
+        """
+        Entries under a directory in path order, and the cursor for the
+        next page (None on the last). ``cursor`` is the last path of the
+        previous page.
+        """
+
+        if recursive:
+            lo, hi = self._subtree(path)
+            if cursor:
+                lo = max(lo, bisect.bisect_right(self._paths, cursor))
+            paths = self._paths[lo:hi if limit is None else min(hi, lo + limit)]
+            more = limit is not None and lo + limit < hi
+        else:
+            names = sorted(self._children.get(path, ()))
+            start = bisect.bisect_right(names, os.path.basename(cursor)) if cursor else 0
+            names = names[start:] if limit is None else names[start:start + limit + 1]
+            more = limit is not None and len(names) > limit
+            paths = [os.path.join(path, name) for name in names[:limit]]
+        page = [(p, self.entries[p]) for p in paths]
+        return page, (paths[-1] if more and paths else None)
+
+    def glob(
+        self,
+        pattern: str,
+        path: str,
+        cursor: Optional[str] = None,
+        limit: int = 1000
+    ) -> Tuple[List[Tuple[str, Entry]], Optional[str]]:
+        """
+        Entries under ``path`` matching a glob, a page at a time. A pattern
+        without a slash matches names at any depth (``*.py``); otherwise
+        it is matched against the path relative to ``path``, where ``**``
+        spans directories.
+        """
+
+        base, regex = glob_matcher(pattern, path)
+        lo, hi = self._subtree(base)
+        if cursor:
+            lo = max(lo, bisect.bisect_right(self._paths, cursor))
+        # filter() keeps the per-path loop in C
+        found = list(itertools.islice(filter(regex.match, self._paths[lo:hi]), limit + 1))
+        matches = [(p, self.entries[p]) for p in found[:limit]]
+        return matches, (found[limit - 1] if len(found) > limit else None)
+
+    async def search(
+        self,
+        pattern: str,
+        path: str,
+        glob: Optional[str] = None,
+        ignore_case: bool = False,
+        limit: int = 200,
+        max_per_file: int = 20
+    ) -> Dict:
+        """
+        Lines matching a regex in files under ``path`` (optionally only
+        those matching ``glob``), in path order. Raises re.error for an
+        invalid pattern.
+        """
+
+        regex = re.compile(pattern, re.MULTILINE | (re.IGNORECASE if ignore_case else 0))
+        base, glob_regex = glob_matcher(glob, path) if glob else (path, None)
+        candidates = self._candidates(pattern, ignore_case) if self.content_enabled else None
+        if candidates is not None and self._fully_indexed():
+            # Every searchable file is in the trigram index, so only candidates can match
+            prefix = base + "/"
+            files = sorted(p for p in candidates if p.startswith(prefix))
+        else:
+            lo, hi = self._subtree(base)
+            files = [
+                p for p in self._paths[lo:hi]
+                if not self.entries[p][2]
+                and p not in self._unsearchable
+                and (candidates is None or p in candidates or p not in self._content)
+            ]
+        if glob_regex is not None:
+            files = list(filter(glob_regex.match, files))
+
+        matches: List[Dict] = []
+        searched = 0
+        for start in range(0, len(files), CONTENT_BATCH):
+            batch = files[start:start + CONTENT_BATCH]
+            found = await asyncio.to_thread(
+                _grep, batch, regex, self.max_file_bytes, max_per_file, limit - len(matches)
+            )
+            matches.extend(found)
+            searched += len(batch)
+            if len(matches) >= limit:
+                break
+        return {
+            "matches": matches,
+            "files_searched": searched,
+            "candidates": len(files),
+            "truncated": len(matches) >= limit
+        }
+
+    def status(self) -> Dict:
+        return {
+            "state": self.state,
+            "mode": self.mode,
+            "root": self.root,
+            "ignore": sorted(self.ignore),
+            "files": self._file_count,
+            "directories": len(self.entries) - self._file_count,
+            "watches": len(self._watches),
+            "subscribers": len(self._subscribers),
+            "seq": self.seq,
+            "content": {
+                "enabled": self.content_enabled,
+                "indexed_files": len(self._content),
+                "indexed_bytes": self._content_bytes,
+                "budget_bytes": self.content_budget,
+                "unsearchable_files": len(self._unsearchable),
+                "pending": len(self._content_queue),
+                "trigrams": len(self._trigrams)
+            },
+            **self.stats
+        }
+
+    # Keeping the tree current
+
+    async def _run(self) -> None:
+        await self._rescan()
+        self.state = "ready"
+        while True:
+            if self.mode == "polling":
+                if self._inotify is not None:
+                    # Partly watched is worse than not at all: events would be missed silently
+                    self._stop_inotify()
+                await asyncio.sleep(POLL_SECONDS)
+                await self._rescan()
+                continue
+            await self._changed.wait()
+            await asyncio.sleep(DEBOUNCE_SECONDS)
+            self._changed.clear()
+            try:
+                if self._rescan_needed:
+                    self._rescan_needed = False
+                    self._dirty.clear()
+                    await self._rescan()
+                else:
+                    await self._apply_changes()
+            except Exception as e:
+                logger.error(f"Workspace index update failed, rescanning: {e}")
+                await self._rescan()
+
+    def _on_events(self) -> None:
+        for wd, mask, name in self._inotify.read():
+            self.stats["events"] += 1
+            if mask & IN_Q_OVERFLOW:
+                # Events were dropped; only a rescan can tell what changed
+                self.stats["overflows"] += 1
+                self._rescan_needed = True
+                continue
+            directory = self._watches.get(wd)
+            if directory is None:
+                continue
+            if mask & IN_IGNORED:
+                # The directory is gone or was unwatched
+                self._forget_watch(wd)
+                continue
+            self._dirty.add(os.path.join(directory, name) if name else directory)
+        self._changed.set()
+
+    async def _apply_changes(self) -> None:
+        dirty = sorted(self._dirty)
+        self._dirty.clear()
+        new_directories = []
+        events: List[Dict] = []
+        for path in dirty:
+            if path != self.root and not self.covers(os.path.dirname(path)):
+                continue
+            try:
+                st = os.lstat(path)
+            except FileNotFoundError:
+                removed = self._remove(path)
+                if removed is not None:
+                    events.append(_deleted(path, removed))
+                continue
+            except OSError:
+                continue
+            if path == self.root:
+                continue
+            is_dir = stat.S_ISDIR(st.st_mode)
+            known = self.entries.get(path)
+            if known is not None and known[2] != is_dir:
+                events.append(_deleted(path, self._remove(path)))
+                known = None
+            if is_dir and known is None and self.covers(path):
+                new_directories.append(path)
+            entry = (st.st_size, st.st_mtime, is_dir)
+            self._put(path, *entry)
+            if known is None:
+                events.append(_change("created", path, entry))
+            elif not is_dir and known[:2] != entry[:2]:
+                # A directory's own mtime moves with every entry in it; those are reported already
+                events.append(_change("modified", path, entry))
+            if not is_dir and (known is None or known[:2] != entry[:2]):
+                self._queue_content(path)
+            self.stats["updates"] += 1
+
+        for directory in new_directories:
+            # Created or moved in: files may have landed in it before it was watched
+            entries, watches = await asyncio.to_thread(self._scan, directory)
+            self._watch_all(watches)
+            events.extend(_change("created", path, entry) for path, entry in entries.items() if path not in self.entries)
+            self._put_many(entries)
+            for path, entry in entries.items():
+                if not entry[2]:
+                    self._queue_content(path)
+        self._publish(events)
+
+    async def _rescan(self) -> None:
+        started = time.monotonic()
+        entries, watches = await asyncio.to_thread(self._scan, self.root)
+        self._watch_all(watches)
+        previous = self.entries
+        self.entries = entries
+        self._paths = sorted(entries)
+        self._children = {}
+        self._file_count = sum(1 for entry in entries.values() if not entry[2])
+        for path in self._paths:
+            self._children.setdefault(os.path.dirname(path), set()).add(os.path.basename(path))
+
+        for path in list(self._content) + list(self._unsearchable):
+            if path not in entries:
+                self._drop_content(path)
+        for path, entry in entries.items():
+            if not entry[2] and previous.get(path) != entry:
+                self._queue_content(path)
+        if self.stats["scans"]:
+            self._publish(_diff(previous, entries))
+
+        self.stats["scans"] += 1
+        self.stats["scan_seconds"] = round(time.monotonic() - started, 3)
+        logger.info(f"Indexed {len(entries)} workspace entries in {self.stats['scan_seconds']}s")
+
+    def _scan(self, top: str) -> Tuple[Dict[str, Entry], Dict[str, int]]:
+        """Walk a directory in a worker thread, watching each directory before listing it."""
+        entries: Dict[str, Entry] = {}
+        watches: Dict[str, int] = {}
+        pending = [top]
+        while pending:
+            directory = pending.pop()
+            if self.mode == "inotify" and self._inotify is not None:
+                try:
+                    watches[directory] = self._inotify.add_watch(directory, WATCH_MASK)
+                except OSError as e:
+                    if e.errno == errno.ENOSPC:
+                        logger.warning("Out of inotify watches, polling the workspace instead")
+                        self.mode = "polling"
+            try:
+                with os.scandir(directory) as it:
+                    for item in it:
+                        try:
+                            st = item.stat(follow_symlinks=False)
+                        except OSError:
+                            continue
+                        is_dir = stat.S_ISDIR(st.st_mode)
+                        entries[item.path] = (st.st_size, st.st_mtime, is_dir)
+                        if is_dir and item.name not in self.ignore:
+                            pending.append(item.path)
+            except OSError:
+                continue
+        return entries, watches
+
+    def _stop_inotify(self) -> None:
+        if self._inotify is not None:
+            asyncio.get_running_loop().remove_reader(self._inotify.fd)
+            self._inotify.close()
+            self._inotify = None
+        self._watches.clear()
+        self._watched.clear()
+        self._dirty.clear()
+
+    def _watch_all(self, watches: Dict[str, int]) -> None:
+        for path, wd in watches.items():
+            self._watches[wd] = path
+            self._watched[path] = wd
+
+    def _forget_watch(self, wd: int) -> None:
+        directory = self._watches.pop(wd, None)
+        if directory is not None and self._watched.get(directory) == wd:
+            del self._watched[directory]
+
+    def _put(self, path: str, size: int, mtime: float, is_dir: bool) -> None:
+        if path not in self.entries:
+            bisect.insort(self._paths, path)
+            self._children.setdefault(os.path.dirname(path), set()).add(os.path.basename(path))
+            if not is_dir:
+                self._file_count += 1
+        self.entries[path] = (size, mtime, is_dir)
+
+    def _put_many(self, entries: Dict[str, Entry]) -> None:
+        added = [path for path in entries if path not in self.entries]
+        for path in added:
+            self._children.setdefault(os.path.dirname(path), set()).add(os.path.basename(path))
+            if not entries[path][2]:
+                self._file_count += 1
+        self.entries.update(entries)
+        # One sort of nearly sorted data beats thousands of insertions into a long list
+        self._paths.extend(added)
+        self._paths.sort()
+
+    def _remove(self, path: str) -> Optional[Entry]:
+        entry = self.entries.pop(path, None)
+        if entry is None:
+            return None
+        index = bisect.bisect_left(self._paths, path)
+        if index < len(self._paths) and self._paths[index] == path:
+            del self._paths[index]
+        siblings = self._children.get(os.path.dirname(path))
+        if siblings is not None:
+            siblings.discard(os.path.basename(path))
+        self._drop_content(path)
+        if not entry[2]:
+            self._file_count -= 1
+            return entry
+
+        lo, hi = self._subtree(path)
+        for child in self._paths[lo:hi]:
+            if not self.entries.pop(child)[2]:
+                self._file_count -= 1
+            self._drop_content(child)
+            self._children.pop(child, None)
+        del self._paths[lo:hi]
+        self._children.pop(path, None)
+        # A directory moved elsewhere keeps its watches; they would report under the old path
+        for directory in [path] + [d for d in self._watched if d.startswith(path + os.sep)]:
+            wd = self._watched.get(directory)
+            if wd is not None:
+                if self._inotify is not None:
+                    self._inotify.rm_watch(wd)
+                self._forget_watch(wd)
+        return entry
+
+    def _publish(self, events: List[Dict]) -> None:
+        if not events:
+            return
+        self.seq += 1
+        if len(events) > MAX_FEED_EVENTS:
+            # A checkout or an unpacked archive: cheaper to re-list than to itemise
+            events = [{"type": "reset", "path": self.root}]
+        batch = {"seq": self.seq, "events": events}
+        for queue in self._subscribers:
+            try:
+                queue.put_nowait(batch)
+            except asyncio.QueueFull:
+                # The subscriber fell behind; what it missed is summed up as a reset
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({"seq": self.seq, "events": [{"type": "reset", "path": self.root}]})
+
+    def _subtree(self, path: str) -> Tuple[int, int]:
+        """Slice of the sorted paths strictly below ``path``."""
+        # "0" sorts right after "/", so [path/, path0) is exactly the subtree
+        return (
+            bisect.bisect_left(self._paths, path + "/"),
+            bisect.bisect_left(self._paths, path + "0")
+        )
+
+    # Content trigrams
+
+    def _queue_content(self, path: str) -> None:
+        if self.content_enabled:
+            self._content_queue[path] = None
+            self._content_queue.move_to_end(path)
+            self._content_changed.set()
+
+    async def _index_contents(self) -> None:
+        while True:
+            await self._content_changed.wait()
+            self._content_changed.clear()
+            await self._prune_postings()
+            while self._content_queue:
+                batch = []
+                while self._content_queue and len(batch) < CONTENT_BATCH:
+                    path, _ = self._content_queue.popitem(last=False)
+                    entry = self.entries.get(path)
+                    if entry is None:
+                        continue
+                    if entry[0] > self.max_file_bytes:
+                        self._drop_content(path)
+                        self._unsearchable.add(path)
+                    elif self._content_bytes + entry[0] <= self.content_budget or path in self._content:
+                        batch.append(path)
+                results, postings = await asyncio.to_thread(_read_trigrams, batch, self.max_file_bytes)
+                self._add_contents(results, postings)
+                await self._prune_postings()
+
+    def _add_contents(
+        self,
+        results: List[Tuple[str, Optional[FrozenSet[bytes]], int]],
+        postings: Dict[bytes, List[str]]
+    ) -> None:
+        """Merge a batch read by _read_trigrams, skipping files removed or changed meanwhile."""
+        added = set()
+        for path, grams, size in results:
+            self._drop_content(path)
+            entry = self.entries.get(path)
+            if entry is None or entry[2] or path in self._content_queue:
+                continue
+            if grams is None:
+                self._unsearchable.add(path)
+            elif self._content_bytes + size <= self.content_budget:
+                self._content[path] = grams
+                self._content_sizes[path] = size
+                self._content_bytes += size
+                added.add(path)
+
+        # The thread grouped paths by trigram, so this is one C-level update per trigram
+        complete = len(added) == len(results)
+        for gram, paths in postings.items():
+            holders = self._trigrams.get(gram)
+            if holders is None:
+                holders = self._trigrams[gram] = set()
+            holders.update(paths if complete else [p for p in paths if p in added])
+            if not holders:
+                del self._trigrams[gram]
+
+    def _fully_indexed(self) -> bool:
+        return not self._content_queue and len(self._content) + len(self._unsearchable) >= self._file_count
+
+    def _drop_content(self, path: str) -> None:
+        self._unsearchable.discard(path)
+        grams = self._content.pop(path, None)
+        if grams is None:
+            return
+        self._content_bytes -= self._content_sizes.pop(path, 0)
+        # Its postings go later, in slices; until then _candidates filters it out
+        self._stale.append((path, grams))
+        if self._content_changed is not None:
+            self._content_changed.set()
+
+    async def _prune_postings(self) -> None:
+        """Remove dropped files from the trigram postings without holding the loop for long."""
+        work = 0
+        while self._stale:
+            path, grams = self._stale.popleft()
+            # The file may have been indexed again since; keep the trigrams it still has
+            current = self._content.get(path)
+            for gram in (grams - current if current is not None else grams):
+                holders = self._trigrams.get(gram)
+                if holders is not None:
+                    holders.discard(path)
+                    if not holders:
+                        del self._trigrams[gram]
+            work += len(grams)
+            if work >= PRUNE_SLICE:
+                work = 0
+                await asyncio.sleep(0)
+
+    def _candidates(self, pattern: str, ignore_case: bool) -> Optional[Set[str]]:
+        """Indexed files that contain every trigram the pattern requires, or None if it requires none."""
+        grams = required_trigrams(pattern, ignore_case)
+        if not grams:
+            return None
+        holders = sorted((self._trigrams.get(gram, set()) for gram in grams), key=len)
+        if not holders[0]:
+            return set()
+        # Postings may still list files dropped since; only currently indexed ones count
+        return holders[0].intersection(*holders[1:], self._content.keys())
+
+
+def trigrams(data: bytes) -> FrozenSet[bytes]:
+    """Case-folded (ASCII) three-byte substrings of ``data``."""
+    data = data.lower()
+    return frozenset([data[i:i + 3] for i in range(len(data) - 2)])
+
+
+def required_trigrams(pattern: str, ignore_case: bool = False) -> Set[bytes]:
+    """
+    Trigrams any match of a regex must contain: those of the literal
+    runs in its top-level concatenation. Alternations, repeats and
+    classes end a run, so the result is a safe under-approximation.
+    """
+
+    runs: List[str] = []
+    current: List[str] = []
+    ascii_only = False
+
+    def flush() -> None:
+        if len(current) >= 3:
+            runs.append("".join(current))
+        current.clear()
+
+    def walk(items) -> None:
+        nonlocal ascii_only
+        for op, argument in items:
+            if op is sre_parse.LITERAL:
+                current.append(chr(argument))
+            elif op is sre_parse.SUBPATTERN:
+                # (group, add_flags, del_flags, pattern)
+                if argument[1] & re.IGNORECASE:
+                    ascii_only = True
+                walk(argument[-1])
+            else:
+                flush()
+
+    parsed = sre_parse.parse(pattern)
+    ascii_only = ignore_case or bool(parsed.state.flags & re.IGNORECASE)
+    walk(parsed)
+    flush()
+
+    grams: Set[bytes] = set()
+    for run in runs:
+        data = run.encode("utf-8")
+        # The index only folds ASCII case; other letters may match in another case
+        grams.update(gram for gram in trigrams(data) if gram.isascii() or not ascii_only)
+    return grams
+
+
+def glob_to_regex(pattern: str) -> str:
+    """A regex for a glob where ``*`` and ``?`` stay within a path segment and ``**/`` spans any number of them."""
+    parts = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if pattern.startswith("**/", i):
+            parts.append("(?:.*/)?")
+            i += 3
+            continue
+        if pattern.startswith("**", i):
+            parts.append(".*")
+            i += 2
+            continue
+        if char == "*":
+            parts.append("[^/]*")
+        elif char == "?":
+            parts.append("[^/]")
+        elif char == "[":
+            end = pattern.find("]", i + 2)
+            if end < 0:
+                parts.append(re.escape(char))
+            else:
+                body = pattern[i + 1:end]
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                parts.append("[" + body.replace("\\", "\\\\") + "]")
+                i = end
+        else:
+            parts.append(re.escape(char))
+        i += 1
+    return "".join(parts) + r"\Z"
+
+
+def glob_matcher(pattern: str, path: str) -> Tuple[str, "re.Pattern"]:
+    """
+    The directory below which a glob relative to ``path`` can match, and
+    a regex for the absolute paths it matches. See WorkspaceIndex.glob
+    for the syntax.
+    """
+
+    if pattern.startswith(path + "/"):
+        pattern = pattern[len(path) + 1:]
+    if "/" not in pattern:
+        return path, re.compile(re.escape(path + "/") + "(?:.*/)?" + glob_to_regex(pattern))
+
+    # Only the subtree below the pattern's literal leading directories can match
+    base = path
+    parts = pattern.split("/")
+    while len(parts) > 1 and not _has_magic(parts[0]):
+        part = parts.pop(0)
+        if part:
+            base = os.path.join(base, part)
+    return base, re.compile(re.escape(base + "/") + glob_to_regex("/".join(parts)))
+
+
+def _has_magic(part: str) -> bool:
+    return any(char in part for char in "*?[")
+
+
+def _read_file(path: str, max_bytes: int) -> Optional[bytes]:
+    """Up to ``max_bytes + 1`` bytes of a regular file; None for anything else, symlinks included."""
+    try:
+        fd = os.open(path, os.O_RDONLY | os.O_NOFOLLOW | os.O_NONBLOCK)
+    except OSError:
+        return None
+    with os.fdopen(fd, "rb") as f:
+        if not stat.S_ISREG(os.fstat(fd).st_mode):
+            return None
+        return f.read(max_bytes + 1)
+
+
+def _read_trigrams(
+    paths: List[str],
+    max_bytes: int
+) -> Tuple[List[Tuple[str, Optional[FrozenSet[bytes]], int]], Dict[bytes, List[str]]]:
+    """
+    Read files in a worker thread and group them by trigram. Binary,
+    oversized and unreadable files get None.
+    """
+
+    results = []
+    postings: Dict[bytes, List[str]] = {}
+    for path in paths:
+        data = _read_file(path, max_bytes)
+        if data is None or len(data) > max_bytes or b"\0" in data[:8192]:
+            results.append((path, None, 0))
+            continue
+        grams = trigrams(data)
+        results.append((path, grams, len(data)))
+        for gram in grams:
+            holders = postings.get(gram)
+            if holders is None:
+                postings[gram] = [path]
+            else:
+                holders.append(path)
+    return results, postings
+
+
+def _grep(paths: List[str], regex: "re.Pattern", max_bytes: int, max_per_file: int, limit: int) -> List[Dict]:
+    """Matching lines of each file, one per line, stopping at ``limit``."""
+    matches = []
+    for path in paths:
+        data = _read_file(path, max_bytes)
+        if data is None or len(data) > max_bytes or b"\0" in data[:8192]:
+            continue
+        text = data.decode("utf-8", errors="replace")
+        in_file = 0
+        line = 1
+        position = 0
+        last_line = 0
+        for match in regex.finditer(text):
+            line += text.count("\n", position, match.start())
+            position = match.start()
+            if line == last_line:
+                continue
+            last_line = line
+            start = text.rfind("\n", 0, position) + 1
+            end = text.find("\n", position)
+            matches.append({
+                "path": path,
+                "line": line,
+                "text": text[start:end if end >= 0 else len(text)][:MAX_LINE_CHARS]
+            })
+            in_file += 1
+            if in_file >= max_per_file or len(matches) >= limit:
+                break
+        if len(matches) >= limit:
+            break
+    return matches
+
+
+def _change(kind: str, path: str, entry: Entry) -> Dict:
+    return {"type": kind, "path": path, "is_dir": entry[2], "size": entry[0], "mtime": entry[1]}
+
+
+def _deleted(path: str, entry: Entry) -> Dict:
+    return {"type": "deleted", "path": path, "is_dir": entry[2]}
+
+
+def _diff(previous: Dict[str, Entry], current: Dict[str, Entry]) -> List[Dict]:
+    """Change events between two scans; a deleted directory stands for everything below it."""
+    events = []
+    gone = previous.keys() - current.keys()
+    for path in sorted(gone):
+        if os.path.dirname(path) not in gone:
+            events.append(_deleted(path, previous[path]))
+    for path, entry in current.items():
+        known = previous.get(path)
+        if known is None or known[2] != entry[2]:
+            if known is not None:
+                events.append(_deleted(path, known))
+            events.append(_change("created", path, entry))
+        elif not entry[2] and known[:2] != entry[:2]:
+            events.append(_change("modified", path, entry))
+    return events
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The API runs from inside sandbox_api/ and imports its modules flat
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sandbox_api"))
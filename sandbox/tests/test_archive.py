@@ -0,0 +1,55 @@
+import io
+import os
+import tarfile
+
+from archive import extract_tar
+
+
+def build_tar(*members) -> bytes:
+    """A tar of ``(name, content)`` files and ``(name, "->", target)`` symlinks."""
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as tar:
+        for name, *rest in members:
+            info = tarfile.TarInfo(name)
+            if rest[0] == "->":
+                info.type = tarfile.SYMTYPE
+                info.linkname = rest[1]
+                tar.addfile(info)
+            else:
+                info.size = len(rest[0])
+                tar.addfile(info, io.BytesIO(rest[0]))
+    return buffer.getvalue()
+
+
+async def chunks(data: bytes, size: int = 512):
+    for offset in range(0, len(data), size):
+        yield data[offset:offset + size]
+
+
+async def test_files_and_links_are_extracted(tmp_path):
+    data = build_tar(("src/main.py", b"print('hi')\n"), ("link", "->", "src/main.py"))
+    stats = await extract_tar(chunks(data), str(tmp_path))
+    assert stats["files"] == 1 and stats["links"] == 1 and stats["skipped"] == 0
+    assert (tmp_path / "link").read_bytes() == b"print('hi')\n"
+
+
+async def test_members_escaping_the_destination_are_skipped(tmp_path):
+    data = build_tar(("../outside", b"x"), ("up", "->", "../.."), ("kept", b"y"))
+    stats = await extract_tar(chunks(data), str(tmp_path / "dest"))
+    assert stats["skipped"] == 2
+    assert not (tmp_path / "outside").exists()
+    assert (tmp_path / "dest" / "kept").read_bytes() == b"y"
+
+
+async def test_members_under_a_link_or_file_are_skipped(tmp_path):
+    data = build_tar(
+        ("ok", "->", "sub"),
+        ("ok/evil", b"x"),
+        ("plain", b"y"),
+        ("plain/nested", b"z"),
+        ("after", b"w")
+    )
+    stats = await extract_tar(chunks(data), str(tmp_path))
+    assert stats["skipped"] == 2
+    assert not os.path.lexists(tmp_path / "sub")
+    assert (tmp_path / "after").read_bytes() == b"w"
@@ -0,0 +1,47 @@
+import json
+import os
+
+import httpx
+
+from main import app
+from process import spawn, stream_output
+
+
+async def run(command: str, timeout, stdin=None):
+    process = await spawn(command, os.getcwd(), stdin=stdin is not None)
+    return [event async for event in stream_output(process, timeout, stdin)]
+
+
+async def test_output_is_streamed_then_the_exit():
+    events = await run("echo out; echo err >&2; exit 3", 5.0)
+    assert {"type": "stdout", "data": "out\n"} in events
+    assert {"type": "stderr", "data": "err\n"} in events
+    assert events[-1]["type"] == "exit"
+    assert events[-1]["exit_code"] == 3
+    assert not events[-1]["timed_out"]
+
+
+async def test_timeout_kills_the_process_group():
+    events = await run("echo started; sleep 30", 0.2)
+    assert events[0] == {"type": "stdout", "data": "started\n"}
+    assert events[-1]["timed_out"]
+    assert events[-1]["duration"] < 5
+
+
+async def test_no_timeout_means_no_deadline():
+    events = await run("sleep 0.2; cat", None, stdin="piped")
+    assert {"type": "stdout", "data": "piped"} in events
+    assert events[-1]["exit_code"] == 0
+    assert not events[-1]["timed_out"]
+
+
+async def test_exec_endpoint_accepts_a_null_timeout(tmp_path):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://sandbox") as client:
+        response = await client.post(
+            "/api/terminal/exec",
+            json={"command": "echo hi", "cwd": str(tmp_path), "timeout": None}
+        )
+    assert response.status_code == 200
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert events[0] == {"type": "stdout", "data": "hi\n"}
+    assert events[-1]["exit_code"] == 0
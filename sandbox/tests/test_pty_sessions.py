@@ -0,0 +1,51 @@
+import pytest
+
+from pty_sessions import ShellSession
+
+
+@pytest.fixture
+async def shell(tmp_path):
+    session = ShellSession(cwd=str(tmp_path))
+    await session.start()
+    yield session
+    await session.close()
+
+
+async def test_state_persists_between_commands(shell, tmp_path):
+    (tmp_path / "sub").mkdir()
+    assert await shell.run("cd sub && export GREETING=hi") == {
+        "output": "", "exit_code": 0, "done": True, "offset": shell.end
+    }
+
+    result = await shell.run("pwd\necho $GREETING\nfalse")
+    assert result["output"] == f"{tmp_path / 'sub'}\nhi\n"
+    assert result["exit_code"] == 1
+
+    # The exit status reaches the next command, as at a terminal
+    result = await shell.run("echo $?")
+    assert result["output"] == "1\n"
+
+
+async def test_syntax_errors_finish_the_command(shell):
+    result = await shell.run("if then", timeout=5)
+    assert result["done"]
+    assert result["exit_code"] == 2
+    assert "syntax error" in result["output"]
+
+
+async def test_next_command_after_an_interrupted_timeout(shell):
+    result = await shell.run("echo quote\\'s; sleep 30", timeout=0.5)
+    assert not result["done"]
+    assert result["exit_code"] is None
+    assert result["output"] == "quote's\n"
+
+    shell.interrupt()
+    result = await shell.run("echo after", timeout=5)
+    assert result == {"output": "after\n", "exit_code": 0, "done": True, "offset": shell.end}
+
+    # The interrupt's own prompt arrives after the next command was typed
+    await shell.run("sleep 30", timeout=0.2)
+    shell.interrupt()
+    result = await shell.run("echo again", timeout=5)
+    assert result["output"] == "again\n"
+    assert result["exit_code"] == 0
@@ -0,0 +1,46 @@
+import asyncio
+
+from services import Service, ServiceSupervisor
+
+
+async def always() -> bool:
+    return True
+
+
+def sleeper(name: str, **kwargs) -> Service:
+    return Service(name, ["sleep", "30"], always, **kwargs)
+
+
+async def test_services_start_after_their_dependencies_and_stop():
+    supervisor = ServiceSupervisor([sleeper("display"), sleeper("browser", depends_on=["display"])])
+    supervisor.start()
+    try:
+        assert await supervisor.wait_ready(5.0)
+        status = supervisor.status()["services"]
+        assert status["browser"]["started_after"] >= status["display"]["ready_after"]
+    finally:
+        await supervisor.stop()
+
+    processes = [service.process for service in supervisor.services.values()]
+    assert all(process.returncode is not None for process in processes)
+
+
+async def test_failed_dependency_fails_its_dependents():
+    broken = Service("display", ["false"], lambda: asyncio.sleep(0, False))
+    supervisor = ServiceSupervisor([broken, sleeper("browser", depends_on=["display"])])
+    supervisor.start()
+    try:
+        assert not await supervisor.wait_ready(5.0)
+        assert supervisor.failed
+        assert supervisor.services["browser"].error == "dependency display failed"
+    finally:
+        await supervisor.stop()
+
+
+async def test_stop_cancels_the_watcher():
+    supervisor = ServiceSupervisor([sleeper("display")])
+    supervisor.start()
+    watcher = supervisor._watcher
+    await supervisor.stop()
+    await asyncio.sleep(0)
+    assert watcher.cancelled()